@@ -61,6 +61,15 @@ from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QL
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QFont
 from concurrent.futures import ThreadPoolExecutor
+import command_executor
+import command_matrix
+import command_profiler
+import engine_graphics
+import enumeration
+import idcodec
+import llanguage
+import psconvert
+import rasterizer
 os.environ['QT_API'] = 'pyqt5'
 templates = {
     "basic": ["id", "name", "value"],
@@ -770,11 +779,12 @@ def convert_file(input_file, output_file, base):
       binary_strings = [base_x_to_binary(num, base) for num in numbers]
       f_out.write(" ".join(binary_strings) + "\n")
 
-def generate_and_save_n_bit_combinations(file_path, n):
-    with open(file_path, "w") as file:
-        for i in range(2**n):  # 2^n combinations
-            combination = bin(i)[2:].zfill(n)
-            file.write(combination + "\n")
+def generate_and_save_n_bit_combinations(file_path, n, binary_format=None):
+    """Writes all 2^n n-bit strings, or the compact 'packed' / 'range' binary form."""
+    if binary_format is None:
+        enumeration.write_bit_strings(file_path, n)
+    else:
+        enumeration.write_bit_binary(file_path, n, packed=binary_format == 'packed')
 
 def decompile_data():
     """Decompiles data using a dynamically loaded decompile function."""
@@ -912,9 +922,16 @@ def compile_data(name):
 def main0():
     print("\n\nWelcome. Choose your operation: ")
     # User option to generate mappings or not
-    generate_mappings = input("Do you want to generate mappings? 1 [for yes], 0 [for no]: ")
+    generate_mappings = input("Do you want to generate mappings? 1 [for yes], 0 [for no], 2 [browse without generating]: ")
     if generate_mappings == "1":
         Llanguage_model()
+    if generate_mappings == "2":
+        codec = idcodec.load_codec()
+        if codec is None:
+            print("No recorded charset found. Generate the mappings once first.")
+        else:
+            length = int(input("Enter the combination length to browse: "))
+            browse_enumeration(enumeration.llanguage_mappings(codec.charset, length))
 
     # Define input and output directories
     in1 = "llanguageMod/inputs"
@@ -925,14 +942,29 @@ def main0():
     
     proces = input("Do you want to process files? 1 [for yes], 0 [for no]: ")
     if(proces == '1'):
-        # Read mappings only if they are necessary
-        mappings = read_mappings()
+        use_codec = input("Compute ids from the charset instead of the mapping files? 1 [for yes], 0 [for no]: ")
+        mappings = idcodec.load_codec() if use_codec == '1' else None
+        if mappings is None:
+            if use_codec == '1':
+                print("No recorded charset found, using the mapping files.")
+            # Open the memory-mapped mapping index, rebuilt only when the mapping files change
+            mappings = llanguage.load_mapping_index()
         # Get user input for the range of files to process
         start = int(input("Enter the start of the range of files to read (e.g., 5 for 5.txt): "))
         end = int(input("Enter the end of the range of files to read (e.g., 15 for 15.txt): "))
+        try:
+            workers = max(1, int(input("Enter the number of worker processes (e.g., 1): ")))
+        except ValueError:
+            workers = 1
 
         # Process files within the specified range
-        process_files(in1, out1, start, end, mappings, out2)
+        if workers > 1:
+            # The pool runs from llanguage's own command line: started from here, every worker
+            # would re-import this module and rerun its menu
+            llanguage.process_in_subprocess(start, end, workers, isinstance(mappings, idcodec.IdCodec),
+                                            input_directory=in1, output_directory=out1, outdir2=out2)
+        else:
+            process_files(in1, out1, start, end, mappings, out2, workers)
 
     # Optionally, generate an image from text input
     questione = input("Generate text input to image file? 1 [for yes], 0 [for no]: ")
@@ -947,10 +979,18 @@ def process_image_generation0(data):
         print("No data to process for image generation.")
         return
     print("Data received for image generation:", data)
-    color_data = data_to_color0(data)
-    if not color_data:
+    deterministic = input("Use a deterministic colour hash (same colours on every run)? 1 [for yes], 0 [for no]: ") == "1"
+    color_data = data_to_color0(data, deterministic)
+    if not len(color_data):
         print("No color data generated.")
         return
+    num_pixels_width, num_pixels_height = rasterizer.square_layout(len(color_data))
+    if (num_pixels_width * 10) * (num_pixels_height * 10) > rasterizer.STREAM_PIXELS:
+        # Too large to hold as one image: stream rows of blocks straight to a PNG
+        file_path = input("Image is too large to build in memory. Enter the path to save the PNG file: ")
+        width, height = rasterizer.stream_colour_blocks(file_path, color_data, num_pixels_width, num_pixels_height, 10)
+        print(f"Image ({width}x{height}) saved to {file_path}")
+        return
     image = create_image0(color_data)
     image.show()  # Optionally display the image
     save_option = input("Do you want to save this image as a PDF? (yes/no): ")
@@ -960,38 +1000,23 @@ def process_image_generation0(data):
         save_image_as_pdf0(image, file_path)
         
 def create_image0(color_data):
-    """ Create an image from the color data based on user input dimensions and pixel size. """
+    """ Create an image from the color data (an (n, 3) uint8 array or '#RRGGBB' strings). """
+    if not isinstance(color_data, np.ndarray):
+        color_data = rasterizer.colours_to_array(color_data)
     # Dimensions based on the length of color_data to create a square image
-    num_pixels_width = int(len(color_data) ** 0.5)  # Assuming a roughly square image for simplicity
-    num_pixels_height = num_pixels_width if num_pixels_width ** 2 == len(color_data) else num_pixels_width + 1
+    num_pixels_width, num_pixels_height = rasterizer.square_layout(len(color_data))
     
     pixel_side_length = 10  # Each color block will be 10x10 pixels
 
-    img_width = pixel_side_length * num_pixels_width
-    img_height = pixel_side_length * num_pixels_height
-
-    # Create a new image with white background
-    image = Image.new('RGB', (img_width, img_height), 'white')
-    draw = ImageDraw.Draw(image)
-
-    # Draw each block
-    index = 0
-    for i in range(num_pixels_height):
-        for j in range(num_pixels_width):
-            if index < len(color_data):
-                top_left = (j * pixel_side_length, i * pixel_side_length)
-                bottom_right = ((j + 1) * pixel_side_length, (i + 1) * pixel_side_length)
-                draw.rectangle([top_left, bottom_right], fill=color_data[index])
-            index += 1
-
-    return image
+    # The whole grid is filled as one array, upsampled per block, instead of one rectangle per word
+    return Image.fromarray(rasterizer.colour_block_array(color_data, num_pixels_width, num_pixels_height, pixel_side_length))
         
-def data_to_color0(data):
-    """ Convert each data item to a unique color based on its hash value. """
+def data_to_color0(data, deterministic=False):
+    """ Convert each data item to a colour from its hash value, as an (n, 3) uint8 array. """
     if not data:  # Validate input
         print("No data provided to convert to color.")
-        return []
-    return ['#' + '{:06X}'.format(hash(datum) & 0xFFFFFF) for datum in data if isinstance(datum, str)]
+        return np.zeros((0, 3), dtype=np.uint8)
+    return rasterizer.word_colours([datum for datum in data if isinstance(datum, str)], deterministic)
 
 
 def open_file0():
@@ -1038,16 +1063,11 @@ def Llanguage_model():
     os.makedirs(output_directory, exist_ok=True)
 
     for length in range(start_length, end_length + 1):
-        with open(f"{output_directory}/{length}.txt", "w") as file:
-            print(f"Generating {length}-character combinations...")
-            num_combinations = math.pow(len(characters), length)
-            for i in range(int(num_combinations)):
-                combination = ""
-                temp = i
-                for j in range(length):
-                    combination = characters[temp % len(characters)] + combination
-                    temp //= len(characters)
-                file.write(f"{i} {combination}\n")
+        print(f"Generating {length}-character combinations...")
+        rate = enumeration.generate_mapping_file(f"{output_directory}/{length}.txt", characters, length)
+        print(f"{length}.txt written at {rate:,.0f} rows/sec")
+    # Lets mode 12 compute the same ids arithmetically without the mapping files
+    idcodec.save_charset(characters, range(start_length, end_length + 1), f"{output_directory}/charset.json")
 
     print("Combinations generated successfully.")
 
@@ -1055,106 +1075,64 @@ def Llanguage_model():
 # Llanguage_model()
 
 
+def browse_enumeration(virtual):
+    """Look up rows of a virtual enumeration without writing the whole file."""
+    print(f"{len(virtual):,} rows. Commands: <i> row i, <i> <j> rows i..j-1, =<text> find a row, "
+          "save <i> <j> <path> write rows to a file, q to quit.")
+    while True:
+        command = input("browse> ")
+        if command.lower() == 'q':
+            break
+        try:
+            if command.startswith('='):
+                print(f"Row {virtual.index_of(command[1:])}")
+            elif command.startswith('save '):
+                _, i, j, path = command.split(maxsplit=3)
+                virtual.materialize(path, int(i), int(j), encoding="utf-8")
+                print(f"Rows {i}..{int(j) - 1} saved to {path}")
+            else:
+                bounds = [int(x) for x in command.split()]
+                if len(bounds) == 1:
+                    print(repr(virtual.line(bounds[0])))
+                else:
+                    for i, combination in zip(range(bounds[0], bounds[1]), virtual.rows(bounds[0], bounds[1])):
+                        print(repr(virtual.line(i, combination)))
+        except (ValueError, IndexError) as e:
+            print(f"Error: {e}")
+
+
 def read_mappings():
     """Reads mappings from files named 1.txt to 4.txt and stores them in a list of dictionaries."""
-    mappings = [{} for _ in range(4)]
-    for i in range(1, 5):
-        try:
-            with open(f"llanguageMod/mappings/{i}.txt", "r") as file:
-                for line in file:
-                    parts = line.strip().split()
-                    if len(parts) == 2:
-                        id_str, value_str = parts
-                        mappings[i-1][value_str] = id_str
-        except FileNotFoundError:
-            print(f"Error opening file mappings/{i}.txt")
-    return mappings
+    return llanguage.read_mappings()
 
-def process_files(input_directory, output_directory, start, end, mappings, outdir2):
+def process_files(input_directory, output_directory, start, end, mappings, outdir2, workers=1):
     """Processes files within a given range using predefined mappings and generates output files."""
-    max_file_number = max([int(os.path.splitext(os.path.basename(f))[0]) for f in glob.glob(f"{output_directory}/*.txt")], default=0)
-    for i in range(start, end + 1):
-        input_file_path = f"{input_directory}/{i}.txt"
-        try:
-            process_large_file(input_file_path, output_directory, mappings, max_file_number)
-            process_large_file2(input_file_path, outdir2, mappings, max_file_number)
-            max_file_number += 1
-        except FileNotFoundError:
-            print(f"Could not open the file {input_file_path}")
+    llanguage.process_files(input_directory, output_directory, start, end, mappings, outdir2, workers)
 
 def process_large_file(input_file_path, output_directory, mappings, file_number):
     """Efficiently processes a large file using mappings and saves to an output file."""
+    tokenizer = llanguage.get_tokenizer(mappings)
     output_file_path = f"{output_directory}/{file_number + 1}.txt"
     with open(input_file_path, "r") as input_file, open(output_file_path, "w") as output_file:
         for line in input_file:
-            output_content = convert_content(line, mappings)
-            output_file.write(output_content)
+            output_file.write(tokenizer.tokenize(line)[0])
 
 def process_large_file2(input_file_path, output_directory, mappings, file_number):
     """Efficiently processes a large file using mappings and saves to an output file."""
+    tokenizer = llanguage.get_tokenizer(mappings)
     output_file_path = f"{output_directory}/{file_number + 1}.txt"
     with open(input_file_path, "r") as input_file, open(output_file_path, "w") as output_file:
         for line in input_file:
-            output_b = convert_content2(line, mappings)
-            output_file.write(output_b)
+            output_file.write(tokenizer.tokenize(line)[1])
             
 
 def convert_content(content, mappings):
     """Converts content using mappings."""
-    output_content = ""
-    index = 0
-    while index < len(content):
-        if content[index] == '\n':
-            output_content += "1.27 "
-            index += 1
-            continue
-        
-        found = False
-        for length in range(4, 0, -1):
-            if index + length <= len(content):
-                substr = content[index:index + length]
-                if substr in mappings[length - 1]:
-                    output_content += f"{length}.{mappings[length - 1][substr]} "
-                    index += length
-                    found = True
-                    break
-        if not found:
-            output_content += "0 "
-            index += 1
-    return output_content
+    return llanguage.get_tokenizer(mappings).tokenize(content)[0]
 
 def convert_content2(content, mappings):
     """Converts content using mappings."""
-    output_b = ""
-    index = 0
-    while index < len(content):
-        if content[index] == '\n':
-            output_b += "27 "
-            index += 1
-            continue
-        
-        found = False
-        for length in range(4, 0, -1):
-            if index + length <= len(content):
-                substr = content[index:index + length]
-                if substr in mappings[length - 1]:
-                    #output_b += f"{length}.{mappings[length - 1][substr]} "
-                    #output_b += f"{100**(length - 1) + (mappings[length-1])} "
-                    if((length - 1) == 0):
-                        output_b += f"{mappings[length-1][substr]} "
-                    if((length - 1) == 1):
-                        output_b += f"{100**(length - 1) + int(mappings[length-1][substr])} "
-                    if((length - 1) == 2):
-                        output_b += f"{100**(length - 1) + 100**(length - 2) + int(mappings[length-1][substr])} "
-                    if((length - 1) == 3):
-                        output_b += f"{100**(length - 1) + 100**(length - 2) + 100**(length - 3) + int(mappings[length-1][substr])} "
-                    index += length
-                    found = True
-                    break
-        if not found:
-            output_b += "0 "
-            index += 1
-    return output_b 
+    return llanguage.get_tokenizer(mappings).tokenize(content)[1]
 
 #from PIL import Image
 
@@ -1271,30 +1249,31 @@ def generate_circuit_from_line(line, num_qubits):
 
 def generate_cmp():
     # Create the 'instructionSet.txt' file
-    name_m = input("Enter the name for your command matrix: ")
-    with open(name_m, 'w') as f:
-        # Lines 1 to 13107: string_var# = input('Enter string_var: ')
-        for i in range(13107):
-            f.write(f"string_var{i} = input('Enter string_var: ')\n")
-        
-        # Lines 13108 to 26214: var_given# = input('Enter the variable name to be used: ')
-        for i in range(13107):
-            f.write(f"var_given{i} = input('Enter the variable name to be used: ')\n")
-        
-        # Lines 26215 to 39321: var_glob# = globals()[var_given#]
-        for i in range(13107):
-            f.write(f"var_glob{i} = globals().get(var_given{i}, 'Variable not found')  # Error handling: 'Variable not found'\n")
-        
-        # Lines 39322 to 52428: exec(var_glob#)
-        for i in range(13107):
-            f.write(f"if isinstance(var_glob{i}, str): exec(var_glob{i})  # Error handling: Execute only if it's a string\n")
-        
-        # Lines 52429 to 65535: eval(var_glob#)
-        for i in range(13107):
-            f.write(f"if isinstance(var_glob{i}, str): result = eval(var_glob{i})  # Error handling: Evaluate only if it's a string\n")
-        
-        # Line 65536: Hyperlink
-        f.write("webbrowser.open('https://www.openai.com')")
+    name_m = input("Enter the name for your command matrix (.txt for one command per line, any other name for the indexed format): ")
+    sources = []
+    # Lines 1 to 13107: string_var# = input('Enter string_var: ')
+    for i in range(13107):
+        sources.append(f"string_var{i} = input('Enter string_var: ')")
+    
+    # Lines 13108 to 26214: var_given# = input('Enter the variable name to be used: ')
+    for i in range(13107):
+        sources.append(f"var_given{i} = input('Enter the variable name to be used: ')")
+    
+    # Lines 26215 to 39321: var_glob# = globals()[var_given#]
+    for i in range(13107):
+        sources.append(f"var_glob{i} = globals().get(var_given{i}, 'Variable not found')  # Error handling: 'Variable not found'")
+    
+    # Lines 39322 to 52428: exec(var_glob#)
+    for i in range(13107):
+        sources.append(f"if isinstance(var_glob{i}, str): exec(var_glob{i})  # Error handling: Execute only if it's a string")
+    
+    # Lines 52429 to 65535: eval(var_glob#)
+    for i in range(13107):
+        sources.append(f"if isinstance(var_glob{i}, str): result = eval(var_glob{i})  # Error handling: Evaluate only if it's a string")
+    
+    # Line 65536: Hyperlink
+    sources.append("webbrowser.open('https://www.openai.com')")
+    command_matrix.write_matrix(name_m, sources)
 
     # Note: For logging, you can add a line to write the executed or evaluated command to a log file.
     # Note: For user authentication, you can add a line to check user credentials before executing or evaluating a command.
@@ -1363,8 +1342,10 @@ def text_editor():
 
 def img_generator():
     print("random() : ", random.random())
-    master = Tk()
-    master.attributes('-fullscreen', True)
+    headless = input("Render PNG images directly, without a display? 1 [for yes], 0 [for Tk canvas + PostScript]: ") == "1"
+    if not headless:
+        master = Tk()
+        master.attributes('-fullscreen', True)
     #a = 250
     #b = 200
     print("Welcome\n")
@@ -1381,7 +1362,8 @@ def img_generator():
     b = int(b1)
     pin_p1 = a/change
     pin_p2 = b/change_h
-    w = Canvas(master, width= a, height= b)
+    if not headless:
+        w = Canvas(master, width= a, height= b)
 
     #c = ["purple", "green", "gold", "red", "yellow", "orange", "pink", "brown", "cyan", "lime", "teal", "magenta"]
     c = []
@@ -1400,11 +1382,31 @@ def img_generator():
     name = 1
     cells = ((a//change)*(b//change_h))
     upper = cells - 1
-    nbr_comb = math.pow(len(c),cells)
-    files = int(nbr_comb)
+    # Exact integer: a float power overflows for grids of 1024 cells and more
+    files = len(c) ** cells
     #print(len(c))
     rown = 0
     img_fn_prefix = input("Enter Image filename prefix (omit the file extension name): ")
+    if headless:
+        first = int(input("Enter the first image number (e.g., 1): "))
+        last = input("Enter the last image number (leave empty for all): ").strip()
+        workers = int(input("Enter the number of worker processes (e.g., 4): "))
+        while workers < 1:
+            workers = int(input("At least one worker is needed. Enter the number of worker processes: "))
+        try:
+            if workers > 1:
+                # The pool runs from rasterizer's own command line: started from here, every worker
+                # would re-import this module and rerun its menu
+                rasterizer.build_in_subprocess(c, a, b, change, change_h, img_fn_prefix, first - 1,
+                                               int(last) if last else None, workers=workers)
+                return
+            count, rate = rasterizer.build_block_images(c, a, b, change, change_h, img_fn_prefix, first - 1,
+                                                        int(last) if last else None, workers=1,
+                                                        progress=rasterizer.print_progress)
+            print(f"{count} PNG images written ({rate:,.0f} images/sec)")
+        except ValueError as e:
+            print(f"Error: {e}")
+        return
     file_count = 0    
     for t in range(0,files):
         file_count = file_count + 1
@@ -1433,8 +1435,9 @@ def img_generator():
             switch = 0
             #ran = random.randint(0,c_length - 1)
 
-            rdiv = math.pow(len(c),col)
-            cell = (rown/rdiv) % (len(c))
+            # Integer digit of rown: float powers overflow on the large grids
+            rdiv = len(c) ** col
+            cell = (rown // rdiv) % (len(c))
 
             celled = int(cell)
             print(celled)
@@ -1468,30 +1471,33 @@ def img_generator():
         name = name + 1
 
 def compile_image_file():
-    nof = input("Input number of files: ")
-    nof_ = int(nof)
-    ins_x = input("Enter first file id: ")
-    x = int(ins_x)
-    donu = input("Do you have more than one file (y [Yes], n [No]? ")
-    if(donu == 'y'):
-        ins_y = input("Enter last file id: ")
-        y = int(ins_y)
+    # PS files are converted in batches by Ghostscript across a thread pool; unchanged
+    # sources are skipped by content hash, and images already rendered as PNG are left alone
     ins = input("Enter path of files: ")
-
-    #def convert_to_png(path):
-    pre = input("Enter filename-prefix: ")
-    if(nof_ > 1):
-        for i in range(x,y+1):
-            ixy = str(i)
-            #pre = input("Enter filename-prefix: ")
-            path= ins + "\\" + pre + ixy + ".ps"
-            img = Image.open(path)
-            img.save(pre + ixy + ".png")
-    if(nof_ == 1):
-        #pre = input("Enter filename-prefix: ")
-        path = ins + "\\" + pre + ins_x + ".ps"
-        img = Image.open(path)
-        img.save(pre + ins_x + ".png")
+    pattern = input("Enter a glob pattern of .ps files (Enter to select by file id): ")
+    if pattern:
+        sources = psconvert.glob_sources(os.path.join(ins, pattern))
+        pre = ""
+    else:
+        pre = input("Enter filename-prefix: ")
+        ins_x = input("Enter first file id: ")
+        x = int(ins_x)
+        donu = input("Do you have more than one file (y [Yes], n [No]? ")
+        y = x
+        if(donu == 'y'):
+            ins_y = input("Enter last file id: ")
+            y = int(ins_y)
+        sources = psconvert.range_sources(ins, pre, x, y)
+    workers = input("Number of Ghostscript calls to run at once (Enter for one per core): ")
+    workers = int(workers) if workers.strip() else None
+
+    skip = psconvert.raster_images(pre) if pre else set()
+    try:
+        stats = psconvert.convert_ps_files(sources, '.', workers, skip=skip, progress=psconvert.print_progress)
+    except FileNotFoundError as e:
+        print(e)
+        return
+    psconvert.report(stats)
 
     print("Done")
 
@@ -1528,34 +1534,14 @@ def programming_engine():
     #screen = pygame.display.set_mode((screen_width, screen_height), pygame.RESIZABLE)
     ##################
 
-    #Create Commands
-    bus_ = 255
-    amount_ = (bus_ + 1) * (bus_ + 1)
-    line_number_ = 0
-                
-    create_f = open("Command_Template.txt", "w")
-    while(line_number_ < amount_):
-        #i = log10(line_number)
-        create_f.write("print(\"[Empty Command Slot] (Change using a text-editor to Update this slot in Command_Template.txt\") #remembering to rename Command_Template.txt\n")
-        line_number_ = line_number_ + 1
-
-    create_f.close()
+    #Create Commands (only when missing: an empty sparse template, every slot runs the default command)
+    command_matrix.ensure_template("Command_Template.txt")
 
-    #LoadCommands
-    xin = 0
+    #LoadCommands (slots are read on first use)
     filnam = "Command_Template.txt"
-    with open(filnam, 'r') as file:
-        commands = file.readlines()
-        xin = xin + 1
-
-
-    star = [0]
-
-    for i, command in enumerate(commands):
-        commands[i] = command.strip()
-        #cmd = command.split(",")
-        star.append(command)
-    del star[0]
+    star = command_matrix.open_matrix(filnam)
+    # Slots are compiled on their first run and reused after that
+    compiled = command_matrix.CommandCache(filnam)
 
     ###################
 
@@ -1592,10 +1578,8 @@ def programming_engine():
     ###################
 
 
-    # Load images
-    block_images = []
-    for i in range(256):
-        block_images.append(pygame.image.load(f"block{i+1}.png"))
+    # Load images (one atlas file; rebuilt from block1.png .. block256.png when they change)
+    block_textures = engine_graphics.BlockTextures()
 
 
     # Maze layout
@@ -1665,14 +1649,39 @@ def programming_engine():
     selected_command = None
     execute_command_prompt = False
 
-    for ni in range(256):
-        s_i = pygame.transform.scale(block_images[ni], (bls, bls))
-        block_images[ni] = s_i
+    # Scaled once per block size and kept on disk beside the atlas
+    block_images = block_textures.surfaces((bls, bls))
 
+    # Redraws only what changed each frame, at most FRAME_RATE times a second
+    view = engine_graphics.DirtyRenderer(screen)
+    clock = pygame.time.Clock()
 
+    def ask_input(prompt, output):
+        # input() in a command is answered on the console, as when commands ran in the engine.
+        # Like the [SPACEBAR] prompts, this stalls the window until the line is entered: only
+        # commands that never ask for input keep the loop running
+        print(output, end="")
+        return input(prompt)
+
+    # Commands run in a worker process, so a slow one never stalls the loop; one worker, so
+    # every command sees the globals the ones before it left. They start from the modules in
+    # command_executor.PRELOAD_MODULES, not from this engine's globals
+    executor = command_executor.CommandExecutor(workers=1, compiled=compiled, prompt=ask_input)
+    profiler = command_profiler.SlotProfiler(filnam)
 
     while running:
+        # Results of commands that finished in the worker processes
+        for result in executor.poll():
+            profiler.record(result)
+            print(result["stdout"], end="")
+            print(result["stderr"], end="", file=sys.stderr)
+            if(result["status"] != "ok"):
+                print("Try again, there was an error in command " + str(result["slot"]) + ": " + result["error"])
+            if(result["status"] in command_executor.STATE_LOST):
+                print("The command worker was restarted: variables set by earlier commands are gone.")
+
         for event in pygame.event.get():
+            view.handle_event(event)
             if event.type == pygame.QUIT:
                 running = False
     ############
@@ -1748,8 +1757,8 @@ def programming_engine():
                         
                         #cma = int(input("Enter command number ID (0 to 65535): "))
                         try:
-                            exec(star[cma], globals())
-                        except:
+                            executor.submit(cma, star[cma])
+                        except IndexError:
                             print("Try again, there was an error")
                         #update command index pointer
                         bus = 255 + 1
@@ -1797,6 +1806,7 @@ def programming_engine():
 
                         # Update display
                         pygame.display.update()
+                        view.invalidate()
                         
                         #cma = int(input("Enter command number ID (0 to 65535): "))
                         
@@ -1871,7 +1881,7 @@ def programming_engine():
                             elif i == 7:  # Start button
                                 print("Start button pressed. Executing command 65535 to access documentation (Secure Internet Access Required).")
                                 # Assuming command 65535 takes the user to the documentation
-                                exec(star[65535])
+                                executor.submit(65535, star[65535])
                                 # Optionally, set a flag or take additional action as needed
 
 
@@ -1881,34 +1891,23 @@ def programming_engine():
                 ##################
 
                 #LoadCommands
-                xin = 0
                 filnam = input("Enter name of Command Matrix file, 'filename.txt': ")
                 quet = int(input("Enter 1 if file already exists [Read mode], Else Enter 2 [Write mode], choose carefully: "))
                 
-                bus = 255
-                amount = (bus + 1) * (bus + 1)
-                line_number = 0
-                #ai = log10(amount)
+                # Closed before the switch: Windows cannot replace or regenerate a file that is still open
+                star.close()
                 if(quet == 2):
-                    create_f = open(filnam, "w")
-                    while(line_number < amount):
-                        #i = log10(line_number)
-                        create_f.write("print(\"[Empty Command Slot] Change using a text-editor to Update this slot in Command_Template.txt after renaming it accordingly.\")\n")
-                        line_number = line_number + 1
-
-                    create_f.close()
+                    command_matrix.create_template(filnam, default="print(\"[Empty Command Slot] Change using a text-editor to Update this slot in Command_Template.txt after renaming it accordingly.\")")
                 
-                with open(filnam, 'r') as file:
-                    commands = file.readlines()
-                    xin = xin + 1
-
-                star = [0]
-
-                for i, command in enumerate(commands):
-                    commands[i] = command.strip()
-                    #cmd = command.split(",")
-                    star.append(command)
-                del star[0]
+                star = command_matrix.open_matrix(filnam)
+                compiled.save()
+                compiled = command_matrix.CommandCache(filnam)
+                executor.compiled = compiled
+                profiler.save()
+                profiler = command_profiler.SlotProfiler(filnam)
+                if(quet == 2):
+                    # A new matrix: timings kept under this name belong to its old commands
+                    profiler.clear()
                 
                 #reset state of matrix
                 typei = "k"
@@ -1953,27 +1952,25 @@ def programming_engine():
                 player_y = mouse_y // bls
 
         
-        # Clear screen
-        screen.fill((255, 255, 255))
-
-        
-        
-        # Draw blocks
+        # Draw blocks (only tiles and cursor that changed since the last frame reach the display)
         if(typei == 'k' or typei == 'm' or typei == 'd'):
+            frame = []
             for y in range(int(screen_height/bls)):
                 for x in range(int(screen_width/bls)):
                     relative_x = x - player_x
                     relative_y = y - player_y
-                    screen.blit(block_images[relative_x + relative_y * int(screen_width // (bls))], (x * bls, y * bls))
-            if(typei == 'k' or typei == 'm' or typei == 'd'):
-                screen.blit(player_image, (player_x * bls, player_y * bls))
-
+                    frame.append(engine_graphics.blit_item(screen, block_images[relative_x + relative_y * int(screen_width // (bls))], (x * bls, y * bls)))
+            frame.append(engine_graphics.blit_item(screen, player_image, (player_x * bls, player_y * bls)))
+            view.draw(frame)
 
-        if(typei == 'k' or typei == 'm' or typei == 'd'):
-            # Update display
-            pygame.display.update()
+        # Cap the frame rate so an idle engine sleeps instead of spinning
+        clock.tick(engine_graphics.FRAME_RATE)
         
 
+    compiled.save()
+    executor.close()
+    profiler.save()
+    star.close()
     # Quit pygame
     pygame.quit()
 
@@ -3529,7 +3526,12 @@ while(True):
 
             print("Characters have been added to the array from the specified subranges.")
 
-            choice = input("Enter a to use your subrange of characters. Else, Enter e to Exit: ")
+            choice = input("Enter a to use your subrange of characters, b to browse the rows without writing them. Else, Enter e to Exit: ")
+            if choice.lower() == 'b':
+                z = int(input("Enter the size of your array: "))
+                n = int(input("\nEnter n: "))
+                ai = int(input("\nEnter nth File System (Number of Cells Per File of the nth File System). Let the value be equal to n for a progressionless session: "))
+                browse_enumeration(enumeration.LSCEnumeration(a, z, n, ai))
             if choice.lower() == 'a':
                 z = int(input("Enter the size of your array: "))
                 k = z - 1
@@ -3538,26 +3540,13 @@ while(True):
                 print(f"\nNumber Of FILE Cells = {noc}")
                 n = noc
 
-                id = 0
-
-                with open("LSC-RENAME.txt", "w", encoding="utf-8") as p:
-                    ai = int(input("\nEnter nth File System (Number of Cells Per File of the nth File System). Let the value be equal to n for a progressionless session: "))
-
-                    for n in range(n, ai + 1):
-                        nbr_comb = int(math.pow(k + 1, n))
+                ai = int(input("\nEnter nth File System (Number of Cells Per File of the nth File System). Let the value be equal to n for a progressionless session: "))
+                split_by_length = input("Write each n to its own file? (yes/no): ").lower() == 'yes'
+                cap = input("Maximum size per file in bytes (leave empty for no limit): ").strip()
+                max_bytes = int(cap) if cap else None
 
-                        for row in range(nbr_comb):
-                            p.write(f"\n\n{n}CF{id}\n\n")
-                            id += 1
-                            for col in range(n - 1, -1, -1):
-                                rdiv = int(math.pow(k + 1, col))
-                                cell = (row // rdiv) % (k + 1)
-
-                                if cell < len(a):
-                                    if col == 0:
-                                        p.write(f"{a[cell]}")
-                                    else:
-                                        p.write(f"{a[cell]} ")
+                rows, files = enumeration.generate_lsc(a, k + 1, n, ai, "LSC-RENAME.txt", split_by_length, max_bytes)
+                print(f"{rows} rows written to {', '.join(files)}")
 
         if __name__ == "__main__":
             main()
@@ -3875,8 +3864,13 @@ while(True):
         file_path_26_bit = "llanguageMod/binary-configs/" + name_ext
         n_ = int(input("Enter bit length per binary string: "))
 
-        # Generate and save the 26-bit combinations
-        generate_and_save_n_bit_combinations(file_path_26_bit, n_)
+        if input("Browse the combinations instead of writing the file? 1 [for yes], 0 [for no]: ") == "1":
+            browse_enumeration(enumeration.n_bit_combinations(n_))
+        else:
+            output_format = input("Output format: 1 [text], 2 [packed binary], 3 [header with range only]: ")
+            binary_format = {"2": "packed", "3": "range"}.get(output_format)
+            # Generate and save the 26-bit combinations
+            generate_and_save_n_bit_combinations(file_path_26_bit, n_, binary_format)
     if(entrance == 15):
         help_print()
     if(entrance == 16):
@@ -4591,24 +4585,21 @@ while(True):
                         img_width = pixel_side_length * num_pixels_width
                         img_height = pixel_side_length * num_pixels_height
                         
-                        # Create an empty white canvas
-                        image = Image.new('RGB', (img_width, img_height), color="white")
-                        
-                        # Create a drawing context for the image
-                        draw = ImageDraw.Draw(image)
+                        if img_width * img_height > rasterizer.STREAM_PIXELS:
+                            # Too large to hold as one image: stream rows of blocks straight to disk
+                            rasterizer.stream_colour_blocks('generated_image.png', rasterizer.colours_to_array(color_data),
+                                                            num_pixels_width, num_pixels_height, pixel_side_length)
+                            print(f"Image ({img_width}x{img_height}) streamed to generated_image.png; too large to display or save as PDF.")
+                            if hasattr(app, 'generated_image'):
+                                del app.generated_image
+                            return None
+
+                        # The whole grid is filled as one array, upsampled per block, instead of one rectangle per value
+                        image = Image.fromarray(rasterizer.colour_block_array(rasterizer.colours_to_array(color_data),
+                                                                              num_pixels_width, num_pixels_height, pixel_side_length))
                         
                         # Save the image in the object for later PDF conversion
                         app.generated_image = image
-                        
-                        data_idx = 0  # Index to track data position
-                        for i in range(num_pixels_height):
-                            for j in range(num_pixels_width):
-                                if data_idx < len(color_data):
-                                    hex_value = color_data[data_idx]
-                                    top_left = (j * pixel_side_length, i * pixel_side_length)
-                                    bottom_right = ((j + 1) * pixel_side_length, (i + 1) * pixel_side_length)
-                                    draw.rectangle([top_left, bottom_right], fill=hex_value)
-                                    data_idx += 1
 
                         image.show()
                         image.save('generated_image.png')
@@ -5499,6 +5490,9 @@ while(True):
                                         save_custom_charset(charset, config_file)
 
                                     n = int(input("\nEnter the number of cells (n): "))
+                                    if input("Browse the combinations instead of writing the file? 1 [for yes], 0 [for no]: ") == "1":
+                                        browse_enumeration(enumeration.charset_combinations(charset, n))
+                                        continue
                                     output_file = f"{n}_combinations.txt"
                                     use_multithreading = int(input("Use multithreading for faster generation? (1 for Yes, 0 for No): ")) == 1
                                     generate_combinations(charset, n, output_file, use_multithreading)
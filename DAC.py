@@ -62,6 +62,8 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QFont
 from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog, messagebox, simpledialog
+import command_matrix
+import command_profiler
 os.environ['QT_API'] = 'pyqt5'
 templates = {
     "basic": ["id", "name", "value"],
@@ -1272,60 +1274,62 @@ def generate_circuit_from_line(line, num_qubits):
 
 def generate_cmp():
     # Create the 'instructionSet.txt' file
-    name_m = input("Enter the name for your command matrix: ")
-    with open(name_m, 'w') as f:
-        # Lines 1 to 13107: string_var# = input('Enter string_var: ')
-        for i in range(13107):
-            f.write(f"string_var{i} = input('Enter string_var: ')\n")
-        
-        # Lines 13108 to 26214: var_given# = input('Enter the variable name to be used: ')
-        for i in range(13107):
-            f.write(f"var_given{i} = input('Enter the variable name to be used: ')\n")
-        
-        # Lines 26215 to 39321: var_glob# = globals()[var_given#]
-        for i in range(13107):
-            f.write(f"var_glob{i} = globals().get(var_given{i}, 'Variable not found')  # Error handling: 'Variable not found'\n")
-        
-        # Lines 39322 to 52428: exec(var_glob#)
-        for i in range(13107):
-            f.write(f"if isinstance(var_glob{i}, str): exec(var_glob{i})  # Error handling: Execute only if it's a string\n")
-        
-        # Lines 52429 to 65535: eval(var_glob#)
-        for i in range(13107):
-            f.write(f"if isinstance(var_glob{i}, str): result = eval(var_glob{i})  # Error handling: Evaluate only if it's a string\n")
-        
-        # Line 65536: Hyperlink
-        f.write("webbrowser.open('https://www.openai.com')")
+    name_m = input("Enter the name for your command matrix (.txt for one command per line, any other name for the indexed format): ")
+    sources = []
+    # Lines 1 to 13107: string_var# = input('Enter string_var: ')
+    for i in range(13107):
+        sources.append(f"string_var{i} = input('Enter string_var: ')")
+    
+    # Lines 13108 to 26214: var_given# = input('Enter the variable name to be used: ')
+    for i in range(13107):
+        sources.append(f"var_given{i} = input('Enter the variable name to be used: ')")
+    
+    # Lines 26215 to 39321: var_glob# = globals()[var_given#]
+    for i in range(13107):
+        sources.append(f"var_glob{i} = globals().get(var_given{i}, 'Variable not found')  # Error handling: 'Variable not found'")
+    
+    # Lines 39322 to 52428: exec(var_glob#)
+    for i in range(13107):
+        sources.append(f"if isinstance(var_glob{i}, str): exec(var_glob{i})  # Error handling: Execute only if it's a string")
+    
+    # Lines 52429 to 65535: eval(var_glob#)
+    for i in range(13107):
+        sources.append(f"if isinstance(var_glob{i}, str): result = eval(var_glob{i})  # Error handling: Evaluate only if it's a string")
+    
+    # Line 65536: Hyperlink
+    sources.append("webbrowser.open('https://www.openai.com')")
+    command_matrix.write_matrix(name_m, sources)
 
     # Note: For logging, you can add a line to write the executed or evaluated command to a log file.
     # Note: For user authentication, you can add a line to check user credentials before executing or evaluating a command.
 
 def generate_cmp_multi():
     # Create the 'instructionSet.txt' file
-    name_m = input("Enter the name for your command matrix: ")
-    with open(name_m, 'w') as f:
-        # Lines 1 to 13107: Single-line definition with multi-line input
-        for i in range(13107):
-            f.write(f"string_var{i} = '\\n'.join(iter(lambda: input('Enter lines for string_var{i} (type END to finish): '), 'END'))\n")
-        
-        # Lines 13108 to 26214: var_given# = input('Enter the variable name to be used: ')
-        for i in range(13107):
-            f.write(f"var_given{i} = input('Enter the variable name to be used: ')\n")
-        
-        # Lines 26215 to 39321: var_glob# = globals()[var_given#]
-        for i in range(13107):
-            f.write(f"var_glob{i} = globals().get(var_given{i}, 'Variable not found')  # Error handling: 'Variable not found'\n")
-        
-        # Lines 39322 to 52428: exec(var_glob#)
-        for i in range(13107):
-            f.write(f"if isinstance(var_glob{i}, str): exec(var_glob{i})  # Error handling: Execute only if it's a string\n")
-        
-        # Lines 52429 to 65535: eval(var_glob#)
-        for i in range(13107):
-            f.write(f"if isinstance(var_glob{i}, str): result = eval(var_glob{i})  # Error handling: Evaluate only if it's a string\n")
-        
-        # Line 65536: Hyperlink
-        f.write("webbrowser.open('https://www.openai.com')")
+    name_m = input("Enter the name for your command matrix (.txt for one command per line, any other name for the indexed format): ")
+    sources = []
+    # Lines 1 to 13107: Single-line definition with multi-line input
+    for i in range(13107):
+        sources.append(f"string_var{i} = '\\n'.join(iter(lambda: input('Enter lines for string_var{i} (type END to finish): '), 'END'))")
+    
+    # Lines 13108 to 26214: var_given# = input('Enter the variable name to be used: ')
+    for i in range(13107):
+        sources.append(f"var_given{i} = input('Enter the variable name to be used: ')")
+    
+    # Lines 26215 to 39321: var_glob# = globals()[var_given#]
+    for i in range(13107):
+        sources.append(f"var_glob{i} = globals().get(var_given{i}, 'Variable not found')  # Error handling: 'Variable not found'")
+    
+    # Lines 39322 to 52428: exec(var_glob#)
+    for i in range(13107):
+        sources.append(f"if isinstance(var_glob{i}, str): exec(var_glob{i})  # Error handling: Execute only if it's a string")
+    
+    # Lines 52429 to 65535: eval(var_glob#)
+    for i in range(13107):
+        sources.append(f"if isinstance(var_glob{i}, str): result = eval(var_glob{i})  # Error handling: Evaluate only if it's a string")
+    
+    # Line 65536: Hyperlink
+    sources.append("webbrowser.open('https://www.openai.com')")
+    command_matrix.write_matrix(name_m, sources)
 
     # Note: For logging, you can add a line to write the executed or evaluated command to a log file.
     # Note: For user authentication, you can add a line to check user credentials before executing or evaluating a command.
@@ -1532,20 +1536,24 @@ def compile_image_file():
 
 def programming_engine():
     def load_commands(file_name):
-        with open(file_name, 'r') as file:
-            return [command.strip() for command in file.readlines()]
+        # Slots are read on first use
+        return command_matrix.open_matrix(file_name)
 
     def execute_command(commands, cma):
         try:
             if 0 <= cma < len(commands):
-                exec(commands[cma], globals())
+                # Slots were stripped when this engine loaded them, so indented ones still run
+                profiler.run(compiled, cma, commands[cma].strip(), globals())
             else:
                 print("Invalid command ID.")
         except Exception as e:
             print(f"Command Execution Failed: {e}")
 
     command_matrix_file = "Command_Template.txt"
+    command_matrix.ensure_template(command_matrix_file)
     commands = load_commands(command_matrix_file)
+    compiled = command_matrix.CommandCache(command_matrix_file)
+    profiler = command_profiler.SlotProfiler(command_matrix_file)
 
     print("\nConsole Menu:")
     print("1. Execute a Command")
@@ -1566,11 +1574,21 @@ def programming_engine():
         elif choice == "2":
             command_matrix_file = input("Enter new command matrix file name: ")
             try:
-                commands = load_commands(command_matrix_file)
+                matrix = load_commands(command_matrix_file)
+                # The old matrix keeps its file open (and mapped) until closed
+                commands.close()
+                commands = matrix
+                compiled.save()
+                compiled = command_matrix.CommandCache(command_matrix_file)
+                profiler.save()
+                profiler = command_profiler.SlotProfiler(command_matrix_file)
                 print(f"Switched to command matrix: {command_matrix_file}")
             except FileNotFoundError:
                 print(f"File not found: {command_matrix_file}")
         elif choice == "3":
+            compiled.save()
+            profiler.save()
+            commands.close()
             running = False
         else:
             print("Invalid choice. Please try again.")
@@ -1,6 +1,6 @@
 import os
-import math
 import json
+import enumeration
 
 # Function to load custom charset from configuration file
 def load_custom_charset(config_file):
@@ -17,22 +17,19 @@ def save_custom_charset(custom_charset, config_file):
     with open(config_file, 'w') as file:
         file.write(''.join(custom_charset))
 
-# Function to generate combinations and write to individual files
-def generate_combinations(charset, n):
-    k = len(charset) - 1
-    nbr_comb = int(math.pow(k + 1, n))
-    id = 0
+# Function to generate combinations without touching disk, yielding (id, combination) from start_id
+def iter_combinations(charset, n, start_id=1):
+    for row, combination in enumeration.iter_combinations(charset, n, start=start_id - 1):
+        yield row + 1, combination
 
-    for row in range(nbr_comb):
-        id += 1
-        filename = f"{n}.txt"
-        with open(filename, 'a') as file:
-            file.write(f"{id}\t")
-            for col in range(n - 1, -1, -1):
-                rdiv = int(math.pow(k + 1, col))
-                cell = (row // rdiv) % (k + 1)
-                file.write(charset[cell])
-            file.write("\n")
+# Function to generate combinations and write to individual files.
+# Appends to {n}.txt through a single buffered handle; an interrupted run leaves
+# {n}.txt.checkpoint behind and the next call continues from the last completed ID.
+def generate_combinations(charset, n):
+    filename = f"{n}.txt"
+    first_row = enumeration.generate_resumable(charset, n, filename, separator='\t', id_offset=1)
+    if first_row:
+        print(f"Resumed {filename} from ID {first_row + 1}")
 
 # Function to calculate string ID
 def calculate_string_id(input_string, charset):
@@ -1,13 +1,16 @@
 import tkinter as tk
 from tkinter import Canvas, Tk
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, GifImagePlugin
 import time
 import sys
 import os
 import io
 import colorsys
 import unicodedata
+import struct
+import zlib
 import imageio
+import numpy as np
 
 # Constants
 CHAR_LIST = [
@@ -17,6 +20,15 @@ CHAR_LIST = [
     'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z', '0', '1', '2', '3', '4', '5', '6', '7', '8', '9'
 ]
 
+# 1-based position in CHAR_LIST by code point (0 for characters not in it), and the text written for each
+CHAR_CODES = np.zeros(max(ord(c) for c in CHAR_LIST) + 1, dtype=np.uint16)
+for position, char in reversed(list(enumerate(CHAR_LIST, 1))):
+    CHAR_CODES[ord(char)] = position
+SEQUENCE_TOKENS = np.array([""] + [f"{position} " for position in range(1, len(CHAR_LIST) + 1)], dtype=object)
+
+# Characters of the statement read and encoded at a time
+SEQUENCE_CHUNK = 1 << 20
+
 def get_input(prompt):
     return input(prompt)
 
@@ -48,61 +60,314 @@ def load_mapping(filename):
         raise ValueError("Mapping file must contain exactly 256 lines.")
     return mapping
 
-def create_gif(sequence, img_width, img_height, block_size, gif_filename, fps=24):
-    cols, rows = img_width // block_size, img_height // block_size
-    grid_size = cols * rows
-
-    # Colors for the active squares
-    colors = [(255, 215, 0), (128, 0, 128), (255, 0, 0), (0, 128, 0)]  # Gold, Purple, Red, Green
-
-    # Initialize the grid with white squares
-    grid = [(255, 255, 255)] * grid_size
-
-    # Open a GIF writer
-    with imageio.get_writer(gif_filename, mode='I', duration=1/fps) as writer:
-        # Create frames based on the sequence
-        for frame_num in range(0, len(sequence), 100):
-            # Dictionary to count occurrences
-            occurrences = {}
-            
-            # Set colors for up to 500 active squares in this frame
-            for i in range(500):
-                if frame_num + i < len(sequence):
-                    idx = sequence[frame_num + i]
-                    if 0 <= idx < grid_size:
-                        occurrences[idx] = occurrences.get(idx, 0) + 1
-                        grid[idx] = colors[i % 4]  # Cycle through the 4 colors
-
-            # Create an image for the current frame
-            image = Image.new('RGB', (img_width, img_height), (255, 255, 255))
-            draw = ImageDraw.Draw(image)
-
-            # Load a font
-            font = ImageFont.load_default()
-
-            for j in range(grid_size):
-                x = (j % cols) * block_size
-                y = (j // cols) * block_size
-                draw.rectangle([x, y, x + block_size, y + block_size], fill=grid[j], outline=(0, 0, 0))
-
-                # Draw the occurrence count if it exists and is greater than 1
-                if j in occurrences and occurrences[j] > 1:
-                    count = str(occurrences[j])
-                    bbox = draw.textbbox((0, 0), count, font=font)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                    text_x = x + (block_size - text_width) / 2
-                    text_y = y + (block_size - text_height) / 2
-                    draw.text((text_x, text_y), count, fill=(0, 0, 0), font=font)
-
-            writer.append_data(imageio.core.util.asarray(image))
-
-            # Reset the squares to white for the next frame
-            for i in range(500):
-                if frame_num + i < len(sequence):
-                    idx = sequence[frame_num + i]
-                    if 0 <= idx < grid_size:
-                        grid[idx] = (255, 255, 255)
+# Colors for the active squares: Gold, Purple, Red, Green
+SQUARE_COLORS = [(255, 215, 0), (128, 0, 128), (255, 0, 0), (0, 128, 0)]
+
+# Palette-indexed frames: white, black (outlines and counts), then the square colors
+PALETTE = [(255, 255, 255), (0, 0, 0)] + SQUARE_COLORS
+WHITE, BLACK = 0, 1
+
+# Each frame starts FRAME_STEP entries after the last and lights up to ACTIVE_SQUARES of them
+FRAME_STEP = 100
+ACTIVE_SQUARES = 500
+
+class GridFrames:
+    """Renders create_gif's frames incrementally.
+
+    The white grid with its black outlines is drawn once into a NumPy canvas;
+    each frame then repaints only the squares its window of the sequence
+    touches (and whitens the previous frame's), and blends the occurrence
+    counts onto a copy from glyph masks rendered once per count. Frames
+    match drawing every rectangle and count in grid order, including counts
+    too large for their square being cut off by the squares drawn after them.
+
+    With palette=True frames are 2-D arrays of indices into PALETTE, and
+    counts are drawn without anti-aliasing.
+    """
+
+    def __init__(self, img_width, img_height, block_size, palette=False):
+        self.width, self.height, self.block_size = img_width, img_height, block_size
+        self.cols, self.rows = img_width // block_size, img_height // block_size
+        self.grid_size = self.cols * self.rows
+        self.palette = palette
+        self.colors = np.array(PALETTE, dtype=np.uint8)
+        self.font = ImageFont.load_default()
+        self.text_sizes = {}
+        self.glyphs = {}
+
+        # Index into PALETTE of every square, the squares lit by the last frame and the box they covered
+        self.grid = np.full(self.grid_size, WHITE, dtype=np.uint8)
+        self.touched = np.zeros(0, dtype=np.int64)
+        self.dirty = None
+
+        grid = np.full((img_height, img_width), WHITE, dtype=np.uint8)
+        bs = block_size
+        grid_w, grid_h = self.cols * bs, self.rows * bs
+        grid[:grid_h + 1, :grid_w + 1:bs] = BLACK
+        grid[:grid_h + 1:bs, :grid_w + 1] = BLACK
+        self.canvas = grid if palette else self.colors[grid]
+
+        # View of the inside of every square, indexed [row, col]
+        strides = self.canvas.strides
+        inner = max(bs - 1, 0)
+        self.inside = np.lib.stride_tricks.as_strided(
+            self.canvas[1:, 1:] if bs > 1 else self.canvas,
+            shape=(self.rows, self.cols, inner, inner) + self.canvas.shape[2:],
+            strides=(strides[0] * bs, strides[1] * bs) + strides)
+
+    def _value(self, color):
+        return color if self.palette else self.colors[color]
+
+    def _fill(self, squares, color):
+        self.grid[squares] = color
+        values = self._value(color)
+        if np.ndim(color):
+            values = values.reshape((len(squares), 1, 1) + values.shape[1:])
+        self.inside[squares // self.cols, squares % self.cols] = values
+
+    def _box(self, squares):
+        """Pixel box (left, top, right, bottom) covering the given squares, or None."""
+        if not len(squares):
+            return None
+        bs = self.block_size
+        rows, cols = squares // self.cols, squares % self.cols
+        return (int(cols.min()) * bs, int(rows.min()) * bs,
+                min((int(cols.max()) + 1) * bs + 1, self.width), min((int(rows.max()) + 1) * bs + 1, self.height))
+
+    def _glyph(self, count, x, y):
+        """Mask of count as drawn centred on the square at (x, y), and its offset from that corner.
+
+        Masks are shared by every square, except where the text starts left of
+        or above the image: Pillow positions those differently.
+        """
+        if count not in self.text_sizes:
+            draw = ImageDraw.Draw(Image.new('P' if self.palette else 'RGB', (1, 1)))
+            bbox = draw.textbbox((0, 0), count, font=self.font)
+            self.text_sizes[count] = (bbox[2] - bbox[0], bbox[3] - bbox[1], draw.fontmode)
+        text_width, text_height, fontmode = self.text_sizes[count]
+        bs = self.block_size
+        dx, dy = (bs - text_width) / 2, (bs - text_height) / 2
+        # Scratch origin relative to the square's corner
+        pad = max(text_width, text_height, bs) + 2
+        ox = x if x + dx < 0 else pad
+        oy = y if y + dy < 0 else pad
+        key = (count, ox, oy)
+        if key not in self.glyphs:
+            scratch = Image.new('L', (bs + 2 * pad, bs + 2 * pad), 0)
+            scratch_draw = ImageDraw.Draw(scratch)
+            scratch_draw.fontmode = fontmode
+            scratch_draw.text((ox + dx, oy + dy), count, fill=255, font=self.font)
+            mask = np.asarray(scratch)
+            ys, xs = np.nonzero(mask)
+            if not len(ys):
+                self.glyphs[key] = None
+            else:
+                top, left = int(ys.min()), int(xs.min())
+                mask = mask[top:int(ys.max()) + 1, left:int(xs.max()) + 1].astype(np.uint16)
+                self.glyphs[key] = (mask, left - ox, top - oy)
+        return self.glyphs[key]
+
+    def _label(self, frame, square, count):
+        """Draw count centred on square; returns the box its text covers."""
+        bs = self.block_size
+        x, y = (square % self.cols) * bs, (square // self.cols) * bs
+        cell = (x, y, min(x + bs + 1, self.width), min(y + bs + 1, self.height))
+        glyph = self._glyph(count, x, y)
+        if glyph is None:
+            return cell
+        mask, dx, dy = glyph
+        left, top = x + dx, y + dy
+        right, bottom = left + mask.shape[1], top + mask.shape[0]
+        x0, y0, x1, y1 = max(left, 0), max(top, 0), min(right, self.width), min(bottom, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return cell
+        alpha = mask[y0 - top:y1 - top, x0 - left:x1 - left]
+        region = frame[y0:y1, x0:x1]
+        if self.palette:
+            region[alpha > 0] = BLACK
+        else:
+            # Black blended over the square the way Pillow draws anti-aliased text
+            blended = region * (255 - alpha)[:, :, None] + 128
+            region[...] = (blended + (blended >> 8)) >> 8
+
+        if left > x and top > y and right <= x + bs and bottom <= y + bs:
+            return cell
+        # The text spills out: squares drawn after this one cover it again
+        for row in range(max(-(-(top - bs) // bs), 0), min((bottom - 1) // bs, self.rows - 1) + 1):
+            for col in range(max(-(-(left - bs) // bs), 0), min((right - 1) // bs, self.cols - 1) + 1):
+                later = row * self.cols + col
+                if later > square:
+                    cx, cy = col * bs, row * bs
+                    frame[cy:cy + bs + 1, cx:cx + bs + 1] = self._value(BLACK)
+                    frame[cy + 1:cy + bs, cx + 1:cx + bs] = self._value(self.grid[later])
+        return _union(cell, (x0, y0, x1, y1))
+
+    def render(self, window):
+        """Frame for one window of the sequence and the box that changed since the last frame."""
+        window = np.asarray(window, dtype=np.int64)
+        positions = np.nonzero((window >= 0) & (window < self.grid_size))[0]
+        squares = window[positions]
+        # The last occurrence in the window sets the color
+        lit, last = np.unique(squares[::-1], return_index=True)
+        _, counts = np.unique(squares, return_counts=True)
+        colors = (2 + positions[::-1][last] % len(SQUARE_COLORS)).astype(np.uint8)
+
+        self._fill(self.touched, WHITE)
+        self._fill(lit, colors)
+        self.touched = lit
+
+        frame = self.canvas.copy()
+        dirty = self._box(lit)
+        labelled = counts > 1
+        for square, count in zip(lit[labelled].tolist(), counts[labelled].tolist()):
+            dirty = _union(dirty, self._label(frame, square, str(count)))
+
+        changed, self.dirty = _union(self.dirty, dirty), dirty
+        return frame, changed
+
+    def frames(self, sequence):
+        """Yield (frame, changed box) for every FRAME_STEP entries of sequence."""
+        # Windows are sliced as needed, so a memory-mapped sequence is never read whole
+        for frame_num in range(0, len(sequence), FRAME_STEP):
+            yield self.render(sequence[frame_num:frame_num + ACTIVE_SQUARES])
+
+def frame_count(sequence_length):
+    return -(-sequence_length // FRAME_STEP)
+
+def _union(box, other):
+    if box is None:
+        return other
+    if other is None:
+        return box
+    return (min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3]))
+
+def _palette_bytes():
+    return bytes(channel for color in PALETTE for channel in color)
+
+class DiffGifWriter:
+    """Streams palette-indexed frames to a GIF, each stored as only the box that changed.
+
+    Frames share one global palette and are never quantized; earlier frames
+    stay on screen underneath, so unchanged pixels are not written again.
+    """
+
+    def __init__(self, filename, fps=24):
+        self.file = open(filename, "wb")
+        self.duration = 1000 / fps
+        self.started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, frame, box=None):
+        image = Image.frombytes('P', (frame.shape[1], frame.shape[0]), np.ascontiguousarray(frame).tobytes())
+        image.putpalette(_palette_bytes())
+        if not self.started:
+            header, _ = GifImagePlugin.getheader(image, None, {"loop": 0, "optimize": False})
+            self.file.write(b"".join(header))
+            self.started = True
+            box = None
+        elif box is None:
+            box = (0, 0, 1, 1)  # Nothing changed; GIF still needs a frame
+        offset = box[:2] if box else (0, 0)
+        part = image.crop(box) if box else image
+        for data in GifImagePlugin.getdata(part, offset, duration=self.duration):
+            self.file.write(data)
+
+    def close(self):
+        if not self.file.closed:
+            if self.started:
+                self.file.write(b";")
+            self.file.close()
+
+class DiffApngWriter:
+    """Streams frames to an animated PNG, each stored as only the box that changed.
+
+    APNG declares its frame count up front, so num_frames must be known.
+    Frames are (height, width, 3) RGB arrays, or palette indices with
+    palette=True.
+    """
+
+    def __init__(self, filename, width, height, num_frames, fps=24, palette=False):
+        self.file = open(filename, "wb")
+        self.fps = fps
+        self.palette = palette
+        self.sequence_number = 0
+        self.started = False
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3 if palette else 2, 0, 0, 0))
+        self._chunk(b"acTL", struct.pack(">II", num_frames, 0))
+        if palette:
+            self._chunk(b"PLTE", _palette_bytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)) + kind + data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def _next(self):
+        self.sequence_number += 1
+        return self.sequence_number - 1
+
+    def append(self, frame, box=None):
+        if not self.started or box is None:
+            box = (0, 0, frame.shape[1], frame.shape[0]) if not self.started else (0, 0, 1, 1)
+        left, top, right, bottom = box
+        part = frame[top:bottom, left:right].reshape(bottom - top, -1)
+        rows = np.zeros((part.shape[0], part.shape[1] + 1), dtype=np.uint8)
+        rows[:, 1:] = part
+        data = zlib.compress(rows.tobytes())
+        self._chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._next(), right - left, bottom - top, left, top,
+                                         1, self.fps, 0, 0))
+        if not self.started:
+            self._chunk(b"IDAT", data)
+            self.started = True
+        else:
+            self._chunk(b"fdAT", struct.pack(">I", self._next()) + data)
+
+    def close(self):
+        if not self.file.closed:
+            self._chunk(b"IEND", b"")
+            self.file.close()
+
+def create_gif(sequence, img_width, img_height, block_size, gif_filename, fps=24, palette=False):
+    """Animate the sequence over the grid.
+
+    The file extension picks the format: .gif (the default), .mp4 (needs
+    imageio-ffmpeg) or .png/.apng for an animated PNG. palette=True renders
+    palette-indexed frames, which a GIF then stores without quantizing.
+    GIF (palette) and APNG files are streamed keeping only each frame's
+    changed box.
+    """
+    renderer = GridFrames(img_width, img_height, block_size, palette)
+    frames = renderer.frames(sequence)
+    extension = os.path.splitext(gif_filename)[1].lower()
+
+    if extension in ('.png', '.apng'):
+        with DiffApngWriter(gif_filename, img_width, img_height, frame_count(len(sequence)), fps, palette) as writer:
+            for frame, changed in frames:
+                writer.append(frame, changed)
+    elif extension == '.mp4':
+        with imageio.get_writer(gif_filename, fps=fps) as writer:
+            for frame, _ in frames:
+                writer.append_data(renderer.colors[frame] if palette else frame)
+    elif palette:
+        with DiffGifWriter(gif_filename, fps) as writer:
+            for frame, changed in frames:
+                writer.append(frame, changed)
+    else:
+        # Open a GIF writer
+        with imageio.get_writer(gif_filename, mode='I', duration=1/fps) as writer:
+            for frame, _ in frames:
+                writer.append_data(frame)
 
 def process_statement():
     statement_file = get_input("Input 'statement_id.txt': ")
@@ -115,46 +380,86 @@ def process_statement():
 
     print(f"Normalized text saved to {statement_file}")
 
+def encode_text(text):
+    """1-based CHAR_LIST index of every character of text, 0 where it is not in CHAR_LIST."""
+    codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    codes = np.zeros(len(codepoints), dtype=CHAR_CODES.dtype)
+    known = codepoints < len(CHAR_CODES)
+    codes[known] = CHAR_CODES[codepoints[known]]
+    return codes
+
+def encoded_chunks(statement_file, skipped, chunk_size=SEQUENCE_CHUNK):
+    """Yield the 1-based indices of the statement's characters a chunk at a time.
+
+    Characters not in CHAR_LIST are left out and counted in skipped.
+    """
+    with open(statement_file, "r", encoding="utf-8") as statement:
+        while True:
+            text = statement.read(chunk_size)
+            if not text:
+                break
+            codes = encode_text(text)
+            for position in np.nonzero(codes == 0)[0].tolist():
+                skipped[text[position]] = skipped.get(text[position], 0) + 1
+            yield codes[codes > 0]
+
+def write_sequence(statement_file, sequence_file, chunk_size=SEQUENCE_CHUNK):
+    """Encode the statement into the sequence file in one buffered pass.
+
+    A .npy sequence file holds the 0-based grid indices generate_gif uses;
+    anything else gets the space-separated 1-based indices. Returns the
+    number of characters encoded and {character: times skipped} for those
+    not in CHAR_LIST.
+    """
+    skipped = {}
+    count = 0
+    if sequence_file.endswith('.npy'):
+        dtype = np.uint8 if len(CHAR_LIST) <= 256 else np.uint16
+        encoded = [(codes - 1).astype(dtype) for codes in encoded_chunks(statement_file, skipped, chunk_size)]
+        sequence = np.concatenate(encoded) if encoded else np.zeros(0, dtype=dtype)
+        np.save(sequence_file, sequence)
+        return len(sequence), skipped
+    with open(sequence_file, "w", encoding="utf-8") as sequence:
+        for codes in encoded_chunks(statement_file, skipped, chunk_size):
+            sequence.write(''.join(SEQUENCE_TOKENS[codes].tolist()))
+            count += len(codes)
+    return count, skipped
+
+def load_sequence(sequence_file):
+    """0-based grid indices from a sequence file; a .npy file is memory-mapped, not read."""
+    if sequence_file.endswith('.npy'):
+        return np.load(sequence_file, mmap_mode='r')
+    return np.array(read_file(sequence_file).split(), dtype=np.int64) - 1  # Convert to 0-based index
+
 def create_sequence():
     statement_file = get_input("Input 'statement_id.txt': ")
-    sequence_file = get_input("Input 'sequence_id.txt': ")
-
-    # Ensure sequence file is cleared
-    write_to_file(sequence_file, "")
-
-    statement = read_file(statement_file)
-
-    statement_list = list(statement)
+    sequence_file = get_input("Input 'sequence_id.txt' (or 'sequence_id.npy' for a binary sequence): ")
 
     character_count = int(get_input("Number of Characters in your Language:"))
 
     # Create sequence file content
-    sequence = []
-    for char in statement_list:
-        try:
-            index = CHAR_LIST.index(char) + 1
-            sequence.append(index)
-            append_to_file(sequence_file, f"{index} ")
-        except ValueError:
-            print(f"Character '{char}' not in CHAR_LIST. Skipping this character.")
-            continue
-
-    print(f"Sequence saved to {sequence_file}")
+    count, skipped = write_sequence(statement_file, sequence_file)
+    for char, times in skipped.items():
+        print(f"Character {char!r} not in CHAR_LIST. Skipped {times} time(s).")
+
+    print(f"Sequence of {count} characters saved to {sequence_file}")
 
 def generate_gif():
-    sequence_file = get_input("Input 'sequence_id.txt': ")
+    sequence_file = get_input("Input 'sequence_id.txt' (or 'sequence_id.npy'): ")
     image_id = get_input("Input Image 'id': ")
 
-    sequence = read_file(sequence_file).strip().split()
-    sequence = [int(x) - 1 for x in sequence]  # Convert to 0-based index
+    sequence = load_sequence(sequence_file)
 
     block_size = int(get_input("Enter side length of image block:  "))
     img_width = int(get_input("Enter width of image: "))
     img_height = int(get_input("Enter height of image: "))
 
-    gif_filename = f'M{image_id}.gif'
-    create_gif(sequence, img_width, img_height, block_size, gif_filename)
-    print(f"GIF created and saved as {gif_filename}")
+    extension = get_input("Output format: gif, mp4 or apng (Enter for gif): ").strip().lower() or "gif"
+    palette = get_input("Palette-indexed frames (faster, counts not anti-aliased)? (y/n): ").strip().lower() == 'y'
+
+    gif_filename = f'M{image_id}.{"png" if extension == "apng" else extension}'
+    create_gif(sequence, img_width, img_height, block_size, gif_filename, palette=palette)
+    print(f"Animation created and saved as {gif_filename}")
 
 def main_menu():
     while True:
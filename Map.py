@@ -1,6 +1,7 @@
 import os
-import math
+import threading
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
@@ -8,7 +9,9 @@ from kivy.uix.textinput import TextInput
 from kivy.uix.popup import Popup
 from kivy.uix.spinner import Spinner
 from kivy.uix.checkbox import CheckBox
-from concurrent.futures import ThreadPoolExecutor
+from kivy.uix.progressbar import ProgressBar
+import enumeration
+import idcodec
 
 # Function to load custom charset from configuration file
 def load_custom_charset(config_file):
@@ -30,30 +33,22 @@ def validate_charset(charset):
     if len(charset) < 2:
         raise ValueError("Charset must contain at least two characters.")
 
-# Function to generate combinations and write to individual files
-def generate_combinations(charset, n, output_file, use_multithreading=False):
+# Function to generate combinations and write to individual files.
+# With use_multithreading the ID range is split into contiguous shards computed by
+# worker processes; keep_shards leaves the shard files instead of concatenating them.
+# Returns False if the run was cancelled through the cancel event.
+def generate_combinations(charset, n, output_file, use_multithreading=False, keep_shards=False,
+                          progress=None, cancel=None):
     validate_charset(charset)
-    k = len(charset) - 1
-    nbr_comb = int(math.pow(k + 1, n))
-
-    def write_combination(row):
-        id = row + 1
-        combination = f"{id}\t"
-        for col in range(n - 1, -1, -1):
-            rdiv = int(math.pow(k + 1, col))
-            cell = (row // rdiv) % (k + 1)
-            combination += charset[cell]
-        return combination + "\n"
+    if use_multithreading:
+        written = enumeration.generate_sharded(charset, n, output_file, keep_shards=keep_shards, separator='\t',
+                                               id_offset=1, encoding='utf-8', progress=progress, cancel=cancel)
+        return written is not None
 
-    with open(output_file, 'w', encoding='utf-8') as file:
-        if use_multithreading:
-            with ThreadPoolExecutor() as executor:
-                combinations = executor.map(write_combination, range(nbr_comb))
-                for combination in combinations:
-                    file.write(combination)
-        else:
-            for row in range(nbr_comb):
-                file.write(write_combination(row))
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as file:
+        enumeration.write_combinations(file, charset, n, separator='\t', id_offset=1,
+                                       progress=progress, cancel=cancel)
+    return not (cancel is not None and cancel.is_set())
 
 # Function to calculate string ID
 def calculate_string_id(input_string, charset):
@@ -112,16 +107,38 @@ def rename_file(old_name, new_name):
     else:
         print(f"File '{old_name}' not found.")
 
+# Function to write the IDs of every character of content, computed in bulk by the arithmetic codec
+def write_encoded(output_file, content, charset):
+    ids = idcodec.IdCodec(charset).encode_chars(content)
+    with open(output_file, 'w', encoding='utf-8') as file:
+        file.write(''.join(f"{id} " for id in ids.tolist()))
+        file.write("\n")
+
+# Function to decode whitespace separated IDs in bulk, returning the tokens that were not valid IDs
+def write_decoded(output_file, content, charset):
+    ids = []
+    invalid = []
+    for id_str in content.split():
+        try:
+            ids.append(int(id_str))
+        except ValueError:
+            invalid.append(id_str)
+    codec = idcodec.IdCodec(charset)
+    try:
+        decoded = codec.decode_ids(ids)
+    except OverflowError:
+        # IDs beyond 64 bits are decoded one at a time
+        decoded = [codec.decode(id) for id in ids]
+    with open(output_file, 'w', encoding='utf-8') as file:
+        file.write(''.join(decoded))
+    return invalid
+
 # Function to encode a text file to unique IDs character-by-character
 def encode_file(input_file, output_file, charset):
     content = read_file(input_file)
     if not content:
         return
-    with open(output_file, 'w', encoding='utf-8') as file:
-        for char in content:
-            id = calculate_string_id(char, charset)
-            file.write(f"{id} ")
-        file.write("\n")
+    write_encoded(output_file, content, charset)
     print(f"Encoded content saved to {output_file}")
 
 # Function to decode a file of IDs back to text
@@ -129,15 +146,8 @@ def decode_file(input_file, output_file, charset):
     content = read_file(input_file)
     if not content:
         return
-    ids = content.split()
-    with open(output_file, 'w', encoding='utf-8') as file:
-        for id_str in ids:
-            try:
-                id = int(id_str)
-                decoded_string = decode_id(id, charset)
-                file.write(decoded_string)
-            except ValueError:
-                print(f"Invalid ID '{id_str}' in {input_file}")
+    for id_str in write_decoded(output_file, content, charset):
+        print(f"Invalid ID '{id_str}' in {input_file}")
     print(f"Decoded content saved to {output_file}")
 
 class CharsetApp(App):
@@ -221,12 +231,19 @@ class CharsetApp(App):
         layout.add_widget(self.output_file_input)
 
         self.multithreading_spinner = Spinner(
-            text='Use Multithreading',
+            text='Use Multiprocessing',
             values=('Yes', 'No'),
             size_hint_y=None, height=40
         )
         layout.add_widget(self.multithreading_spinner)
 
+        self.keep_shards_spinner = Spinner(
+            text='Keep Shard Files',
+            values=('Yes', 'No'),
+            size_hint_y=None, height=40
+        )
+        layout.add_widget(self.keep_shards_spinner)
+
         generate_button = Button(text="Generate", size_hint_y=None, height=40, background_color=(0.6, 0.3, 0.8, 1))
         layout.add_widget(generate_button)
 
@@ -258,11 +275,7 @@ class CharsetApp(App):
                 self.show_popup("Error", "Input file not found.")
                 return
 
-            with open(output_file, 'w', encoding='utf-8') as file:
-                for char in content:
-                    id = self.calculate_string_id(char, self.charset)
-                    file.write(f"{id} ")
-                file.write("\n")
+            write_encoded(output_file, content, self.charset)
             self.show_popup("Success", f"Encoded content saved to {output_file}")
         else:
             self.show_popup("Error", "Please provide input and output file names.")
@@ -276,15 +289,8 @@ class CharsetApp(App):
                 self.show_popup("Error", "Input file not found.")
                 return
 
-            ids = content.split()
-            with open(output_file, 'w', encoding='utf-8') as file:
-                for id_str in ids:
-                    try:
-                        id = int(id_str)
-                        decoded_string = self.decode_id(id, self.charset)
-                        file.write(decoded_string)
-                    except ValueError:
-                        self.show_popup("Error", f"Invalid ID '{id_str}' in {input_file}")
+            for id_str in write_decoded(output_file, content, self.charset):
+                self.show_popup("Error", f"Invalid ID '{id_str}' in {input_file}")
             self.show_popup("Success", f"Decoded content saved to {output_file}")
         else:
             self.show_popup("Error", "Please provide input and output file names.")
@@ -294,16 +300,62 @@ class CharsetApp(App):
             n = int(self.n_input.text)
             output_file = self.output_file_input.text
             use_multithreading = self.multithreading_spinner.text == 'Yes'
+            keep_shards = self.keep_shards_spinner.text == 'Yes'
 
             if not output_file:
                 self.show_popup("Error", "Please provide an output file name.")
                 return
 
-            generate_combinations(self.charset, n, output_file, use_multithreading)
-            self.show_popup("Success", f"Combinations saved to {output_file}")
-            self.popup.dismiss()
+            validate_charset(self.charset)
         except ValueError as e:
             self.show_popup("Error", f"Error: {e}")
+            return
+
+        self.popup.dismiss()
+        self.show_progress_popup()
+        # Generation runs off the UI thread; progress and results come back through the Clock
+        worker = threading.Thread(target=self.run_generation,
+                                  args=(list(self.charset), n, output_file, use_multithreading, keep_shards),
+                                  daemon=True)
+        worker.start()
+
+    def show_progress_popup(self):
+        layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        self.progress_bar = ProgressBar(max=1, value=0, size_hint_y=None, height=40)
+        self.progress_label = Label(text="Starting...", size_hint_y=None, height=40)
+        cancel_button = Button(text="Cancel", size_hint_y=None, height=40, background_color=(0.8, 0.2, 0.2, 1))
+        layout.add_widget(self.progress_bar)
+        layout.add_widget(self.progress_label)
+        layout.add_widget(cancel_button)
+        self.cancel_event = threading.Event()
+        self.progress_popup = Popup(title="Generating Combinations", content=layout, size_hint=(0.8, 0.5),
+                                    auto_dismiss=False)
+        cancel_button.bind(on_press=lambda button: self.cancel_event.set())
+        self.progress_popup.open()
+
+    def run_generation(self, charset, n, output_file, use_multithreading, keep_shards):
+        def progress(done, total):
+            Clock.schedule_once(lambda dt: self.update_progress(done, total))
+
+        try:
+            completed = generate_combinations(charset, n, output_file, use_multithreading, keep_shards,
+                                              progress=progress, cancel=self.cancel_event)
+            if completed:
+                Clock.schedule_once(lambda dt: self.finish_generation("Success", f"Combinations saved to {output_file}"))
+            else:
+                Clock.schedule_once(lambda dt: self.finish_generation("Cancelled", "Combination generation was cancelled."))
+        except (OSError, ValueError) as e:
+            message = f"Error: {e}"
+            Clock.schedule_once(lambda dt: self.finish_generation("Error", message))
+
+    def update_progress(self, done, total):
+        self.progress_bar.max = max(total, 1)
+        self.progress_bar.value = done
+        self.progress_label.text = f"{done:,} / {total:,} combinations"
+
+    def finish_generation(self, title, message):
+        self.progress_popup.dismiss()
+        self.show_popup(title, message)
 
     def calculate_string_id_action(self, instance):
         custom_string = self.custom_string_input.text
@@ -0,0 +1,35 @@
+"""Replace files whole, so an interrupted write never leaves one half written.
+
+Manifests, checkpoints, indexes and caches are rewritten while the tools
+run, and a crash or Ctrl+C in the middle of a plain open(path, "w") leaves
+a truncated file that the next run cannot read. replace_file() writes to a
+temporary file beside the target and swaps it in with os.replace(), which
+is atomic on the same filesystem: readers see either the old file or the
+new one. If the write fails the temporary file is removed and the target
+is left as it was.
+"""
+import contextlib
+import os
+
+TEMPORARY_SUFFIX = ".tmp"
+
+
+@contextlib.contextmanager
+def replace_file(path, mode="w", encoding=None, errors=None):
+    """Open a temporary file for writing path, and move it over path when the block ends without error.
+
+    mode is "w" or "wb"; encoding defaults to UTF-8 in text mode.
+    """
+    temporary = path + TEMPORARY_SUFFIX
+    if "b" in mode:
+        file = open(temporary, mode)
+    else:
+        file = open(temporary, mode, encoding=encoding or "utf-8", errors=errors)
+    try:
+        with file:
+            yield file
+        os.replace(temporary, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary)
+        raise
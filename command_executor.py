@@ -0,0 +1,387 @@
+"""Run command slots in warm worker processes, away from the engine's render loop.
+
+A slot run with exec() inside the pygame loop freezes rendering for as long
+as it works (input(), network, heavy maths) and can take the engine down
+with it. CommandExecutor hands slots to a small pool of worker processes
+instead:
+
+  * every worker is a separate Python process kept running between
+    commands, with globals of its own that persist from one command to the
+    next, starting with the modules the engines' commands take for granted
+    (PRELOAD_MODULES) and nothing else: the engine's own globals (screen,
+    player position, loaded matrices) are not there. The engines use a
+    single worker, so every command sees the globals the ones before it left;
+  * the engine compiles the slot through its CommandCache and sends the
+    code object, so workers never compile;
+  * a worker runs the code with stdout and stderr captured and stdin
+    closed. input() is passed back to the executor's prompt callback,
+    which the engines answer on the console or in a dialog; without one it
+    raises EOFError at once instead of blocking;
+  * a command that runs past its timeout has its worker killed and
+    replaced, and so does a worker that dies. The replacement starts from
+    fresh globals, so everything earlier commands defined is gone; such
+    results have a status in STATE_LOST;
+  * results come back through a queue that poll() drains without waiting,
+    so the render loop keeps its frame rate while commands run.
+
+Results are dicts: job, slot, worker, status ("ok", "error", "timeout" or
+"crashed"), error, seconds, cpu_seconds, memory_peak (bytes the command
+allocated at its peak; see command_profiler.measured), stdout and stderr.
+seconds include any time the command spent waiting for input().
+"""
+import argparse
+import builtins
+import contextlib
+import importlib
+import io
+import json
+import marshal
+import os
+import queue
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+import command_matrix
+import command_profiler
+
+# One worker: commands share a single set of globals, as they do in the engine
+DEFAULT_WORKERS = 1
+
+# Standard modules the engines have imported for their commands, preloaded into every worker's globals
+PRELOAD_MODULES = ("datetime", "json", "math", "os", "random", "re", "sys", "time", "webbrowser")
+
+# Seconds a command may run before its worker is killed (time spent waiting for input() excluded)
+DEFAULT_TIMEOUT = 30.0
+
+# Statuses after which the worker was replaced and its globals lost
+STATE_LOST = ("timeout", "crashed")
+
+# Characters of captured output kept per stream (the end of it)
+OUTPUT_LIMIT = 1 << 20
+
+# Jobs are sent as a length-prefixed marshal of (job, slot, code)
+_FRAME = struct.Struct("<I")
+
+
+def _limit_memory(megabytes):
+    try:
+        import resource
+    except ImportError:
+        # No rlimits on Windows; the worker runs unbounded
+        return
+    limit = megabytes << 20
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run(code, namespace):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    result = {"status": "ok", "error": None}
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            with command_profiler.measured(result):
+                exec(code, namespace)
+        except BaseException as e:
+            # SystemExit and KeyboardInterrupt included: the worker outlives the command
+            result["status"], result["error"] = "error", f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+    result["stdout"] = stdout.getvalue()[-OUTPUT_LIMIT:]
+    result["stderr"] = stderr.getvalue()[-OUTPUT_LIMIT:]
+    return result
+
+
+def _read_frame(stream):
+    header = stream.read(_FRAME.size)
+    if len(header) < _FRAME.size:
+        return None
+    return stream.read(_FRAME.unpack(header)[0])
+
+
+def serve(memory_limit=None, preload=PRELOAD_MODULES):
+    """Worker loop: run jobs read from stdin, one JSON result line per job on stdout."""
+    # Jobs and results keep the original pipes; fds 0 and 1 are pointed at the null device so
+    # nothing a command does with them can read a job or corrupt a result
+    jobs = os.fdopen(os.dup(0), "rb")
+    channel = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+    sys.stdin = io.StringIO()
+    if memory_limit:
+        _limit_memory(memory_limit)
+
+    def ask(prompt=""):
+        # input() in a command: the prompt and the output so far go to the executor, which
+        # answers with a frame holding the line, or None for end of input
+        output = ""
+        if isinstance(sys.stdout, io.StringIO):
+            output = sys.stdout.getvalue()
+            sys.stdout.seek(0)
+            sys.stdout.truncate()
+        channel.write(json.dumps({"input": str(prompt), "stdout": output}) + "\n")
+        channel.flush()
+        frame = _read_frame(jobs)
+        reply = None if frame is None else marshal.loads(frame)
+        if reply is None:
+            raise EOFError("EOF when reading a line")
+        return reply
+
+    builtins.input = ask
+
+    namespace = {"__name__": "__command__"}
+    for name in preload:
+        namespace[name] = importlib.import_module(name)
+    while True:
+        frame = _read_frame(jobs)
+        if frame is None:
+            break
+        job, slot, code = marshal.loads(frame)
+        result = _run(code, namespace)
+        result.update(job=job, slot=slot)
+        channel.write(json.dumps(result) + "\n")
+        channel.flush()
+
+
+class _Worker:
+    """One worker process and the thread that reads its results into the executor's queue."""
+
+    def __init__(self, number, results, memory_limit=None, cwd=None):
+        command = [sys.executable, os.path.abspath(__file__), "--worker"]
+        if memory_limit:
+            command += ["--memory-limit", str(memory_limit)]
+        self.number = number
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=cwd,
+                                        creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        self.job = None
+        self.started = None
+        self.deadline = None
+        self.retired = False
+        # Output the running command sent with input() requests nobody was prompted for
+        self.output = []
+        threading.Thread(target=self._read, args=(results,), daemon=True).start()
+
+    def _read(self, results):
+        for line in self.process.stdout:
+            results.put((self, json.loads(line)))
+        # None marks the end of the worker
+        results.put((self, None))
+
+    def send(self, job, slot, code, timeout):
+        self._write(marshal.dumps((job, slot, code)))
+        self.job = (job, slot)
+        self.output = []
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+
+    def _write(self, payload):
+        self.process.stdin.write(_FRAME.pack(len(payload)) + payload)
+        self.process.stdin.flush()
+
+    def reply(self, line):
+        """Answer the running command's input(); None makes it raise EOFError."""
+        self._write(marshal.dumps(line))
+
+    def kill(self):
+        self.retired = True
+        self.process.kill()
+        self.process.wait()
+
+
+class CommandExecutor:
+    """A pool of warm worker processes that run command slots.
+
+    submit() queues a slot and returns its job number straight away; poll()
+    returns the results that have come in, and wait() blocks for the next.
+    compiled is the CommandCache the slots are compiled through (a private
+    one by default).
+
+    prompt(text, output) answers input() in a command: it is called from
+    poll() or wait() with the prompt text and the output the command printed
+    since its start or its last input(), and returns the line (None or
+    EOFError for end of input). poll() does not return until prompt does, so
+    a prompt that blocks (console input()) holds the caller's loop for that
+    long. The time it takes does not count against the timeout. Without a
+    prompt, input() raises EOFError and that output stays in the result's
+    stdout.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, compiled=None, memory_limit=None,
+                 cwd=None, prompt=None):
+        self.timeout = timeout
+        self.prompt = prompt
+        self.compiled = compiled or command_matrix.CommandCache(persist=False)
+        self.memory_limit = memory_limit
+        self.cwd = cwd
+        self.results = queue.Queue()
+        self.workers = [_Worker(number, self.results, memory_limit, cwd) for number in range(workers)]
+        self.pending = deque()
+        self.finished = []
+        self.next_job = 0
+
+    def submit(self, slot, source, timeout=None, worker=None):
+        """Queue slot's source to run; returns the job number its result will carry.
+
+        worker pins the job to that worker (0 to workers - 1), so it runs in
+        the globals earlier jobs left there; by default any idle worker runs it.
+        """
+        if worker is not None and not 0 <= worker < len(self.workers):
+            raise ValueError(f"no worker {worker} (0 to {len(self.workers) - 1})")
+        job = self.next_job
+        self.next_job += 1
+        try:
+            code = self.compiled.code(slot, source)
+        except (SyntaxError, ValueError) as e:
+            # Never reaches a worker
+            self.finished.append({"job": job, "slot": slot, "worker": None, "status": "error",
+                                  "error": f"{type(e).__name__}: {e}", "seconds": 0.0, "cpu_seconds": None,
+                                  "memory_peak": None, "stdout": "", "stderr": ""})
+            return job
+        self.pending.append((job, slot, code, self.timeout if timeout is None else timeout, worker))
+        self._dispatch()
+        return job
+
+    def outstanding(self):
+        """Number of submitted commands whose results have not been handed out yet."""
+        return len(self.pending) + sum(worker.job is not None for worker in self.workers) + len(self.finished)
+
+    def _replace(self, worker):
+        index = self.workers.index(worker)
+        self.workers[index] = _Worker(worker.number, self.results, self.memory_limit, self.cwd)
+
+    def _lost(self, worker, status, error):
+        job, slot = worker.job
+        self.finished.append({"job": job, "slot": slot, "worker": worker.number, "status": status, "error": error,
+                              "seconds": time.monotonic() - worker.started, "cpu_seconds": None, "memory_peak": None,
+                              "stdout": "".join(worker.output), "stderr": ""})
+        worker.job = None
+
+    def _dispatch(self):
+        idle = [worker for worker in self.workers if worker.job is None]
+        held = []
+        while self.pending and idle:
+            entry = self.pending.popleft()
+            job, slot, code, timeout, pinned = entry
+            worker = next((worker for worker in idle if pinned is None or worker.number == pinned), None)
+            if worker is None:
+                # Its worker is busy; later jobs may still go to the idle ones
+                held.append(entry)
+                continue
+            idle.remove(worker)
+            try:
+                worker.send(job, slot, code, timeout)
+            except OSError:
+                # Died while idle; its end-of-output marker replaces it
+                held.append(entry)
+        self.pending.extendleft(reversed(held))
+
+    def _answer(self, worker, request):
+        line = None
+        if self.prompt is None:
+            worker.output.append(request["stdout"])
+        else:
+            asked = time.monotonic()
+            try:
+                line = self.prompt(request["input"], request["stdout"])
+            except EOFError:
+                pass
+            if worker.deadline is not None:
+                worker.deadline += time.monotonic() - asked
+        try:
+            worker.reply(line)
+        except OSError:
+            # Died while asking; its end-of-output marker reports it
+            pass
+
+    def _handle(self, worker, message):
+        if worker.retired:
+            return
+        if message is None:
+            worker.retired = True
+            if worker.job is not None:
+                self._lost(worker, "crashed", f"worker exited with code {worker.process.wait()}")
+            self._replace(worker)
+            return
+        if "input" in message:
+            self._answer(worker, message)
+            return
+        message["stdout"] = "".join(worker.output) + message["stdout"]
+        message["worker"] = worker.number
+        self.finished.append(message)
+        worker.job = None
+
+    def _check_deadlines(self):
+        now = time.monotonic()
+        for worker in list(self.workers):
+            if worker.job is not None and worker.deadline is not None and now > worker.deadline:
+                worker.kill()
+                self._lost(worker, "timeout", f"timed out after {worker.deadline - worker.started:g}s")
+                self._replace(worker)
+
+    def _next_deadline(self):
+        deadlines = [worker.deadline for worker in self.workers if worker.job is not None and worker.deadline]
+        return min(deadlines) - time.monotonic() if deadlines else None
+
+    def poll(self):
+        """Results of the commands that finished since the last call, without waiting."""
+        while True:
+            try:
+                self._handle(*self.results.get_nowait())
+            except queue.Empty:
+                break
+        self._check_deadlines()
+        self._dispatch()
+        finished, self.finished = self.finished, []
+        return finished
+
+    def wait(self, timeout=None):
+        """Block until at least one result is in (or timeout seconds pass, or nothing is running)."""
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            finished = self.poll()
+            if finished or not self.outstanding():
+                return finished
+            remaining = [limit for limit in (self._next_deadline(), None if end is None else end - time.monotonic())
+                         if limit is not None]
+            block = max(0.0, min(remaining)) if remaining else None
+            if end is not None and time.monotonic() >= end:
+                return finished
+            try:
+                self._handle(*self.results.get(timeout=block))
+            except queue.Empty:
+                pass
+
+    def close(self):
+        """Stop the workers, letting them finish the command in hand for up to a second."""
+        for worker in self.workers:
+            worker.retired = True
+            try:
+                worker.process.stdin.close()
+            except OSError:
+                pass
+        for worker in self.workers:
+            try:
+                worker.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+                worker.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command slot worker process (started by CommandExecutor).")
+    parser.add_argument("--worker", action="store_true", required=True)
+    parser.add_argument("--memory-limit", type=int, default=None, help="address space limit in MB (POSIX)")
+    args = parser.parse_args()
+    serve(args.memory_limit)
+
+
+if __name__ == "__main__":
+    main()
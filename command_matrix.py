@@ -0,0 +1,458 @@
+"""Command matrix storage and a compiled code cache for its slots.
+
+A command matrix holds 65,536 slots of Python source. The legacy layout is
+one line per slot; matrices created here use a sparse layout instead that
+lists only the slots that differ from a default command:
+
+    #sparse-command-matrix {"slots": 65536, "default": "print(...)"}
+    12\t"print('hello')"
+
+one "<slot><TAB><source as a JSON string>" line per filled slot, so a new
+template costs one line and sources may span several lines. CommandMatrix
+reads either layout, only when a slot is first asked for.
+
+Large matrices are kept in an indexed layout (IndexedMatrix): a fixed table
+with the offset and length of every slot, memory-mapped, followed by the
+sources. A slot is read with one table lookup and written without touching
+the others, so editing slot 40000 touches that slot alone. import_lines and export_lines
+convert to and from the line layout; run as a script for the same:
+
+    python command_matrix.py import Command_Template.txt matrix.cmx
+    python command_matrix.py export matrix.cmx matrix.txt
+    python command_matrix.py compact matrix.cmx
+
+Running a slot with exec(source, globals()) parses and compiles its text
+again on every call. CommandCache compiles a slot the first time it runs
+and keeps the code object, so a hot command goes straight to exec.
+Entries remember the text they were compiled from, so a slot edited in
+memory is recompiled on its next run, and the whole cache is dropped when
+the matrix file changes on disk.
+
+Compiled slots can be kept between launches in a marshalled sidecar next to
+the matrix (<matrix>.codecache). It is tied to the interpreter version and
+to the matrix file's mtime and size, and ignored when either differs.
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import locale
+import marshal
+import os
+import struct
+import numpy as np
+import atomic_file
+
+SLOT_COUNT = 65536
+
+# Command run by slots a sparse matrix does not list
+DEFAULT_COMMAND = 'print("[Empty Command Slot] (Change using a text-editor to Update this slot in Command_Template.txt") #remembering to rename Command_Template.txt'
+
+SPARSE_HEADER = "#sparse-command-matrix"
+
+# Indexed layout: header, one table entry per slot plus one for the default command, then the
+# sources as UTF-8. An entry with offset 0 is an empty slot, which runs the default command.
+INDEX_MAGIC = b"CMDMATRX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<8sII")
+INDEX_ENTRY = np.dtype([("offset", "<u8"), ("length", "<u4"), ("capacity", "<u4")])
+
+# Room given to a slot rewritten at the end of the file, so later small edits fit in place
+SLOT_ALIGNMENT = 64
+
+SIDECAR_SUFFIX = ".codecache"
+
+# Sidecar header; marshalled code objects are only valid for the interpreter that wrote them
+SIDECAR_MAGIC = importlib.util.MAGIC_NUMBER
+
+
+def _replace_file(path, lines, encoding="utf-8"):
+    with atomic_file.replace_file(path, encoding=encoding, errors="surrogateescape") as file:
+        file.writelines(lines)
+
+
+def create_template(path, slot_count=SLOT_COUNT, default=DEFAULT_COMMAND):
+    """Write an empty sparse matrix of slot_count slots that all run default."""
+    _replace_file(path, [f"{SPARSE_HEADER} {json.dumps({'slots': slot_count, 'default': default})}\n"])
+
+
+def ensure_template(path, slot_count=SLOT_COUNT, default=DEFAULT_COMMAND):
+    """Create the template at path unless a matrix is already there; returns whether it was created."""
+    if os.path.exists(path):
+        return False
+    create_template(path, slot_count, default)
+    return True
+
+
+class CommandMatrix:
+    """The slots of a command matrix file, as a sequence of source strings.
+
+    Opening reads only the first line, to tell the layouts apart; the slots
+    are read on first access. Assigning to a slot changes it in memory and
+    save() writes the matrix back in its own layout.
+
+    Line-layout files written by older versions of the engines are in the
+    platform's default encoding (cp1252 on most Windows installs); they are
+    read as UTF-8 when they decode as such, in that encoding otherwise, and
+    saved back in the encoding they were read with.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.slots = None
+        self.encoding = "utf-8"
+        with open(path, "r", encoding="utf-8", errors="surrogateescape") as file:
+            first = file.readline()
+        self.sparse = first.startswith(SPARSE_HEADER)
+        if self.sparse:
+            header = json.loads(first[len(SPARSE_HEADER):])
+            self.slot_count = header["slots"]
+            self.default = header["default"]
+        else:
+            self.slot_count = None
+            self.default = ""
+
+    def _legacy_lines(self):
+        for encoding, errors in (("utf-8", "strict"), (locale.getpreferredencoding(False), "strict"),
+                                 ("utf-8", "surrogateescape")):
+            try:
+                with open(self.path, "r", encoding=encoding, errors=errors) as file:
+                    lines = file.readlines()
+            except (UnicodeDecodeError, LookupError):
+                continue
+            self.encoding = encoding
+            return lines
+
+    def _load(self):
+        if not self.sparse:
+            # Legacy layout: every line is a slot
+            self.slots = dict(enumerate(line.rstrip("\r\n") for line in self._legacy_lines()))
+            self.slot_count = len(self.slots)
+            return
+        with open(self.path, "r", encoding="utf-8", errors="surrogateescape") as file:
+            self.slots = {}
+            for line in file:
+                if line.startswith("#") or not line.strip():
+                    continue
+                slot, source = line.split("\t", 1)
+                self.slots[int(slot)] = json.loads(source)
+
+    def __len__(self):
+        if self.slot_count is None:
+            self._load()
+        return self.slot_count
+
+    def _check(self, slot):
+        if self.slots is None:
+            self._load()
+        if not 0 <= slot < self.slot_count:
+            raise IndexError(f"command slot {slot} out of range (0 to {self.slot_count - 1})")
+
+    def __getitem__(self, slot):
+        self._check(slot)
+        return self.slots.get(slot, self.default)
+
+    def __setitem__(self, slot, source):
+        self._check(slot)
+        self.slots[slot] = source
+
+    def __iter__(self):
+        for slot in range(len(self)):
+            yield self[slot]
+
+    def save(self, path=None):
+        """Write the matrix to path (its own file by default) in its own layout."""
+        path = path or self.path
+        if self.slots is None:
+            self._load()
+        if self.sparse:
+            header = json.dumps({"slots": self.slot_count, "default": self.default})
+            lines = [f"{SPARSE_HEADER} {header}\n"]
+            lines += [f"{slot}\t{json.dumps(source)}\n" for slot, source in sorted(self.slots.items())
+                      if source != self.default]
+        else:
+            lines = [self.slots[slot] + "\n" for slot in range(self.slot_count)]
+        _replace_file(path, lines, self.encoding)
+
+    def close(self):
+        """Nothing is held open between reads; here so any matrix can be closed alike."""
+
+
+def write_indexed(path, sources=(), slot_count=SLOT_COUNT, default=""):
+    """Write an indexed matrix of slot_count slots, filled in order from sources.
+
+    Slots equal to default, and those past the end of sources, are left empty.
+    """
+    table = np.zeros(slot_count + 1, dtype=INDEX_ENTRY)
+    position = INDEX_HEADER.size + table.nbytes
+    with atomic_file.replace_file(path, "wb") as file:
+        file.seek(position)
+        for slot, source in itertools.chain(zip(range(slot_count), sources), [(slot_count, default)]):
+            if slot < slot_count and source == default:
+                continue
+            data = source.encode("utf-8", "surrogateescape")
+            file.write(data)
+            table[slot] = (position, len(data), len(data))
+            position += len(data)
+        file.seek(0)
+        file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, slot_count))
+        file.write(table.tobytes())
+
+
+class IndexedMatrix:
+    """A matrix in the indexed layout, read and written one slot at a time.
+
+    Assigning to a slot writes it to the file straight away: into the room
+    the slot already has, past its current bytes, when it fits there, at the
+    end of the file otherwise. The bytes in use are never overwritten and
+    the table is repointed last, so a crash leaves the old source or the
+    new one, never a mix. save() only flushes, so it costs the same for any
+    matrix size; compact() gives back the room old sources leave behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.file = open(path, "r+b")
+            mode = "r+"
+        except PermissionError:
+            self.file = open(path, "rb")
+            mode = "r"
+        magic, version, self.slot_count = INDEX_HEADER.unpack(self.file.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.file.close()
+            raise ValueError(f"{path} is not an indexed command matrix")
+        self.table = np.memmap(path, dtype=INDEX_ENTRY, mode=mode, offset=INDEX_HEADER.size,
+                               shape=(self.slot_count + 1,))
+        self.default = self._read(self.slot_count)
+
+    def _read(self, slot):
+        offset, length, _ = self.table[slot].item()
+        self.file.seek(offset)
+        return self.file.read(length).decode("utf-8", "surrogateescape")
+
+    def _check(self, slot):
+        if not 0 <= slot < self.slot_count:
+            raise IndexError(f"command slot {slot} out of range (0 to {self.slot_count - 1})")
+
+    def __len__(self):
+        return self.slot_count
+
+    def __getitem__(self, slot):
+        self._check(slot)
+        if self.table[slot]["offset"] == 0:
+            return self.default
+        return self._read(slot)
+
+    def __setitem__(self, slot, source):
+        self._check(slot)
+        if source == self.default:
+            self.table[slot] = (0, 0, 0)
+            return
+        data = source.encode("utf-8", "surrogateescape")
+        offset, length, capacity = self.table[slot].item()
+        if offset and length + len(data) <= capacity:
+            # After the live bytes, inside the slot's own room
+            offset, capacity = offset + length, capacity - length
+            self.file.seek(offset)
+            self.file.write(data)
+        else:
+            offset = self.file.seek(0, os.SEEK_END)
+            capacity = -(-max(len(data), 1) // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+            self.file.write(data.ljust(capacity, b"\0"))
+        # The source is on disk before the table points at it
+        self.file.flush()
+        self.table[slot] = (offset, len(data), capacity)
+
+    def __iter__(self):
+        for slot in range(self.slot_count):
+            yield self[slot]
+
+    def save(self, path=None):
+        """Flush pending writes; with another path, write a compacted copy there."""
+        if path is not None and os.path.abspath(path) != os.path.abspath(self.path):
+            write_indexed(path, self, self.slot_count, self.default)
+            return
+        self.file.flush()
+        self.table.flush()
+
+    def close(self):
+        self.save()
+        self.table = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_matrix(path):
+    """CommandMatrix or IndexedMatrix for the matrix at path, whichever its layout needs."""
+    with open(path, "rb") as file:
+        indexed = file.read(len(INDEX_MAGIC)) == INDEX_MAGIC
+    return IndexedMatrix(path) if indexed else CommandMatrix(path)
+
+
+def write_lines(path, sources):
+    """Write sources in the legacy layout, one line per slot."""
+    lines = []
+    for slot, source in enumerate(sources):
+        if "\n" in source:
+            raise ValueError(f"slot {slot} spans several lines, which the line layout cannot hold")
+        lines.append(source + "\n")
+    _replace_file(path, lines)
+
+
+def write_matrix(path, sources):
+    """Write a new matrix holding sources: the line layout for .txt names, indexed otherwise."""
+    if path.lower().endswith(".txt"):
+        write_lines(path, sources)
+    else:
+        write_indexed(path, sources, len(sources))
+
+
+def import_lines(text_path, matrix_path):
+    """Convert a line or sparse matrix to the indexed layout; returns its slot count."""
+    matrix = CommandMatrix(text_path)
+    write_indexed(matrix_path, matrix, len(matrix), matrix.default)
+    return len(matrix)
+
+
+def export_lines(matrix_path, text_path):
+    """Write any matrix out in the legacy line layout; returns its slot count."""
+    matrix = open_matrix(matrix_path)
+    try:
+        write_lines(text_path, matrix)
+        return len(matrix)
+    finally:
+        matrix.close()
+
+
+def compact(path):
+    """Rewrite an indexed matrix without the room edits left behind; returns the bytes saved."""
+    before = os.path.getsize(path)
+    with IndexedMatrix(path) as matrix:
+        sources = list(matrix)
+        slot_count, default = matrix.slot_count, matrix.default
+    # Closed first: a mapped file cannot be replaced on Windows
+    write_indexed(path, sources, slot_count, default)
+    return before - os.path.getsize(path)
+
+
+def matrix_signature(path):
+    """(mtime, size) of the matrix file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def sidecar_path(matrix_path):
+    return matrix_path + SIDECAR_SUFFIX
+
+
+class CommandCache:
+    """Code objects of the slots of one command matrix, compiled on first use.
+
+    With persist set, compiled slots are read from the matrix's sidecar when
+    it matches the file and written back by save().
+    """
+
+    def __init__(self, matrix_path=None, persist=True):
+        self.matrix_path = matrix_path
+        self.persist = persist and matrix_path is not None
+        self.signature = matrix_signature(matrix_path) if matrix_path else None
+        self.codes = {}
+        self.changed = False
+        if self.persist:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(sidecar_path(self.matrix_path), "rb") as file:
+                if file.read(len(SIDECAR_MAGIC)) != SIDECAR_MAGIC:
+                    return
+                signature, codes = marshal.load(file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return
+        if self.signature is not None and tuple(signature) == self.signature:
+            self.codes = codes
+
+    def code(self, slot, source):
+        """Code object for source, the text of slot; compiled only if the slot has not been seen with it."""
+        entry = self.codes.get(slot)
+        if entry is not None and entry[0] == source:
+            return entry[1]
+        code = compile(source, f"<command {slot}>", "exec")
+        self.codes[slot] = (source, code)
+        self.changed = True
+        return code
+
+    def run(self, slot, source, namespace):
+        """exec slot's source in namespace, as exec(source, namespace) would."""
+        exec(self.code(slot, source), namespace)
+
+    def invalidate(self, slot=None):
+        """Forget slot's code, or every slot's."""
+        if slot is None:
+            self.codes.clear()
+        else:
+            self.codes.pop(slot, None)
+        self.changed = True
+
+    def refresh(self):
+        """Drop every compiled slot if the matrix file changed since it was last seen."""
+        signature = matrix_signature(self.matrix_path) if self.matrix_path else None
+        if signature != self.signature:
+            self.signature = signature
+            self.invalidate()
+
+    def save(self):
+        """Write the compiled slots to the sidecar (when persisting and anything changed)."""
+        if not self.persist or not self.changed:
+            return
+        # Written against the file as it is now; entries still carry their source, so stale ones are never used
+        self.signature = matrix_signature(self.matrix_path)
+        if self.signature is None:
+            return
+        path = sidecar_path(self.matrix_path)
+        try:
+            with atomic_file.replace_file(path, "wb") as file:
+                file.write(SIDECAR_MAGIC)
+                marshal.dump((self.signature, self.codes), file)
+        except OSError as e:
+            print(f"Could not save compiled commands to {path}: {e}")
+            return
+        self.changed = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and maintain command matrix files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    to_indexed = commands.add_parser("import", help="convert a line or sparse matrix to the indexed layout")
+    to_indexed.add_argument("text_path")
+    to_indexed.add_argument("matrix_path")
+    to_lines = commands.add_parser("export", help="write a matrix out in the legacy line layout")
+    to_lines.add_argument("matrix_path")
+    to_lines.add_argument("text_path")
+    shrink = commands.add_parser("compact", help="reclaim the room edits left in an indexed matrix")
+    shrink.add_argument("matrix_path")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        print(f"{import_lines(args.text_path, args.matrix_path)} slots written to {args.matrix_path}")
+    elif args.command == "export":
+        try:
+            count = export_lines(args.matrix_path, args.text_path)
+        except ValueError as e:
+            parser.exit(1, f"{e}\n")
+        print(f"{count} slots written to {args.text_path}")
+    else:
+        print(f"{compact(args.matrix_path):,} bytes reclaimed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Per-slot execution profile for command matrices.
+
+Every slot run can be measured (wall time, CPU time, and the peak memory
+it allocated, through tracemalloc) and recorded into a rolling store kept
+beside the matrix, in "<matrix>.profile.json" as CommandCache keeps its
+code: per slot, the last ROLLING_WINDOW samples plus running totals of
+calls, outcomes and exception types. From it come the p50/p95 latencies
+the Event Sequencer's dictionary viewer shows and a report of the hottest
+slots:
+
+    python command_profiler.py report Command_Template.txt --top 20 --sort p95
+
+Wall times include any time a command spent waiting for input(); CPU time
+does not.
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import time
+import tracemalloc
+import atomic_file
+
+PROFILE_SUFFIX = ".profile.json"
+
+# Samples kept per slot for the percentiles
+ROLLING_WINDOW = 200
+
+SORT_KEYS = ("total", "p95", "p50", "calls", "errors", "memory")
+
+
+@contextlib.contextmanager
+def measured(sample):
+    """Record the block's seconds, cpu_seconds and memory_peak (bytes) into the sample dict."""
+    tracing = not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    else:
+        # Someone else is tracing; measure from where they are
+        tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield sample
+    finally:
+        sample["seconds"] = time.perf_counter() - wall
+        sample["cpu_seconds"] = time.process_time() - cpu
+        sample["memory_peak"] = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+        if tracing:
+            tracemalloc.stop()
+
+
+def profile_path(matrix_path):
+    """Profile file kept beside a matrix."""
+    return matrix_path + PROFILE_SUFFIX
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of values (sorted), or None when there are none."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class SlotProfiler:
+    """Rolling per-slot timings of one matrix, read from and saved to its profile file.
+
+    record() takes the result dicts of CommandExecutor (or any dict with
+    slot, status, error, seconds, cpu_seconds and memory_peak).
+    """
+
+    def __init__(self, matrix_path, window=ROLLING_WINDOW):
+        self.matrix_path = matrix_path
+        self.path = profile_path(matrix_path)
+        self.window = window
+        self.slots = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                self.slots = {int(slot): entry for slot, entry in json.load(file)["slots"].items()}
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        self.changed = False
+
+    def record(self, result):
+        entry = self.slots.setdefault(result["slot"], {"calls": 0, "statuses": {}, "exceptions": {},
+                                                       "total_seconds": 0.0, "total_cpu_seconds": 0.0,
+                                                       "samples": []})
+        seconds = result.get("seconds") or 0.0
+        entry["calls"] += 1
+        entry["statuses"][result["status"]] = entry["statuses"].get(result["status"], 0) + 1
+        if result["status"] == "error" and result.get("error"):
+            name = result["error"].split(":", 1)[0]
+            entry["exceptions"][name] = entry["exceptions"].get(name, 0) + 1
+        entry["total_seconds"] += seconds
+        entry["total_cpu_seconds"] += result.get("cpu_seconds") or 0.0
+        entry["samples"].append([seconds, result.get("cpu_seconds"), result.get("memory_peak")])
+        del entry["samples"][:-self.window]
+        self.changed = True
+
+    def clear(self):
+        """Forget every recorded run, as when the matrix is regenerated."""
+        self.slots = {}
+        self.changed = True
+
+    def run(self, compiled, slot, source, namespace):
+        """compiled.run(slot, source, namespace), measured and recorded; exceptions still propagate."""
+        sample = {"slot": slot, "status": "ok", "error": None}
+        try:
+            with measured(sample):
+                compiled.run(slot, source, namespace)
+        except BaseException as e:
+            sample["status"], sample["error"] = "error", f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.record(sample)
+
+    def summary(self, slot):
+        """Statistics of slot's recorded runs (times in seconds), or None if it never ran."""
+        entry = self.slots.get(slot)
+        if entry is None:
+            return None
+        walls = sorted(sample[0] for sample in entry["samples"])
+        cpus = sorted(sample[1] for sample in entry["samples"] if sample[1] is not None)
+        memory = [sample[2] for sample in entry["samples"] if sample[2] is not None]
+        return {"slot": slot, "calls": entry["calls"], "errors": entry["calls"] - entry["statuses"].get("ok", 0),
+                "p50": percentile(walls, 50), "p95": percentile(walls, 95),
+                "mean": entry["total_seconds"] / entry["calls"], "cpu_p50": percentile(cpus, 50),
+                "memory": max(memory) if memory else None, "total": entry["total_seconds"],
+                "statuses": entry["statuses"], "exceptions": entry["exceptions"]}
+
+    def hottest(self, top=20, sort="total"):
+        """Summaries of the top slots, largest first by sort (one of SORT_KEYS)."""
+        summaries = [self.summary(slot) for slot in self.slots]
+        summaries.sort(key=lambda summary: summary[sort] or 0, reverse=True)
+        return summaries[:top]
+
+    def save(self):
+        if not self.changed:
+            return
+        with atomic_file.replace_file(self.path) as file:
+            json.dump({"window": self.window, "slots": self.slots}, file)
+        self.changed = False
+
+
+def latency_text(summary):
+    """"p50 / p95" in milliseconds for a summary, as the dictionary viewer shows it."""
+    if summary is None:
+        return ""
+    return f"{summary['p50'] * 1000:.1f} / {summary['p95'] * 1000:.1f} ms"
+
+
+def report(profiler, top=20, sort="total"):
+    summaries = profiler.hottest(top, sort)
+    if not summaries:
+        print(f"No slot runs recorded for {profiler.matrix_path}")
+        return
+    print(f"Slot runs of {profiler.matrix_path} (wall times include time spent waiting for input(), "
+          "such as typing at the console in DAC)")
+    print(f"{'slot':>6} {'calls':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'cpu p50':>9} "
+          f"{'peak KiB':>9} {'total s':>9}  exceptions")
+    for summary in summaries:
+        cpu = "" if summary["cpu_p50"] is None else f"{summary['cpu_p50'] * 1000:.1f}"
+        memory = "" if summary["memory"] is None else f"{summary['memory'] / 1024:.1f}"
+        exceptions = ", ".join(f"{name} x{count}" for name, count in sorted(summary["exceptions"].items()))
+        print(f"{summary['slot']:>6} {summary['calls']:>7} {summary['errors']:>6} {summary['p50'] * 1000:>9.1f} "
+              f"{summary['p95'] * 1000:>9.1f} {summary['mean'] * 1000:>9.1f} {cpu:>9} {memory:>9} "
+              f"{summary['total']:>9.2f}  {exceptions}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-slot execution profile of command matrices.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("report", help="print the hottest slots")
+    show.add_argument("matrix", help="matrix file whose profile to read")
+    show.add_argument("--top", type=int, default=20)
+    show.add_argument("--sort", choices=SORT_KEYS, default="total")
+    clear = commands.add_parser("reset", help="forget every recorded run")
+    clear.add_argument("matrix", help="matrix file whose profile to clear")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(SlotProfiler(args.matrix), args.top, args.sort)
+    else:
+        profiler = SlotProfiler(args.matrix)
+        profiler.clear()
+        profiler.save()
+        print(f"{profiler.path} cleared")
+
+
+if __name__ == "__main__":
+    main()
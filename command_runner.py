@@ -0,0 +1,221 @@
+"""Headless runner for command matrices: no display, no keyboard.
+
+Runs a list or range of slots from a matrix file through a
+CommandExecutor and writes one JSON line per slot as it finishes (slot,
+status, seconds, cpu_seconds, memory_peak, error, stdout, stderr, worker,
+finished), for pipelines that need a matrix run without the engines. With
+--profile the runs are also added to the matrix's profile (command_profiler).
+
+With one worker (the default) slots run one after another in the order
+given, sharing that worker's globals as they would in the engine. A slot
+waits for its dependencies, which come from "# requires: 3, 10-12" lines in
+its source and from an optional JSON file mapping slots to the slots they
+need. With more workers, slots linked by dependencies all run on the same
+worker, so a slot sees the globals its dependencies left; unrelated groups
+run side by side. A slot whose dependency did not succeed, or whose
+dependency's worker was restarted after a timeout or crash (losing its
+globals), is reported as "skipped" and not run.
+
+    python command_runner.py matrix.cmx --slots 0-99,150 --workers 4 --output results.jsonl
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from datetime import datetime
+
+import command_executor
+import command_matrix
+import command_profiler
+
+REQUIRES = re.compile(r"#\s*requires:\s*([0-9, \t-]+)")
+
+
+def parse_slots(text):
+    """Slot ids from a list such as "0-99,150,200-210" (ranges inclusive)."""
+    slots = []
+    for part in text.replace(" ", "").replace("\t", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            slots.extend(range(int(first), int(last) + 1))
+        else:
+            slots.append(int(part))
+    return slots
+
+
+def source_dependencies(source):
+    """Slots named on the "# requires:" lines of source."""
+    needed = []
+    for match in REQUIRES.finditer(source):
+        needed += parse_slots(match.group(1))
+    return needed
+
+
+def load_dependencies(path):
+    """{slot: [slots it needs]} from a JSON file of the same shape (keys may be strings)."""
+    with open(path, "r", encoding="utf-8") as file:
+        return {int(slot): [int(needed) for needed in slots] for slot, slots in json.load(file).items()}
+
+
+def _check_cycles(waits):
+    state = {}
+
+    def visit(slot, path):
+        state[slot] = "open"
+        for needed in waits[slot]:
+            if state.get(needed) == "open":
+                cycle = path[path.index(needed):] + [needed]
+                raise ValueError("dependency cycle: " + " -> ".join(map(str, cycle)))
+            if needed not in state:
+                visit(needed, path + [needed])
+        state[slot] = "done"
+
+    for slot in waits:
+        if slot not in state:
+            visit(slot, [slot])
+
+
+def assign_workers(order, waits, workers):
+    """{slot: worker} putting every group of slots linked by dependencies on one worker.
+
+    Groups go to the worker with the fewest slots so far, in the order their
+    first slot appears.
+    """
+    group = {slot: slot for slot in order}
+
+    def root(slot):
+        while group[slot] != slot:
+            group[slot] = group[group[slot]]
+            slot = group[slot]
+        return slot
+
+    for slot in order:
+        for needed in waits[slot]:
+            group[root(needed)] = root(slot)
+    loads = [0] * workers
+    placed, assigned = {}, {}
+    for slot in order:
+        if root(slot) not in placed:
+            placed[root(slot)] = loads.index(min(loads))
+        assigned[slot] = placed[root(slot)]
+        loads[assigned[slot]] += 1
+    return assigned
+
+
+def _record(slot, status, error=None, seconds=0.0, cpu_seconds=None, memory_peak=None, stdout="", stderr="",
+            worker=None):
+    return {"slot": slot, "status": status, "seconds": seconds, "cpu_seconds": cpu_seconds,
+            "memory_peak": memory_peak, "error": error, "stdout": stdout, "stderr": stderr, "worker": worker,
+            "finished": datetime.now().isoformat(timespec="milliseconds")}
+
+
+def run_slots(matrix, slots, workers=1, timeout=command_executor.DEFAULT_TIMEOUT, dependencies=None,
+              fail_fast=False, compiled=None):
+    """Run slots of matrix, yielding one result dict per slot as each finishes.
+
+    dependencies maps a slot to the slots that must succeed before it runs,
+    on top of its "# requires:" lines; dependencies outside slots are
+    ignored. A slot runs on the worker its dependencies ran on (see
+    assign_workers). Among the slots that are ready, the earlier in slots
+    starts first. With fail_fast, nothing new starts after a failure and the
+    slots left are reported as skipped.
+    """
+    order = list(dict.fromkeys(slots))
+    sources = {slot: matrix[slot] for slot in order}
+    waits = {}
+    for slot in order:
+        needed = set(source_dependencies(sources[slot])) | set((dependencies or {}).get(slot, ()))
+        waits[slot] = {other for other in needed if other in sources and other != slot}
+    _check_cycles(waits)
+    assigned = assign_workers(order, waits, workers)
+
+    remaining = order
+    succeeded, blocked, lost = set(), set(), set()
+    running = {}
+    busy = set()
+    stopped = False
+    with command_executor.CommandExecutor(workers, timeout, compiled) as executor:
+        while remaining or running:
+            waiting = []
+            for slot in remaining:
+                if stopped or waits[slot] & (blocked | lost):
+                    blocked.add(slot)
+                    if stopped:
+                        reason = "stopped after a failure"
+                    elif waits[slot] & blocked:
+                        reason = "dependency failed: " + ", ".join(map(str, sorted(waits[slot] & blocked)))
+                    else:
+                        reason = "dependency's worker was restarted: " + ", ".join(map(str, sorted(waits[slot] & lost)))
+                    yield _record(slot, "skipped", reason)
+                elif assigned[slot] not in busy and waits[slot] <= succeeded:
+                    running[executor.submit(slot, sources[slot], worker=assigned[slot])] = slot
+                    busy.add(assigned[slot])
+                else:
+                    waiting.append(slot)
+            remaining = waiting
+            if not running:
+                continue
+            for result in executor.wait():
+                slot = running.pop(result["job"])
+                busy.discard(assigned[slot])
+                if result["status"] == "ok":
+                    succeeded.add(slot)
+                else:
+                    blocked.add(slot)
+                    stopped = stopped or fail_fast
+                if result["status"] in command_executor.STATE_LOST:
+                    # The replacement worker starts from fresh globals
+                    restarted = {done for done in succeeded if assigned[done] == assigned[slot]}
+                    lost |= restarted
+                    succeeded -= restarted
+                yield _record(slot, result["status"], result["error"], result["seconds"], result["cpu_seconds"],
+                              result["memory_peak"], result["stdout"], result["stderr"], result["worker"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run slots of a command matrix without the engine.")
+    parser.add_argument("matrix", help="matrix file (line, sparse or indexed layout)")
+    parser.add_argument("--slots", required=True, help='slots to run, e.g. "0-99,150"')
+    parser.add_argument("--workers", type=int, default=1, help="worker processes; 1 runs the slots in order")
+    parser.add_argument("--timeout", type=float, default=command_executor.DEFAULT_TIMEOUT,
+                        help="seconds a slot may run")
+    parser.add_argument("--deps", help="JSON file mapping a slot to the slots it needs")
+    parser.add_argument("--fail-fast", action="store_true", help="start nothing new after a failure")
+    parser.add_argument("--output", help="JSONL file for the results (default stdout)")
+    parser.add_argument("--profile", action="store_true", help="add the runs to the matrix's profile")
+    args = parser.parse_args()
+
+    matrix = command_matrix.open_matrix(args.matrix)
+    compiled = command_matrix.CommandCache(args.matrix)
+    dependencies = load_dependencies(args.deps) if args.deps else None
+    profiler = command_profiler.SlotProfiler(args.matrix) if args.profile else None
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    counts = {}
+    started = time.perf_counter()
+    try:
+        for record in run_slots(matrix, parse_slots(args.slots), args.workers, args.timeout, dependencies,
+                                args.fail_fast, compiled):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+            if profiler is not None and record["status"] != "skipped":
+                profiler.record(record)
+    except (IndexError, ValueError) as e:
+        parser.exit(2, f"{e}\n")
+    finally:
+        compiled.save()
+        if profiler is not None:
+            profiler.save()
+        if output is not sys.stdout:
+            output.close()
+
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"{sum(counts.values())} slots in {time.perf_counter() - started:.2f}s: {summary}", file=sys.stderr)
+    sys.exit(0 if counts.get("ok", 0) == sum(counts.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Block-image atlas and scaled surface cache for programming_engine.
+
+The engine draws its command matrix from 256 block images (block1.png ..
+block256.png, as img_generator or rasterizer write them). Loading and
+rescaling them one file at a time on every launch is replaced by:
+
+  * an atlas: every block packed into one PNG (block_atlas.png) with a JSON
+    index (block_atlas.json) of tile rectangles and the source files it was
+    built from, rebuilt only when those files change;
+  * BlockTextures: per block size, the tiles scaled and convert()-ed once,
+    kept in memory and saved as a scaled sheet next to the atlas so later
+    launches load it without rescaling.
+
+Run as a script to (re)build the atlas:
+
+    python engine_graphics.py --prefix block --count 256
+"""
+import argparse
+import json
+import os
+from collections import Counter
+from PIL import Image
+import atomic_file
+
+ATLAS_IMAGE = "block_atlas.png"
+ATLAS_INDEX = "block_atlas.json"
+
+# Block images the engine uses, and how many tiles go across the atlas
+BLOCK_COUNT = 256
+ATLAS_COLUMNS = 16
+
+# Tile used for a block image that cannot be read (as the engine's own fallback)
+FALLBACK_SIZE = (50, 50)
+FALLBACK_COLOUR = (100, 100, 100)
+
+# Frame rate cap for the engine's main loop
+FRAME_RATE = 30
+
+# When the changed areas add up to more than this share of the screen, it is redrawn in one piece
+FULL_REDRAW_FRACTION = 0.5
+
+
+def block_path(i, prefix="block", directory="."):
+    """File of block i (0-based), named as img_generator numbers them."""
+    return os.path.join(directory, f"{prefix}{i + 1}.png")
+
+
+def source_signatures(paths):
+    """(mtime, size) of every existing path, keyed by file name."""
+    signatures = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signatures[os.path.basename(path)] = [stat.st_mtime_ns, stat.st_size]
+    return signatures
+
+
+def _save_index(index, index_path):
+    with atomic_file.replace_file(index_path) as file:
+        json.dump(index, file)
+
+
+def load_index(index_path=ATLAS_INDEX):
+    try:
+        with open(index_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def build_block_atlas(prefix="block", count=BLOCK_COUNT, directory=".", columns=ATLAS_COLUMNS,
+                      atlas_path=ATLAS_IMAGE, index_path=ATLAS_INDEX):
+    """Pack block images 0..count-1 into one atlas image and write its index.
+
+    Tiles sit on a grid of the largest block size; images that cannot be
+    read become grey fallback tiles and are listed under "fallbacks".
+    Returns the index.
+    """
+    paths = [block_path(i, prefix, directory) for i in range(count)]
+    images, fallbacks = [], []
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                images.append(image.convert("RGBA" if "A" in image.getbands() else "RGB"))
+        except OSError:
+            images.append(Image.new("RGB", FALLBACK_SIZE, FALLBACK_COLOUR))
+            fallbacks.append(i)
+
+    alpha = any(image.mode == "RGBA" for image in images)
+    tile_width = max(image.width for image in images)
+    tile_height = max(image.height for image in images)
+    rows = -(-count // columns)
+    atlas = Image.new("RGBA" if alpha else "RGB", (columns * tile_width, rows * tile_height))
+    rects = []
+    for i, image in enumerate(images):
+        x, y = (i % columns) * tile_width, (i // columns) * tile_height
+        atlas.paste(image, (x, y))
+        rects.append([x, y, image.width, image.height])
+    atlas.save(atlas_path)
+
+    index = {"image": os.path.basename(atlas_path), "prefix": prefix, "count": count, "columns": columns,
+             "alpha": alpha, "rects": rects, "fallbacks": fallbacks,
+             "sources": source_signatures(paths), "scaled": {}}
+    _save_index(index, index_path)
+    return index
+
+
+def atlas_is_current(index, prefix="block", count=BLOCK_COUNT, directory=".", index_path=ATLAS_INDEX):
+    """Whether index describes an atlas of the current block images.
+
+    With no block images left on disk the atlas is the only copy, so it
+    stays current.
+    """
+    if index is None or index.get("prefix") != prefix or index.get("count") != count:
+        return False
+    if not os.path.exists(os.path.join(os.path.dirname(index_path), index["image"])):
+        return False
+    signatures = source_signatures(block_path(i, prefix, directory) for i in range(count))
+    return not signatures or signatures == index["sources"]
+
+
+def ensure_block_atlas(prefix="block", count=BLOCK_COUNT, directory=".", atlas_path=ATLAS_IMAGE,
+                       index_path=ATLAS_INDEX):
+    """Index of an up-to-date atlas, building it first if needed."""
+    index = load_index(index_path)
+    if not atlas_is_current(index, prefix, count, directory, index_path):
+        index = build_block_atlas(prefix, count, directory, atlas_path=atlas_path, index_path=index_path)
+    return index
+
+
+def atlas_available(index_path=ATLAS_INDEX):
+    """Whether an atlas exists that the engine can load without the block images."""
+    index = load_index(index_path)
+    return index is not None and os.path.exists(os.path.join(os.path.dirname(index_path), index["image"]))
+
+
+class BlockTextures:
+    """Block surfaces from the atlas, scaled and convert()-ed once per block size.
+
+    The display mode must be set before surfaces() is called, as convert()
+    needs it.
+    """
+
+    def __init__(self, prefix="block", count=BLOCK_COUNT, directory=".", atlas_path=ATLAS_IMAGE,
+                 index_path=ATLAS_INDEX):
+        self.index_path = index_path
+        self.directory = os.path.dirname(index_path)
+        self.index = ensure_block_atlas(prefix, count, directory, atlas_path, index_path)
+        self.cache = {}
+
+    def _load(self, path):
+        import pygame
+
+        surface = pygame.image.load(path)
+        return surface.convert_alpha() if self.index["alpha"] else surface.convert()
+
+    def _tiles(self, sheet, width, height):
+        columns = self.index["columns"]
+        return [sheet.subsurface(((i % columns) * width, (i // columns) * height, width, height))
+                for i in range(self.index["count"])]
+
+    def surfaces(self, size):
+        """List of the block surfaces at size (width, height)."""
+        import pygame
+
+        width, height = size
+        key = f"{width}x{height}"
+        if key in self.cache:
+            return self.cache[key]
+
+        scaled = self.index["scaled"].get(key)
+        if scaled and os.path.exists(os.path.join(self.directory, scaled)):
+            sheet = self._load(os.path.join(self.directory, scaled))
+        else:
+            # Scale tile by tile (scaling the whole atlas would bleed neighbours across tile edges)
+            atlas = self._load(os.path.join(self.directory, self.index["image"]))
+            columns = self.index["columns"]
+            rows = -(-self.index["count"] // columns)
+            sheet = pygame.Surface((columns * width, rows * height), pygame.SRCALPHA if self.index["alpha"] else 0)
+            for i, rect in enumerate(self.index["rects"]):
+                tile = pygame.transform.scale(atlas.subsurface(pygame.Rect(rect)), (width, height))
+                sheet.blit(tile, ((i % columns) * width, (i // columns) * height))
+            scaled = f"{os.path.splitext(self.index['image'])[0]}_{key}.png"
+            pygame.image.save(sheet, os.path.join(self.directory, scaled))
+            self.index["scaled"][key] = scaled
+            _save_index(self.index, self.index_path)
+            sheet = sheet.convert_alpha() if self.index["alpha"] else sheet.convert()
+
+        self.cache[key] = self._tiles(sheet, width, height)
+        return self.cache[key]
+
+
+def blit_item(screen, surface, position, key=None):
+    """Drawing item for DirtyRenderer that blits surface at position.
+
+    The surface itself identifies the content unless a key is given.
+    """
+    rect = surface.get_rect(topleft=position)
+    return (id(surface) if key is None else key, tuple(rect), lambda: screen.blit(surface, position))
+
+
+class DirtyRenderer:
+    """Redraws only the parts of the screen whose content changed.
+
+    A frame is a list of (key, rect, draw) items in back-to-front order:
+    key identifies what the item shows, rect is the area it covers and
+    draw() paints it. Items that appear, disappear, change key or move mark
+    their old and new areas dirty; each dirty area is cleared to the
+    background and every item overlapping it is drawn again, clipped to the
+    area, so translucent overlays are never blended twice. Only the dirty
+    areas are passed to pygame.display.update.
+    """
+
+    def __init__(self, screen, background=(255, 255, 255)):
+        self.screen = screen
+        self.background = background
+        self.previous = None
+
+    def invalidate(self):
+        """Redraw everything next frame (after something else has drawn on the screen)."""
+        self.previous = None
+
+    def handle_event(self, event):
+        """Redraw everything after the window was uncovered or restored."""
+        import pygame
+
+        if event.type in (pygame.VIDEOEXPOSE, getattr(pygame, "WINDOWEXPOSED", pygame.VIDEOEXPOSE)):
+            self.invalidate()
+
+    def draw(self, items):
+        """Draw a frame; returns the rects that were updated on the display."""
+        import pygame
+
+        screen_rect = self.screen.get_rect()
+        current = Counter((key, tuple(rect)) for key, rect, _ in items)
+        if self.previous is None:
+            dirty = [screen_rect]
+        else:
+            changed = (current - self.previous) + (self.previous - current)
+            dirty = [area for area in (pygame.Rect(rect).clip(screen_rect) for _, rect in changed) if area.w and area.h]
+            if sum(area.w * area.h for area in dirty) > FULL_REDRAW_FRACTION * screen_rect.w * screen_rect.h:
+                dirty = [screen_rect]
+        self.previous = current
+        if not dirty:
+            return []
+
+        rects = [pygame.Rect(rect) for _, rect, _ in items]
+        for area in dirty:
+            self.screen.set_clip(area)
+            self.screen.fill(self.background, area)
+            for i in area.collidelistall(rects):
+                items[i][2]()
+        self.screen.set_clip(None)
+        pygame.display.update(dirty)
+        return dirty
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the engine's block images into one atlas.")
+    parser.add_argument("--prefix", default="block")
+    parser.add_argument("--count", type=int, default=BLOCK_COUNT)
+    parser.add_argument("--directory", default=".", help="where the block images are")
+    parser.add_argument("--columns", type=int, default=ATLAS_COLUMNS)
+    args = parser.parse_args()
+
+    index = build_block_atlas(args.prefix, args.count, args.directory, args.columns)
+    print(f"{index['count']} blocks packed into {index['image']}"
+          + (f" ({len(index['fallbacks'])} unreadable, replaced by grey tiles)" if index["fallbacks"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,623 @@
+"""Vectorized combination engine shared by the enumeration modes.
+
+A combination's row number is simply its mixed-radix value over the
+charset, so whole blocks of rows can be computed at once with NumPy
+instead of building every string character by character.
+"""
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+import atomic_file
+import process_pool
+
+# Number of rows computed and written per block
+CHUNK_ROWS = 1 << 16
+
+# Shards per worker in a parallel run, so progress moves in small steps
+SHARDS_PER_WORKER = 4
+
+# Seconds between checks of the cancel event while shards are written
+CANCEL_POLL = 0.1
+
+# Largest row number or place value the NumPy int64 digit path can hold
+INT64_MAX = np.iinfo(np.int64).max
+
+
+def charset_table(charset):
+    """Return the charset as a NumPy lookup table.
+
+    Charsets whose entries are not all single characters use an object table.
+    """
+    charset = list(charset)
+    if all(len(c) == 1 for c in charset):
+        return np.array(charset, dtype='<U1')
+    return np.array(charset, dtype=object)
+
+
+def combination_count(charset, length):
+    """Number of combinations of the given length over the charset."""
+    return len(charset) ** length
+
+
+def digit_block(radix, length, start, stop):
+    """Mixed-radix digits (most significant first) for the rows start..stop-1."""
+    if radix ** length > INT64_MAX or stop > INT64_MAX:
+        # Place values or row numbers past int64 would wrap; divide Python ints instead
+        rows = np.array(range(start, stop), dtype=object)
+        powers = np.array([radix ** place for place in range(length - 1, -1, -1)], dtype=object)
+        return ((rows[:, None] // powers[None, :]) % radix).astype(np.int64)
+    rows = np.arange(start, stop, dtype=np.int64)
+    powers = radix ** np.arange(length - 1, -1, -1, dtype=np.int64)
+    return (rows[:, None] // powers[None, :]) % radix
+
+
+def combination_block(table, length, start, stop):
+    """Return the combinations for rows start..stop-1 as a list of strings."""
+    if length == 0:
+        return [''] * (stop - start)
+    digits = digit_block(len(table), length, start, stop)
+    if table.dtype == object:
+        return [''.join(row) for row in table[digits].tolist()]
+    # Each row of single characters is contiguous, so it can be viewed as one string
+    cells = np.ascontiguousarray(table[digits])
+    return cells.view(f'<U{length}').ravel().tolist()
+
+
+def iter_combinations(charset, length, start=0, stop=None, chunk_rows=CHUNK_ROWS):
+    """Yield (row, combination) for rows start..stop-1, computed a block at a time."""
+    table = charset_table(charset)
+    if stop is None:
+        stop = combination_count(charset, length)
+    for block_start in range(start, stop, chunk_rows):
+        block_stop = min(block_start + chunk_rows, stop)
+        yield from zip(range(block_start, block_stop), combination_block(table, length, block_start, block_stop))
+
+
+def format_block(combinations, start, separator=' ', id_offset=0):
+    """Format a block of combinations as "<id><separator><combination>" lines."""
+    line = '{}' + separator + '{}\n'
+    return ''.join(map(line.format, range(start + id_offset, start + id_offset + len(combinations)), combinations))
+
+
+def write_combinations(file, charset, length, start=0, stop=None, separator=' ', id_offset=0,
+                       chunk_rows=CHUNK_ROWS, progress=None, cancel=None):
+    """Write the rows start..stop-1 of the enumeration to an open text file.
+
+    progress(rows_done, rows_total) is called after every block, and the run
+    stops early once cancel (a threading.Event) is set. Returns the number of
+    rows written.
+    """
+    table = charset_table(charset)
+    if stop is None:
+        stop = combination_count(charset, length)
+    total = max(stop - start, 0)
+    for block_start in range(start, stop, chunk_rows):
+        if cancel is not None and cancel.is_set():
+            return block_start - start
+        block_stop = min(block_start + chunk_rows, stop)
+        combinations = combination_block(table, length, block_start, block_stop)
+        file.write(format_block(combinations, block_start, separator, id_offset))
+        if progress is not None:
+            progress(block_stop - start, total)
+    return total
+
+
+def shard_ranges(total, shards):
+    """Split range(total) into at most `shards` contiguous (start, stop) ranges."""
+    shards = max(1, min(shards, total))
+    size, extra = divmod(total, shards)
+    ranges = []
+    start = 0
+    for shard in range(shards):
+        stop = start + size + (1 if shard < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def shard_path(output_file, shard):
+    return f"{output_file}.part{shard:04d}"
+
+
+def write_shard(charset, length, start, stop, path, separator=' ', id_offset=0, encoding=None, cancel=None):
+    """Worker: write the rows start..stop-1 to their own shard file; returns the rows written.
+
+    cancel is checked between blocks, so a cancelled shard stops within one block.
+    """
+    with open(path, 'w', encoding=encoding, buffering=1 << 20) as file:
+        return write_combinations(file, charset, length, start, stop, separator, id_offset, cancel=cancel)
+
+
+def generate_sharded(charset, length, output_file, workers=None, keep_shards=False, separator=' ',
+                     id_offset=0, encoding=None, progress=None, cancel=None):
+    """Write an enumeration in parallel, one contiguous ID range per worker process.
+
+    Shards are written to "<output_file>.partNNNN" and then concatenated in
+    order into output_file, unless keep_shards is set. Returns the list of
+    files written, or None if the run was cancelled. Setting cancel stops
+    the running shards within one block: the workers share an event with
+    this process. When the caller cannot start a pool (see process_pool)
+    the shards are written in-process.
+    """
+    workers = process_pool.usable_workers(workers)
+    total = combination_count(charset, length)
+    ranges = shard_ranges(total, workers * SHARDS_PER_WORKER)
+    paths = [shard_path(output_file, shard) for shard in range(len(ranges))]
+    done = 0
+    if workers == 1:
+        for (start, stop), path in zip(ranges, paths):
+            if cancel is not None and cancel.is_set():
+                break
+            done += write_shard(list(charset), length, start, stop, path, separator, id_offset, encoding, cancel)
+            if progress is not None:
+                progress(done, total)
+    else:
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+            stop_shards = manager.Event()
+            pending = {executor.submit(write_shard, list(charset), length, start, stop, path, separator, id_offset,
+                                       encoding, stop_shards)
+                       for (start, stop), path in zip(ranges, paths)}
+            while pending:
+                finished, pending = wait(pending, timeout=CANCEL_POLL, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    stop_shards.set()
+                    for future in pending:
+                        future.cancel()
+                    break
+                for future in finished:
+                    done += future.result()
+                    if progress is not None:
+                        progress(done, total)
+    if cancel is not None and cancel.is_set():
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        return None
+    if keep_shards:
+        return paths
+    with open(output_file, 'wb') as output:
+        for path in paths:
+            with open(path, 'rb') as shard:
+                shutil.copyfileobj(shard, output, 1 << 20)
+            os.remove(path)
+    return [output_file]
+
+
+def generate_mapping_file(output_file_path, charset, length, chunk_rows=CHUNK_ROWS):
+    """Write the "{id} {combination}" mapping file for one length and return rows/sec."""
+    started = time.perf_counter()
+    # Opened in text mode with the platform defaults so the output matches the old per-row writer
+    with open(output_file_path, "w", buffering=1 << 20) as file:
+        rows = write_combinations(file, charset, length, chunk_rows=chunk_rows)
+    elapsed = time.perf_counter() - started
+    return rows / elapsed if elapsed > 0 else float(rows)
+
+
+def checkpoint_path(output_file):
+    return f"{output_file}.checkpoint"
+
+
+def generate_resumable(charset, length, output_file, separator=' ', id_offset=0, encoding=None,
+                       chunk_rows=CHUNK_ROWS):
+    """Append an enumeration to output_file through one buffered handle, resumably.
+
+    After every block the file is flushed and "<output_file>.checkpoint"
+    records the next row and the file size. A later call with the same
+    charset and length truncates any partly written block and continues
+    from that row; the checkpoint is removed once the run completes.
+    Returns the row the run started from.
+    """
+    charset = list(charset)
+    checkpoint = checkpoint_path(output_file)
+    state = None
+    if os.path.exists(checkpoint):
+        with open(checkpoint, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+        if state.get("charset") != charset or state.get("length") != length:
+            raise ValueError(f"{checkpoint} belongs to a different charset or length; remove it to start over.")
+    total = combination_count(charset, length)
+    table = charset_table(charset)
+    with open(output_file, 'a', encoding=encoding, buffering=1 << 20) as file:
+        if state is None:
+            file.flush()
+            state = {"charset": charset, "length": length, "next_row": 0,
+                     "offset": os.fstat(file.fileno()).st_size}
+        else:
+            file.truncate(state["offset"])
+        first_row = state["next_row"]
+        for block_start in range(first_row, total, chunk_rows):
+            block_stop = min(block_start + chunk_rows, total)
+            combinations = combination_block(table, length, block_start, block_stop)
+            file.write(format_block(combinations, block_start, separator, id_offset))
+            file.flush()
+            state["next_row"] = block_stop
+            state["offset"] = os.fstat(file.fileno()).st_size
+            with atomic_file.replace_file(checkpoint) as handle:
+                json.dump(state, handle)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return first_row
+
+
+class VirtualEnumeration:
+    """Random access to the rows of an enumeration without writing the file.
+
+    Rows run through every length in `lengths` in order, as in the files the
+    enumeration modes write, and row i is computed directly from its
+    mixed-radix digits. Lines are formatted as "<id><separator><combination>",
+    or just the combination when show_ids is False.
+    """
+
+    def __init__(self, charset, lengths, separator=' ', id_offset=0, show_ids=True, radix=None):
+        self.charset = list(charset)
+        self.radix = radix or len(self.charset)
+        self.lengths = [lengths] if isinstance(lengths, int) else list(lengths)
+        self.separator = separator
+        self.id_offset = id_offset
+        self.show_ids = show_ids
+        self.char_map = {c: i for i, c in enumerate(self.charset)}
+        # Plain combinations over the whole charset can use the NumPy block path
+        self.vectorized = self.radix == len(self.charset)
+        self.offsets = []
+        total = 0
+        for length in self.lengths:
+            self.offsets.append(total)
+            total += self.radix ** length
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.total)
+            rows = self.rows(start, stop) if step == 1 else [self.row(i) for i in range(start, stop, step)]
+            return rows
+        return self.row(item)
+
+    def locate(self, i):
+        """Return (length, row within that length) for row i."""
+        if i < 0:
+            i += self.total
+        if not 0 <= i < self.total:
+            raise IndexError("enumeration row out of range")
+        for length, offset in zip(reversed(self.lengths), reversed(self.offsets)):
+            if i >= offset:
+                return length, i - offset
+
+    def digits(self, i):
+        """Mixed-radix digits of row i, most significant first."""
+        length, row = self.locate(i)
+        digits = [0] * length
+        for col in range(length - 1, -1, -1):
+            row, digits[col] = divmod(row, self.radix)
+        return digits
+
+    def combination_from_digits(self, digits):
+        return ''.join(self.charset[d] for d in digits)
+
+    def row(self, i):
+        """Combination held by row i."""
+        return self.combination_from_digits(self.digits(i))
+
+    def rows(self, i, j):
+        """Combinations held by rows i..j-1."""
+        result = []
+        for length, offset in zip(self.lengths, self.offsets):
+            start = max(i, offset) - offset
+            stop = min(j, offset + self.radix ** length) - offset
+            if start >= stop:
+                continue
+            if self.vectorized:
+                result.extend(combination_block(charset_table(self.charset), length, start, stop))
+            else:
+                result.extend(map(self.combination_from_digits, digit_block(self.radix, length, start, stop).tolist()))
+        return result
+
+    def digits_of(self, combination):
+        """Digits of a combination; raises ValueError if it is not in the enumeration."""
+        try:
+            return [self.char_map[c] for c in combination]
+        except KeyError as e:
+            raise ValueError(f"{e.args[0]!r} is not in the charset") from None
+
+    def index_of(self, combination):
+        """Row that holds a combination (the last one, if the charset repeats a character)."""
+        digits = self.digits_of(combination)
+        if len(digits) not in self.lengths:
+            raise ValueError(f"no rows of length {len(digits)} in this enumeration")
+        row = 0
+        for digit in digits:
+            if digit >= self.radix:
+                raise ValueError(f"{combination!r} is not in the enumeration")
+            row = row * self.radix + digit
+        return self.offsets[self.lengths.index(len(digits))] + row
+
+    def line(self, i, combination=None):
+        """Row i formatted as it appears in the enumeration file."""
+        if combination is None:
+            combination = self.row(i)
+        if not self.show_ids:
+            return f"{combination}\n"
+        return f"{i + self.id_offset}{self.separator}{combination}\n"
+
+    def materialize(self, path, i=0, j=None, encoding=None, chunk_rows=CHUNK_ROWS):
+        """Write rows i..j-1 to path in the enumeration's file format."""
+        j = self.total if j is None else min(j, self.total)
+        with open(path, 'w', encoding=encoding, buffering=1 << 20) as file:
+            for block_start in range(i, j, chunk_rows):
+                block_stop = min(block_start + chunk_rows, j)
+                combinations = self.rows(block_start, block_stop)
+                file.write(''.join(self.line(row, combination)
+                                   for row, combination in zip(range(block_start, block_stop), combinations)))
+
+
+class LSCEnumeration(VirtualEnumeration):
+    """Virtual view of mode 4's LSC-RENAME.txt.
+
+    Rows count in base z over the symbol array for every length n..ai.
+    Symbols are separated by spaces, and digits beyond the symbol array
+    contribute nothing, as in the file.
+    """
+
+    def __init__(self, symbols, z, n, ai):
+        super().__init__(symbols, range(n, ai + 1), radix=z)
+        self.vectorized = False
+
+    def combination_from_digits(self, digits):
+        last = len(digits) - 1
+        return ''.join(self.charset[d] + ('' if col == last else ' ')
+                       for col, d in enumerate(digits) if d < len(self.charset))
+
+    def digits_of(self, combination):
+        return super().digits_of(combination.split(' ') if combination else [])
+
+    def line(self, i, combination=None):
+        if combination is None:
+            combination = self.row(i)
+        return f"\n\n{self.locate(i)[0]}CF{i}\n\n{combination}"
+
+
+def llanguage_mappings(characters, length):
+    """Virtual llanguageMod/mappings/{length}.txt ("{id} {combination}", ids from 0)."""
+    return VirtualEnumeration(characters, length)
+
+
+def charset_combinations(charset, n):
+    """Virtual output of Map's and mode 32's generate_combinations ("{id}\\t{combination}", ids from 1)."""
+    return VirtualEnumeration(charset, n, separator='\t', id_offset=1)
+
+
+def n_bit_combinations(n):
+    """Virtual output of generate_and_save_n_bit_combinations (one bit string per line)."""
+    return VirtualEnumeration('01', n, show_ids=False)
+
+
+# Header of the binary n-bit files: magic, format, n, first row, row count
+N_BIT_MAGIC = b'NBIT'
+N_BIT_HEADER = struct.Struct('<4sBBQQ')
+N_BIT_RANGE = 0
+N_BIT_PACKED = 1
+
+
+def bit_matrix(n, start, stop):
+    """Bits of the integers start..stop-1 as a (rows, n) uint8 array, most significant first."""
+    values = np.arange(start, stop, dtype='>u8')
+    bits = np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1)
+    return bits[:, 64 - n:]
+
+
+def bit_string_block(n, start, stop, newline=b'\n'):
+    """Text of the n-bit strings for start..stop-1, one per line, as bytes."""
+    rows = stop - start
+    width = n + len(newline)
+    block = np.empty((rows, width), dtype=np.uint8)
+    block[:, :n] = bit_matrix(n, start, stop) + ord('0')
+    block[:, n:] = np.frombuffer(newline, dtype=np.uint8)
+    return block.tobytes()
+
+
+def write_bit_strings(file_path, n, chunk_rows=CHUNK_ROWS * 4):
+    """Write every n-bit string in order, one per line, in megabyte blocks.
+
+    Lines end in os.linesep, as the text-mode writer this replaces produced.
+    """
+    newline = os.linesep.encode()
+    with open(file_path, 'wb') as file:
+        if n == 0:
+            # bin(0) is "0" even when zero bits were asked for
+            file.write(b'0' + newline)
+            return
+        total = 1 << n
+        for start in range(0, total, chunk_rows):
+            file.write(bit_string_block(n, start, min(start + chunk_rows, total), newline))
+
+
+def write_bit_binary(file_path, n, start=0, stop=None, packed=True, chunk_rows=CHUNK_ROWS * 4):
+    """Write n-bit combinations start..stop-1 in the compact binary format.
+
+    The header records n and the row range. With packed=True it is followed
+    by each row's bits packed into ceil(n / 8) big-endian bytes; otherwise
+    the header alone describes the (implied) consecutive range.
+    """
+    if stop is None:
+        stop = 1 << n
+    with open(file_path, 'wb') as file:
+        file.write(N_BIT_HEADER.pack(N_BIT_MAGIC, N_BIT_PACKED if packed else N_BIT_RANGE, n, start, stop - start))
+        if not packed:
+            return
+        for block_start in range(start, stop, chunk_rows):
+            bits = bit_matrix(n, block_start, min(block_start + chunk_rows, stop))
+            file.write(np.packbits(bits, axis=1).tobytes())
+
+
+def read_bit_binary(file_path):
+    """Read a binary n-bit file back as (n, first row, array of the row values)."""
+    with open(file_path, 'rb') as file:
+        magic, kind, n, start, count = N_BIT_HEADER.unpack(file.read(N_BIT_HEADER.size))
+        if magic != N_BIT_MAGIC:
+            raise ValueError(f"{file_path} is not an n-bit combination file")
+        if kind == N_BIT_RANGE:
+            return n, start, np.arange(start, start + count, dtype=np.uint64)
+        width = (n + 7) // 8
+        packed = np.frombuffer(file.read(count * width), dtype=np.uint8).reshape(count, width)
+    bits = np.unpackbits(packed, axis=1)[:, :n].astype(np.uint64)
+    weights = np.uint64(1) << np.arange(n - 1, -1, -1, dtype=np.uint64)
+    return n, start, (bits * weights).sum(axis=1, dtype=np.uint64)
+
+
+def lsc_rows(symbols, z, n, ai, first_id=0):
+    """Yield the (length, id, text) rows of mode 4's Sequential Language Generation.
+
+    Digits advance like an odometer, so each row costs one increment
+    (amortized O(1)) instead of n power computations. Digits beyond the
+    symbol array contribute nothing, as in the original loop.
+    """
+    inner = [symbols[d] + ' ' if d < len(symbols) else '' for d in range(z)]
+    last = [symbols[d] if d < len(symbols) else '' for d in range(z)]
+    id = first_id
+    for length in range(n, ai + 1):
+        digits = [0] * length
+        cells = [inner[0]] * (length - 1) + [last[0]] if length else []
+        for _ in range(z ** length):
+            yield length, id, ''.join(cells)
+            id += 1
+            col = length - 1
+            while col >= 0:
+                digit = digits[col] + 1
+                if digit < z:
+                    digits[col] = digit
+                    cells[col] = last[digit] if col == length - 1 else inner[digit]
+                    break
+                digits[col] = 0
+                cells[col] = last[0] if col == length - 1 else inner[0]
+                col -= 1
+
+
+def lsc_split_path(output_file, length):
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}-{length}{ext}"
+
+
+def generate_lsc(symbols, z, n, ai, output_file="LSC-RENAME.txt", split_by_length=False, max_bytes=None,
+                 block_rows=CHUNK_ROWS):
+    """Write mode 4's LSC rows for lengths n..ai with buffered block writes.
+
+    Each row is written as "\\n\\n{length}CF{id}\\n\\n{text}" in UTF-8 with the
+    platform's line endings, matching the original per-symbol writer. With
+    split_by_length every length goes to its own "<stem>-<length><ext>" file
+    (ids keep counting across them). max_bytes caps the size of each file;
+    rows that would not fit are dropped. Returns (rows written, files).
+    """
+    files = []
+    rows_written = 0
+    file = None
+    written = 0
+    current_length = None
+    full = False
+    pending = []
+
+    def encode(text):
+        if os.linesep != '\n':
+            text = text.replace('\n', os.linesep)
+        return text.encode('utf-8')
+
+    def flush():
+        nonlocal written, rows_written, full
+        if not pending:
+            return
+        data = encode(''.join(pending))
+        if max_bytes is None or written + len(data) <= max_bytes:
+            file.write(data)
+            written += len(data)
+            rows_written += len(pending)
+        else:
+            for row in pending:
+                data = encode(row)
+                if written + len(data) > max_bytes:
+                    full = True
+                    break
+                file.write(data)
+                written += len(data)
+                rows_written += 1
+        pending.clear()
+
+    def open_next(path):
+        nonlocal file, written, full
+        if file is not None:
+            file.close()
+        file = open(path, 'wb')
+        files.append(path)
+        written = 0
+        full = False
+
+    open_next(lsc_split_path(output_file, n) if split_by_length else output_file)
+    try:
+        for length, id, text in lsc_rows(symbols, z, n, ai):
+            if split_by_length and length != current_length and current_length is not None:
+                flush()
+                open_next(lsc_split_path(output_file, length))
+            current_length = length
+            if full:
+                if not split_by_length:
+                    break
+                continue
+            pending.append(f"\n\n{length}CF{id}\n\n{text}")
+            if len(pending) >= block_rows:
+                flush()
+        flush()
+    finally:
+        file.close()
+    return rows_written, files
+
+
+def legacy_lsc(p, a, z, n, ai):
+    """The original mode 4 loop, kept as the baseline for benchmark_lsc."""
+    k = z - 1
+    id = 0
+    for n in range(n, ai + 1):
+        nbr_comb = int(math.pow(k + 1, n))
+        for row in range(nbr_comb):
+            p.write(f"\n\n{n}CF{id}\n\n")
+            id += 1
+            for col in range(n - 1, -1, -1):
+                rdiv = int(math.pow(k + 1, col))
+                cell = (row // rdiv) % (k + 1)
+                if cell < len(a):
+                    if col == 0:
+                        p.write(f"{a[cell]}")
+                    else:
+                        p.write(f"{a[cell]} ")
+
+
+def benchmark_lsc(symbols, z, n, ai):
+    """Time the original loop against generate_lsc and check their output matches."""
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_path = os.path.join(directory, "legacy.txt")
+        started = time.perf_counter()
+        with open(legacy_path, "w", encoding="utf-8") as p:
+            legacy_lsc(p, symbols, z, n, ai)
+        legacy_seconds = time.perf_counter() - started
+
+        new_path = os.path.join(directory, "new.txt")
+        started = time.perf_counter()
+        rows, _ = generate_lsc(symbols, z, n, ai, new_path)
+        new_seconds = time.perf_counter() - started
+
+        with open(legacy_path, 'rb') as legacy, open(new_path, 'rb') as new:
+            identical = legacy.read() == new.read()
+    return {"rows": rows, "legacy_seconds": legacy_seconds, "new_seconds": new_seconds, "identical": identical}
+
+
+if __name__ == "__main__":
+    result = benchmark_lsc(list("abcdefghijklmnopqrstuvwxyz"), 26, 1, 4)
+    print(f"{result['rows']:,} rows: original loop {result['legacy_seconds']:.2f}s, "
+          f"generate_lsc {result['new_seconds']:.2f}s "
+          f"({result['legacy_seconds'] / max(result['new_seconds'], 1e-9):.1f}x), identical: {result['identical']}")
@@ -0,0 +1,157 @@
+"""Arithmetic text <-> ID codec.
+
+The ID of a combination is its mixed-radix value over the charset (the row
+it occupies in an enumeration file), so encoding and decoding only need the
+charset itself. Bulk operations work over NumPy arrays; the enumeration
+files are then only needed for browsing.
+
+As in calculate_string_id, a character listed more than once in the charset
+takes its last position.
+"""
+import json
+import os
+import numpy as np
+
+CHARSET_FILE = "llanguageMod/mappings/charset.json"
+
+
+class IdCodec:
+    """Encodes and decodes combination IDs arithmetically from a charset."""
+
+    def __init__(self, charset, lengths=range(1, 5), empty=None):
+        self.charset = list(charset)
+        self.radix = len(self.charset)
+        # Combination lengths that take part in longest-match tokenizing
+        self.lengths = sorted(lengths)
+        # What decoding the ID 0 of no particular length returns
+        self.empty = self.charset[0] if empty is None else empty
+        self.char_map = {c: i for i, c in enumerate(self.charset)}
+        single = [(ord(c), i) for c, i in self.char_map.items() if len(c) == 1]
+        single.sort()
+        self.sorted_codepoints = np.array([cp for cp, _ in single], dtype=np.uint32)
+        self.digit_of = np.array([i for _, i in single], dtype=np.int64)
+        # Whitespace never appears in a mapping file entry (read_mappings splits on it)
+        self.mappable = np.array([not chr(cp).isspace() for cp, _ in single], dtype=bool)
+        if all(len(c) == 1 for c in self.charset):
+            self.table = np.array(self.charset, dtype='<U1')
+        else:
+            self.table = None
+
+    def encode(self, input_string):
+        """ID of a single string."""
+        id = 0
+        for c in input_string:
+            id = id * self.radix + self.char_map[c]
+        return id
+
+    def decode(self, id, length=None):
+        """String for a single ID, zero-padded to length when one is given."""
+        chars = []
+        while id > 0:
+            chars.append(self.charset[id % self.radix])
+            id //= self.radix
+        if length is not None:
+            chars.extend(self.charset[0] for _ in range(length - len(chars)))
+        elif not chars:
+            return self.empty
+        return ''.join(reversed(chars))
+
+    def _lookup(self, text):
+        """Digit of every character of text and whether it was found in the charset."""
+        codepoints = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        if not len(self.sorted_codepoints):
+            return np.zeros(len(codepoints), dtype=np.int64), np.zeros(len(codepoints), dtype=bool), codepoints
+        position = np.minimum(np.searchsorted(self.sorted_codepoints, codepoints), len(self.sorted_codepoints) - 1)
+        found = self.sorted_codepoints[position] == codepoints
+        return np.where(found, self.digit_of[position], 0), found, position
+
+    def encode_chars(self, text):
+        """IDs of every character of text as an int64 array.
+
+        Raises KeyError for the first character that is not in the charset.
+        """
+        digits, found, _ = self._lookup(text)
+        if not found.all():
+            raise KeyError(text[int(np.argmin(found))])
+        return digits
+
+    def decode_ids(self, ids):
+        """Strings for a sequence of IDs (each decoded as by decode)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        result = [self.empty] * len(ids)
+        width = np.zeros(len(ids), dtype=np.int64)
+        remaining = ids.copy()
+        while True:
+            positive = remaining > 0
+            if not positive.any():
+                break
+            width += positive
+            remaining //= self.radix
+        for w in np.unique(width):
+            if w == 0:
+                continue
+            selected = np.nonzero(width == w)[0]
+            powers = self.radix ** np.arange(w - 1, -1, -1, dtype=np.int64)
+            digits = (ids[selected][:, None] // powers[None, :]) % self.radix
+            if self.table is not None:
+                strings = np.ascontiguousarray(self.table[digits]).view(f'<U{w}').ravel().tolist()
+            else:
+                strings = [''.join(self.charset[d] for d in row) for row in digits.tolist()]
+            for position, string in zip(selected.tolist(), strings):
+                result[position] = string
+        return result
+
+    def match(self, content):
+        """Longest mapped length and its id at every position of content.
+
+        Mirrors a mapping index built from enumeration files of self.lengths:
+        a window matches when every character is in the charset and none is
+        whitespace.
+        """
+        digits, found, position = self._lookup(content)
+        if len(self.mappable):
+            found &= self.mappable[position]
+        size = len(digits)
+        match_length = np.zeros(size, dtype=np.int64)
+        match_id = np.zeros(size, dtype=np.int64)
+        for length in self.lengths:
+            if length > size:
+                break
+            windows = size - length + 1
+            ids = np.zeros(windows, dtype=np.int64)
+            valid = np.ones(windows, dtype=bool)
+            for offset in range(length):
+                ids = ids * self.radix + digits[offset:offset + windows]
+                valid &= found[offset:offset + windows]
+            match_length[:windows][valid] = length
+            match_id[:windows][valid] = ids[valid]
+        return match_length, match_id
+
+
+def save_charset(charset, lengths, path=CHARSET_FILE):
+    """Record the charset and lengths an enumeration was generated with.
+
+    Lengths generated earlier with the same charset are kept.
+    """
+    charset = list(charset)
+    lengths = set(lengths)
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            saved = json.load(file)
+        if saved["charset"] == charset:
+            lengths.update(saved["lengths"])
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"charset": charset, "lengths": sorted(lengths)}, file)
+
+
+def load_codec(path=CHARSET_FILE, lengths=range(1, 5)):
+    """Codec for the charset recorded by save_charset, or None if there is none."""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            saved = json.load(file)
+    except FileNotFoundError:
+        return None
+    return IdCodec(saved["charset"], [length for length in saved["lengths"] if length in lengths])
@@ -0,0 +1,448 @@
+"""Tokenizer and processing pipeline for the Large Language Model mode (12).
+
+Input text is converted greedily: at every position the longest mapped
+substring (4 characters down to 1) wins, a newline always becomes token 27
+and an unmapped character becomes 0. Two streams are produced at once:
+
+* outfile - "<length>.<id> " tokens
+* outb    - flattened ids, offset by the number of shorter combinations
+
+Run as a script to process a range of input files, optionally across a pool
+of worker processes:
+
+    python llanguage.py 5 15 --workers 4
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import idcodec
+import process_pool
+
+MAPPINGS_DIRECTORY = "llanguageMod/mappings"
+INDEX_DIRECTORY_NAME = "index"
+INPUT_DIRECTORY = "llanguageMod/inputs"
+OUTFILE_DIRECTORY = "llanguageMod/outfile"
+OUTB_DIRECTORY = "llanguageMod/outb"
+
+# Longest combination length held by the mappings
+MAX_TOKEN_LENGTH = 4
+
+NEWLINE_TOKENS = ("1.27 ", "27 ")
+UNMAPPED_TOKENS = ("0 ", "0 ")
+
+# Characters of input read per tokenizer call
+LINE_BLOCK_SIZE = 1 << 20
+
+# Marks a node of the trie that is only a prefix of longer mapped strings
+_PREFIX = None
+
+
+def outb_offset(length):
+    """Offset added to an id of the given length in the flattened outb stream."""
+    return sum(100 ** power for power in range(1, length))
+
+
+def token_pair(length, id_str):
+    """Return the (outfile, outb) tokens for a mapped substring."""
+    if length == 1:
+        return f"{length}.{id_str} ", f"{id_str} "
+    return f"{length}.{id_str} ", f"{outb_offset(length) + int(id_str)} "
+
+
+class MappingTokenizer:
+    """Longest-match tokenizer compiled once from the read_mappings dictionaries.
+
+    The trie is stored flat: every prefix of a mapped string is a key, holding
+    either its token pair or _PREFIX when it only leads to longer strings.
+    """
+
+    def __init__(self, mappings):
+        self.nodes = {}
+        for length, mapping in enumerate(mappings[:MAX_TOKEN_LENGTH], start=1):
+            for value_str, id_str in mapping.items():
+                # Entries whose key length differs from their file can never match
+                if len(value_str) != length:
+                    continue
+                for end in range(1, length):
+                    self.nodes.setdefault(value_str[:end], _PREFIX)
+                self.nodes[value_str] = token_pair(length, id_str)
+
+    def tokenize_into(self, content, out, outb):
+        """Tokenize content, appending to the out and outb token lists."""
+        nodes = self.nodes
+        size = len(content)
+        index = 0
+        while index < size:
+            if content[index] == '\n':
+                out.append(NEWLINE_TOKENS[0])
+                outb.append(NEWLINE_TOKENS[1])
+                index += 1
+                continue
+            best = UNMAPPED_TOKENS
+            best_length = 1
+            for length in range(1, min(MAX_TOKEN_LENGTH, size - index) + 1):
+                node = nodes.get(content[index:index + length], False)
+                if node is False:
+                    break
+                if node is not _PREFIX:
+                    best = node
+                    best_length = length
+            out.append(best[0])
+            outb.append(best[1])
+            index += best_length
+
+    def tokenize(self, content):
+        """Return the (outfile, outb) strings for content."""
+        out = []
+        outb = []
+        self.tokenize_into(content, out, outb)
+        return ''.join(out), ''.join(outb)
+
+
+class MappingIndex:
+    """Memory-mapped, sorted packed-key index over the text mapping files.
+
+    Every mapped string of length L is packed into a uint64 key, 16 bits per
+    character, using its rank in the index alphabet (0 marks an unknown
+    character). Keys are stored sorted next to their ids as .npy files, so a
+    lookup is a binary search over the mapped arrays rather than a dict load.
+    """
+
+    def __init__(self, index_directory):
+        self.index_directory = index_directory
+        with open(os.path.join(index_directory, "meta.json"), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        self.alphabet = meta["alphabet"]
+        codepoints = np.array([ord(c) for c in self.alphabet], dtype=np.uint32)
+        self.order = np.argsort(codepoints)
+        self.sorted_codepoints = codepoints[self.order]
+        self.keys = []
+        self.ids = []
+        for length in range(1, MAX_TOKEN_LENGTH + 1):
+            self.keys.append(np.load(os.path.join(index_directory, f"{length}.keys.npy"), mmap_mode="r"))
+            self.ids.append(np.load(os.path.join(index_directory, f"{length}.ids.npy"), mmap_mode="r"))
+
+    def __getstate__(self):
+        # Worker processes reopen the mapped files instead of receiving copies
+        return {"index_directory": self.index_directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["index_directory"])
+
+    def character_codes(self, content):
+        """Per-character alphabet codes (rank + 1) for content, 0 where unmapped."""
+        codepoints = np.frombuffer(content.encode("utf-32-le"), dtype=np.uint32)
+        if not len(self.sorted_codepoints):
+            return np.zeros(len(codepoints), dtype=np.uint64)
+        position = np.searchsorted(self.sorted_codepoints, codepoints)
+        position = np.minimum(position, len(self.sorted_codepoints) - 1)
+        hit = self.sorted_codepoints[position] == codepoints
+        return np.where(hit, self.order[position] + 1, 0).astype(np.uint64)
+
+    def match(self, content):
+        """Return the longest mapped length and its id at every position of content."""
+        codes = self.character_codes(content)
+        size = len(codes)
+        match_length = np.zeros(size, dtype=np.int64)
+        match_id = np.zeros(size, dtype=np.int64)
+        for length in range(1, min(MAX_TOKEN_LENGTH, size) + 1):
+            keys = self.keys[length - 1]
+            if not len(keys):
+                continue
+            windows = size - length + 1
+            packed = np.zeros(windows, dtype=np.uint64)
+            valid = np.ones(windows, dtype=bool)
+            for offset in range(length):
+                window = codes[offset:offset + windows]
+                packed = (packed << np.uint64(16)) | window
+                valid &= window != 0
+            position = np.minimum(np.searchsorted(keys, packed), len(keys) - 1)
+            found = valid & (keys[position] == packed)
+            match_length[:windows][found] = length
+            match_id[:windows][found] = self.ids[length - 1][position[found]]
+        return match_length, match_id
+
+    def get(self, length, value_str, default=None):
+        """Look up the id of a single mapped string."""
+        match_length, match_id = self.match(value_str)
+        if len(value_str) != length or not len(match_length) or match_length[0] != length:
+            return default
+        return str(match_id[0])
+
+
+def index_directory_for(directory=MAPPINGS_DIRECTORY):
+    return os.path.join(directory, INDEX_DIRECTORY_NAME)
+
+
+def source_signatures(directory=MAPPINGS_DIRECTORY):
+    """(mtime_ns, size) of each mapping file, None where it is missing."""
+    signatures = {}
+    for length in range(1, MAX_TOKEN_LENGTH + 1):
+        try:
+            stat = os.stat(f"{directory}/{length}.txt")
+            signatures[str(length)] = [stat.st_mtime_ns, stat.st_size]
+        except FileNotFoundError:
+            signatures[str(length)] = None
+    return signatures
+
+
+def mapping_index_is_current(directory=MAPPINGS_DIRECTORY):
+    """True when the index exists and was built from the current mapping files."""
+    try:
+        with open(os.path.join(index_directory_for(directory), "meta.json"), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return False
+    return meta.get("sources") == source_signatures(directory)
+
+
+def build_mapping_index(directory=MAPPINGS_DIRECTORY, chunk_rows=1 << 20):
+    """Build the binary index from the text mapping files, parsed as read_mappings does."""
+    index_directory = index_directory_for(directory)
+    os.makedirs(index_directory, exist_ok=True)
+    signatures = source_signatures(directory)
+    ranks = {}
+    for length in range(1, MAX_TOKEN_LENGTH + 1):
+        key_chunks = []
+        id_chunks = []
+        keys = []
+        ids = []
+        try:
+            with open(f"{directory}/{length}.txt", "r") as file:
+                for line in file:
+                    parts = line.strip().split()
+                    if len(parts) != 2 or len(parts[1]) != length:
+                        continue
+                    key = 0
+                    for c in parts[1]:
+                        rank = ranks.get(c)
+                        if rank is None:
+                            rank = ranks[c] = len(ranks)
+                            if rank >= 0xFFFF:
+                                raise ValueError("Mapping alphabet is too large to index.")
+                        key = (key << 16) | (rank + 1)
+                    keys.append(key)
+                    ids.append(int(parts[0]))
+                    if len(keys) >= chunk_rows:
+                        key_chunks.append(np.array(keys, dtype=np.uint64))
+                        id_chunks.append(np.array(ids, dtype=np.int64))
+                        keys = []
+                        ids = []
+        except FileNotFoundError:
+            print(f"Error opening file mappings/{length}.txt")
+        key_chunks.append(np.array(keys, dtype=np.uint64))
+        id_chunks.append(np.array(ids, dtype=np.int64))
+        all_keys = np.concatenate(key_chunks)
+        all_ids = np.concatenate(id_chunks)
+        order = np.argsort(all_keys, kind="stable")
+        all_keys = all_keys[order]
+        all_ids = all_ids[order]
+        # Later lines win over earlier ones, as in the dictionary version
+        keep = np.ones(len(all_keys), dtype=bool)
+        keep[:-1] = all_keys[:-1] != all_keys[1:]
+        np.save(os.path.join(index_directory, f"{length}.keys.npy"), all_keys[keep])
+        np.save(os.path.join(index_directory, f"{length}.ids.npy"), all_ids[keep])
+    alphabet = ''.join(sorted(ranks, key=ranks.get))
+    with open(os.path.join(index_directory, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump({"alphabet": alphabet, "sources": signatures}, file)
+    return index_directory
+
+
+def load_mapping_index(directory=MAPPINGS_DIRECTORY):
+    """Open the mapping index, rebuilding it first if the mapping files changed."""
+    if not mapping_index_is_current(directory):
+        print("Building mapping index...")
+        build_mapping_index(directory)
+    return MappingIndex(index_directory_for(directory))
+
+
+class IndexedTokenizer:
+    """Longest-match tokenizer backed by a MappingIndex or an arithmetic IdCodec."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def tokenize_into(self, content, out, outb):
+        """Tokenize content, appending to the out and outb token lists."""
+        match_length, match_id = self.index.match(content)
+        match_length = match_length.tolist()
+        match_id = match_id.tolist()
+        offsets = [0] + [outb_offset(length) for length in range(1, MAX_TOKEN_LENGTH + 1)]
+        size = len(content)
+        index = 0
+        while index < size:
+            if content[index] == '\n':
+                out.append(NEWLINE_TOKENS[0])
+                outb.append(NEWLINE_TOKENS[1])
+                index += 1
+                continue
+            length = match_length[index]
+            if length:
+                id_value = match_id[index]
+                out.append(f"{length}.{id_value} ")
+                outb.append(f"{offsets[length] + id_value} ")
+                index += length
+            else:
+                out.append(UNMAPPED_TOKENS[0])
+                outb.append(UNMAPPED_TOKENS[1])
+                index += 1
+
+    def tokenize(self, content):
+        """Return the (outfile, outb) strings for content."""
+        out = []
+        outb = []
+        self.tokenize_into(content, out, outb)
+        return ''.join(out), ''.join(outb)
+
+
+_tokenizer_cache = {}
+
+
+def get_tokenizer(mappings):
+    """Return the tokenizer for a mappings object (dictionaries, a MappingIndex or an IdCodec)."""
+    if isinstance(mappings, (MappingIndex, idcodec.IdCodec)):
+        return IndexedTokenizer(mappings)
+    cached = _tokenizer_cache.get(id(mappings))
+    # The mappings object is kept alongside so its id cannot be reused
+    if cached is None or cached[0] is not mappings:
+        cached = (mappings, MappingTokenizer(mappings))
+        _tokenizer_cache.clear()
+        _tokenizer_cache[id(mappings)] = cached
+    return cached[1]
+
+
+def read_mappings(directory=MAPPINGS_DIRECTORY):
+    """Reads mappings from files named 1.txt to 4.txt and stores them in a list of dictionaries."""
+    mappings = [{} for _ in range(MAX_TOKEN_LENGTH)]
+    for i in range(1, MAX_TOKEN_LENGTH + 1):
+        try:
+            with open(f"{directory}/{i}.txt", "r") as file:
+                for line in file:
+                    parts = line.strip().split()
+                    if len(parts) == 2:
+                        id_str, value_str = parts
+                        mappings[i-1][value_str] = id_str
+        except FileNotFoundError:
+            print(f"Error opening file mappings/{i}.txt")
+    return mappings
+
+
+def process_file(input_file_path, output_file_path, outb_file_path, tokenizer):
+    """Read and tokenize an input file once, writing both the outfile and outb streams."""
+    with open(input_file_path, "r") as input_file, \
+            open(output_file_path, "w") as output_file, \
+            open(outb_file_path, "w") as outb_file:
+        # Mapped strings never contain whitespace, so blocks of whole lines
+        # tokenize exactly as the lines would one at a time
+        for lines in iter(lambda: input_file.readlines(LINE_BLOCK_SIZE), []):
+            out, outb = tokenizer.tokenize(''.join(lines))
+            output_file.write(out)
+            outb_file.write(outb)
+    return input_file_path
+
+
+def next_output_number(output_directory):
+    """Highest numbered .txt file already in the output directory."""
+    return max([int(os.path.splitext(os.path.basename(f))[0]) for f in glob.glob(f"{output_directory}/*.txt")], default=0)
+
+
+def plan_outputs(input_directory, output_directory, outdir2, start, end):
+    """Assign output numbers to the existing inputs start..end in order.
+
+    Missing inputs are reported and skipped without using up a number, so the
+    numbering is the same whether the files are processed serially or in parallel.
+    """
+    file_number = next_output_number(output_directory)
+    jobs = []
+    for i in range(start, end + 1):
+        input_file_path = f"{input_directory}/{i}.txt"
+        if not os.path.isfile(input_file_path):
+            print(f"Could not open the file {input_file_path}")
+            continue
+        file_number += 1
+        jobs.append((input_file_path, f"{output_directory}/{file_number}.txt", f"{outdir2}/{file_number}.txt"))
+    return jobs
+
+
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _process_job(job):
+    return process_file(*job, _worker_tokenizer)
+
+
+def process_files(input_directory, output_directory, start, end, mappings, outdir2, workers=1):
+    """Processes files within a given range using predefined mappings and generates output files.
+
+    With more than one worker the independent input files are spread across a
+    process pool; each worker receives the compiled tokenizer once. If the
+    calling program would rerun itself in the pool workers (see
+    process_pool) the files are processed in-process instead;
+    process_in_subprocess keeps the pool for such callers.
+    """
+    tokenizer = get_tokenizer(mappings)
+    jobs = plan_outputs(input_directory, output_directory, outdir2, start, end)
+    workers = process_pool.usable_workers(workers)
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            process_file(*job, tokenizer)
+        return len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tokenizer,)) as executor:
+        for input_file_path in executor.map(_process_job, jobs):
+            print(f"Processed {input_file_path}")
+    return len(jobs)
+
+
+def process_in_subprocess(start, end, workers, codec=False, mappings_directory=MAPPINGS_DIRECTORY,
+                          input_directory=INPUT_DIRECTORY, output_directory=OUTFILE_DIRECTORY,
+                          outdir2=OUTB_DIRECTORY):
+    """Run this module's command line in a new Python process and return its exit code.
+
+    The pool is then started with llanguage as __main__, so the engines, whose
+    menus run on import, still get their workers.
+    """
+    command = [sys.executable, os.path.abspath(__file__), str(start), str(end), "--workers", str(workers),
+               "--mappings", mappings_directory, "--inputs", input_directory, "--outfile", output_directory,
+               "--outb", outdir2]
+    if codec:
+        command.append("--codec")
+    return subprocess.call(command)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert llanguageMod input files to outfile and outb token streams.")
+    parser.add_argument("start", type=int, help="first input file number (e.g. 5 for 5.txt)")
+    parser.add_argument("end", type=int, help="last input file number")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--mappings", default=MAPPINGS_DIRECTORY, help="directory holding 1.txt to 4.txt")
+    parser.add_argument("--no-index", action="store_true", help="load the mapping files into dictionaries instead of the binary index")
+    parser.add_argument("--codec", action="store_true", help="compute ids arithmetically from the recorded charset instead of the mapping files")
+    parser.add_argument("--inputs", default=INPUT_DIRECTORY)
+    parser.add_argument("--outfile", default=OUTFILE_DIRECTORY)
+    parser.add_argument("--outb", default=OUTB_DIRECTORY)
+    args = parser.parse_args()
+
+    if args.codec:
+        mappings = idcodec.load_codec(os.path.join(args.mappings, "charset.json"))
+        if mappings is None:
+            parser.error("no charset.json recorded; generate the mappings first")
+    elif args.no_index:
+        mappings = read_mappings(args.mappings)
+    else:
+        mappings = load_mapping_index(args.mappings)
+    count = process_files(args.inputs, args.outfile, args.start, args.end, mappings, args.outb, args.workers)
+    print(f"Processed {count} file(s).")
+
+
+if __name__ == "__main__":
+    main()
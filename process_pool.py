@@ -0,0 +1,98 @@
+"""Decide whether a process pool may be started from the running program.
+
+Under the spawn and forkserver start methods (Windows, macOS, and Linux
+from Python 3.14) every pool worker re-imports the caller's __main__ module
+before it takes work. The engines (C.py, DAC.py, ...) run their menus at
+module level, without an `if __name__ == "__main__":` guard, so a pool
+started from them reruns the menu in every child and the pool breaks.
+
+usable_workers() is what the batch modules (rasterizer, llanguage) call
+before building a pool: it returns 1, meaning "work in-process", when the
+pool cannot be started safely. Callers that need the pool from an engine
+start the module's own command line instead, where the module is __main__.
+"""
+import ast
+import multiprocessing
+import os
+import sys
+
+# __main__ files already checked, by path and modification time
+_checked = {}
+
+
+def _guarded(node):
+    """True for `if __name__ == "__main__":`."""
+    test = node.test
+    return (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name) and test.left.id == "__name__"
+            and len(test.comparators) == 1 and isinstance(test.comparators[0], ast.Constant)
+            and test.comparators[0].value == "__main__")
+
+
+def _calls(node):
+    """Names called in a statement, outside the functions and classes it defines."""
+    names = set()
+    pending = [node]
+    while pending:
+        current = pending.pop()
+        if isinstance(current, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(current, ast.Call) and isinstance(current.func, ast.Name):
+            names.add(current.func.id)
+        pending.extend(ast.iter_child_nodes(current))
+    return names
+
+
+def _runs_on_import(body, defined=None):
+    """True if top-level statements run a program: a loop, input(), or a call to one of the module's functions."""
+    if defined is None:
+        defined = {node.name for node in body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        defined.add("input")
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if isinstance(node, (ast.While, ast.For, ast.AsyncFor)):
+            return True
+        if isinstance(node, ast.If):
+            if _guarded(node):
+                continue
+            if _runs_on_import(node.body, defined) or _runs_on_import(node.orelse, defined):
+                return True
+        elif isinstance(node, (ast.Try, ast.With)):
+            blocks = [node.body] + [getattr(node, name, []) for name in ("orelse", "finalbody")]
+            blocks += [handler.body for handler in getattr(node, "handlers", [])]
+            if any(_runs_on_import(block, defined) for block in blocks):
+                return True
+        elif _calls(node) & defined:
+            return True
+    return False
+
+
+def main_is_reimportable():
+    """True if pool workers can start without rerunning the caller's program.
+
+    With fork nothing is re-imported. Otherwise __main__ is parsed, and it is
+    safe unless its top level, outside a __main__ guard, loops, asks for
+    input() or calls one of its own functions.
+    """
+    if multiprocessing.get_start_method() == "fork":
+        return True
+    path = getattr(sys.modules.get("__main__"), "__file__", None)
+    if path is None or not path.endswith(".py"):
+        # Interactive session or frozen program: spawn does not re-import it
+        return True
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+        if key not in _checked:
+            with open(path, "rb") as file:
+                _checked[key] = not _runs_on_import(ast.parse(file.read(), path).body)
+    except (OSError, SyntaxError, ValueError):
+        return False
+    return _checked[key]
+
+
+def usable_workers(workers):
+    """Worker processes to use for a requested count (None: one per CPU); 1 means in-process."""
+    workers = (os.cpu_count() or 1) if workers is None else max(1, int(workers))
+    if workers > 1 and not main_is_reimportable():
+        return 1
+    return workers
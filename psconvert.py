@@ -0,0 +1,253 @@
+"""Batch PostScript -> PNG conversion through Ghostscript.
+
+img_generator's Tk path saves every image as <prefix><n>.ps. This module
+turns a range (or glob) of those files into PNGs by running Ghostscript
+directly: several files go through each gs invocation, invocations run
+side by side in a thread pool, and a content-hash cache in the output
+directory skips sources that have not changed since their last conversion.
+Images the headless raster backend already wrote as PNG are left alone.
+
+Run as a script, e.g.
+
+    python psconvert.py --directory out --prefix block --range 1 256
+    python psconvert.py --glob "out/*.ps"
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import atomic_file
+import rasterizer
+
+# Ghostscript console executables, in the order they are tried
+GHOSTSCRIPT_NAMES = ("gswin64c", "gswin32c", "gs")
+
+# Source files handed to one gs invocation
+FILES_PER_CALL = 16
+
+# Rendering resolution; 72 dpi gives one pixel per PostScript point, as PIL does
+RESOLUTION = 72
+
+CACHE_FILE = "ps2png_cache.json"
+
+
+def find_ghostscript():
+    """Path of the Ghostscript executable, or None if it cannot be found.
+
+    The GHOSTSCRIPT environment variable wins; then PATH; then the default
+    Windows install directories.
+    """
+    configured = os.environ.get("GHOSTSCRIPT")
+    if configured and shutil.which(configured):
+        return shutil.which(configured)
+    for name in GHOSTSCRIPT_NAMES:
+        found = shutil.which(name)
+        if found:
+            return found
+    for root in (os.environ.get("ProgramFiles"), os.environ.get("ProgramFiles(x86)")):
+        if root:
+            installed = sorted(glob.glob(os.path.join(root, "gs", "gs*", "bin", "gswin*c.exe")))
+            if installed:
+                return installed[-1]
+    return None
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def png_path(ps_path, output_directory="."):
+    """PNG written for ps_path: same base name, in output_directory."""
+    return os.path.join(output_directory, os.path.splitext(os.path.basename(ps_path))[0] + ".png")
+
+
+def range_sources(directory, prefix, first, last):
+    """<prefix><n>.ps paths for n in first..last inclusive, as img_generator names them."""
+    return [os.path.join(directory, f"{prefix}{n}.ps") for n in range(first, last + 1)]
+
+
+def glob_sources(pattern):
+    return sorted(glob.glob(pattern))
+
+
+def raster_images(prefix, directory="."):
+    """Paths of the PNGs the headless raster backend recorded for prefix."""
+    manifest = rasterizer.manifest_path(prefix, directory)
+    try:
+        with open(manifest, "r", encoding="utf-8") as file:
+            completed = json.load(file).get("completed", [])
+    except (FileNotFoundError, ValueError):
+        return set()
+    return {os.path.normpath(rasterizer.image_path(prefix, t, directory))
+            for start, stop in completed for t in range(start, stop)}
+
+
+def load_cache(output_directory):
+    try:
+        with open(os.path.join(output_directory, CACHE_FILE), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_cache(output_directory, cache):
+    with atomic_file.replace_file(os.path.join(output_directory, CACHE_FILE)) as file:
+        json.dump(cache, file, indent=0, sort_keys=True)
+
+
+def ghostscript_command(gs, output_template, sources, resolution=RESOLUTION):
+    return [gs, "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE", "-dEPSCrop", "-sDEVICE=png16m",
+            f"-r{resolution}", "-dTextAlphaBits=4", "-dGraphicsAlphaBits=4",
+            f"-sOutputFile={output_template}", *sources]
+
+
+def _run(command):
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError((result.stderr or result.stdout).strip() or f"gs exited with {result.returncode}")
+
+
+def convert_batch(gs, jobs, resolution=RESOLUTION):
+    """Convert [(ps_path, png_path), ...] with a single gs invocation.
+
+    Pages come out numbered across all inputs, so the batch is only trusted
+    when each source gave exactly one page; otherwise every file is
+    converted on its own. Returns the list of (ps_path, error) failures.
+    """
+    output_directory = os.path.dirname(os.path.abspath(jobs[0][1]))
+    with tempfile.TemporaryDirectory(dir=output_directory) as scratch:
+        template = os.path.join(scratch, "page%06d.png")
+        try:
+            _run(ghostscript_command(gs, template, [source for source, _ in jobs], resolution))
+            pages = sorted(os.listdir(scratch))
+        except RuntimeError:
+            pages = []
+        if len(pages) == len(jobs):
+            for page, (_, target) in zip(pages, jobs):
+                os.replace(os.path.join(scratch, page), target)
+            return []
+    failures = []
+    for source, target in jobs:
+        try:
+            _run(ghostscript_command(gs, target, [source], resolution))
+        except RuntimeError as e:
+            failures.append((source, str(e)))
+    return failures
+
+
+def convert_ps_files(sources, output_directory=".", workers=None, files_per_call=FILES_PER_CALL,
+                     resolution=RESOLUTION, skip=(), gs=None, progress=None):
+    """Convert PostScript sources to PNGs in output_directory.
+
+    Sources whose content hash matches the cache and whose PNG still exists
+    are skipped, as are PNGs listed in skip (those rendered without a PS
+    step). progress(done, total) is called as batches finish. Returns a dict
+    of counts (converted, cached, raster, missing, failed), the failures as
+    (path, message) pairs, and seconds and files_per_sec for the run.
+    """
+    gs = gs or find_ghostscript()
+    if gs is None:
+        raise FileNotFoundError("Ghostscript not found; install it or set GHOSTSCRIPT to its executable")
+    os.makedirs(output_directory, exist_ok=True)
+    skip = {os.path.normpath(path) for path in skip}
+    cache = load_cache(output_directory)
+    stats = {"converted": 0, "cached": 0, "raster": 0, "missing": 0, "failed": 0, "failures": []}
+
+    pending = []
+    for source in sources:
+        target = png_path(source, output_directory)
+        if os.path.normpath(target) in skip and os.path.exists(target):
+            stats["raster"] += 1
+            continue
+        if not os.path.exists(source):
+            if os.path.exists(target):
+                # Written directly as PNG, nothing to convert
+                stats["raster"] += 1
+            else:
+                stats["missing"] += 1
+            continue
+        key = f"{content_hash(source)}@{resolution}"
+        if cache.get(os.path.basename(target)) == key and os.path.exists(target):
+            stats["cached"] += 1
+            continue
+        pending.append((source, target, key))
+
+    batches = [pending[i:i + files_per_call] for i in range(0, len(pending), files_per_call)]
+    done = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {executor.submit(convert_batch, gs, [(s, t) for s, t, _ in batch], resolution): batch
+                   for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            failed = dict(future.result())
+            for source, target, key in batch:
+                if source in failed:
+                    stats["failed"] += 1
+                    stats["failures"].append((source, failed[source]))
+                else:
+                    stats["converted"] += 1
+                    cache[os.path.basename(target)] = key
+            save_cache(output_directory, cache)
+            done += len(batch)
+            if progress is not None:
+                progress(done, len(pending))
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["files_per_sec"] = stats["converted"] / elapsed if elapsed > 0 else float(stats["converted"])
+    return stats
+
+
+def print_progress(done, total):
+    print(f"\r{done}/{total} files", end="" if done < total else "\n", flush=True)
+
+
+def report(stats):
+    print(f"{stats['converted']} converted ({stats['files_per_sec']:,.1f} files/sec), "
+          f"{stats['cached']} unchanged, {stats['raster']} already PNG, "
+          f"{stats['missing']} missing, {stats['failed']} failed")
+    for path, message in stats["failures"]:
+        print(f"  {path}: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert PostScript images to PNG with Ghostscript.")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--glob", help="pattern of .ps files to convert")
+    selection.add_argument("--range", nargs=2, type=int, metavar=("FIRST", "LAST"),
+                           help="file ids to convert, with --prefix and --directory")
+    parser.add_argument("--prefix", default="")
+    parser.add_argument("--directory", default=".", help="where the .ps files are")
+    parser.add_argument("--output", default=".", help="where the PNGs go")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--per-call", type=int, default=FILES_PER_CALL, help="files per gs invocation")
+    parser.add_argument("--resolution", type=int, default=RESOLUTION)
+    args = parser.parse_args()
+
+    if args.glob:
+        sources = glob_sources(args.glob)
+        skip = set()
+    else:
+        sources = range_sources(args.directory, args.prefix, *args.range)
+        skip = raster_images(args.prefix, args.output)
+    try:
+        stats = convert_ps_files(sources, args.output, args.workers, args.per_call, args.resolution, skip,
+                                 progress=print_progress)
+    except FileNotFoundError as e:
+        parser.exit(1, f"{e}\n")
+    report(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""Headless raster backend for the block-image enumeration.
+
+img_generator enumerates every colouring of a grid of blocks: image t gives
+block x (row-major) the colour at digit x of t written in base len(colours),
+most significant digit first. This module paints that grid straight into a
+NumPy RGB array and saves PNG files, with no Tk canvas, display or
+PostScript step in between.
+
+Run as a script to build a numbered image set across a process pool, e.g.
+the 256 block images programming_engine loads:
+
+    python rasterizer.py --colours black white --size 16 16 --block 4 4 --range 0 256 --prefix block
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+import numpy as np
+from PIL import Image, ImageColor
+import atomic_file
+import process_pool
+
+# Canvas background left around the blocks when they do not fill the image
+BACKGROUND = (255, 255, 255)
+
+# Images rendered per task in a batch build
+BATCH_CHUNK = 64
+
+# Most images one batch build renders; the full enumeration of even a small
+# grid (3 colours, 100 cells: about 5e47 images) could never finish
+MAX_BATCH_IMAGES = 1 << 20
+
+# Tasks kept queued per pool worker
+TASKS_PER_WORKER = 2
+
+# zlib level for the PNGs; block images are flat colour, so fast settings compress well
+PNG_COMPRESS_LEVEL = 1
+
+# Colour block images larger than this many pixels are streamed to disk
+# rather than built in memory (3 bytes a pixel)
+STREAM_PIXELS = 1 << 26
+
+
+def parse_colours(colours):
+    """Colour names or #hex strings as a (k, 3) uint8 palette."""
+    return np.array([ImageColor.getrgb(colour)[:3] for colour in colours], dtype=np.uint8)
+
+
+class BlockGrid:
+    """A width x height image divided into block_width x block_height blocks."""
+
+    def __init__(self, colours, width, height, block_width, block_height):
+        self.colours = list(colours)
+        self.palette = parse_colours(self.colours)
+        self.width = width
+        self.height = height
+        self.block_width = block_width
+        self.block_height = block_height
+        self.columns = width // block_width
+        self.rows = height // block_height
+        self.cells = self.columns * self.rows
+        # Number of images; a Python int, since it outgrows len() for large grids
+        self.count = len(self.palette) ** self.cells
+
+    def __len__(self):
+        return self.count
+
+    def digits(self, t):
+        """Colour index of every block of image t, row-major."""
+        radix = len(self.palette)
+        digits = np.zeros(self.cells, dtype=np.intp)
+        for x in range(self.cells - 1, -1, -1):
+            if not t:
+                break
+            t, digits[x] = divmod(t, radix)
+        return digits
+
+    def render(self, t):
+        """RGB array (height, width, 3) of image t."""
+        grid = self.palette[self.digits(t)].reshape(self.rows, self.columns, 3)
+        blocks = np.repeat(np.repeat(grid, self.block_height, axis=0), self.block_width, axis=1)
+        if blocks.shape[:2] == (self.height, self.width):
+            return blocks
+        image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        image[:] = BACKGROUND
+        image[:blocks.shape[0], :blocks.shape[1]] = blocks
+        return image
+
+    def save(self, t, path):
+        save_png(self.render(t), path)
+
+
+def save_png(array, path):
+    Image.fromarray(array).save(path, compress_level=PNG_COMPRESS_LEVEL)
+
+
+def image_path(prefix, t, directory='.'):
+    """File name img_generator gives image t (numbered from 1)."""
+    return os.path.join(directory, f"{prefix}{t + 1}.png")
+
+
+def generate_block_images(colours, width, height, block_width, block_height, prefix, start=0, stop=None,
+                          directory='.'):
+    """Render and save images start..stop-1 of the enumeration as PNGs.
+
+    Returns (images written, images per second).
+    """
+    grid = BlockGrid(colours, width, height, block_width, block_height)
+    stop = grid.count if stop is None else min(stop, grid.count)
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    for t in range(start, stop):
+        grid.save(t, image_path(prefix, t, directory))
+    elapsed = time.perf_counter() - started
+    count = max(stop - start, 0)
+    return count, count / elapsed if elapsed > 0 else float(count)
+
+
+def word_colours(words, deterministic=False):
+    """Colour of every word from its hash, as an (n, 3) uint8 array.
+
+    The default matches data_to_color0 (hash(word) & 0xFFFFFF), which changes
+    between runs because Python salts str hashes per process. deterministic
+    uses a 24-bit BLAKE2b digest instead, so the same text always gives the
+    same image. Each distinct word is hashed once.
+    """
+    unique, inverse = np.unique(np.asarray(words, dtype=str), return_inverse=True)
+    if deterministic:
+        packed = b''.join(hashlib.blake2b(word.encode('utf-8'), digest_size=3).digest() for word in unique.tolist())
+        table = np.frombuffer(packed, dtype=np.uint8).reshape(-1, 3)
+    else:
+        values = np.array([hash(word) & 0xFFFFFF for word in unique.tolist()], dtype=np.uint32)
+        table = np.stack([(values >> 16) & 0xFF, (values >> 8) & 0xFF, values & 0xFF], axis=1).astype(np.uint8)
+    return table[inverse.ravel()]
+
+
+def colours_to_array(colours):
+    """'#RRGGBB' strings (or any colour Pillow knows) as an (n, 3) uint8 array."""
+    if all(len(colour) == 7 and colour[0] == '#' for colour in colours):
+        try:
+            return np.frombuffer(bytes.fromhex(''.join(colour[1:] for colour in colours)), dtype=np.uint8).reshape(-1, 3)
+        except ValueError:
+            pass
+    return parse_colours(colours)
+
+
+def square_layout(count):
+    """(columns, rows) create_image0 uses for count blocks."""
+    columns = int(count ** 0.5)
+    rows = columns if columns ** 2 == count else columns + 1
+    return columns, rows
+
+
+def colour_block_strips(colours, columns, rows, pixel_side_length):
+    """Yield the colour block image one row of blocks at a time.
+
+    Each strip is a (pixel_side_length, columns * pixel_side_length, 3)
+    array; only the colours of the current and previous block rows are
+    touched, so streaming the strips to disk keeps memory bounded by the
+    image width rather than the number of colours.
+    """
+    colours = np.asarray(colours, dtype=np.uint8).reshape(-1, 3)
+    cells = columns * rows
+    drawn = min(len(colours), cells)
+    side = pixel_side_length
+
+    def grid_row(i):
+        row = np.full((columns, 3), 255, dtype=np.uint8)
+        first = i * columns
+        if first < drawn:
+            row[:min(drawn - first, columns)] = colours[first:min(first + columns, drawn)]
+        return row
+
+    previous = None
+    for i in range(rows):
+        current = grid_row(i)
+        strip = np.repeat(np.repeat(current[None], side, axis=0), side, axis=1)
+        # Only the block rows on either side of the last colour carry rectangle edges
+        if i * columns <= drawn + columns:
+            for j in range(max(drawn - i * columns, 0), columns):
+                # Edges painted by earlier neighbours, in drawing order; an edge
+                # falling on the next strip is repainted there as a corner
+                if i > 0 and j > 0 and (i - 1) * columns + j - 1 < drawn:
+                    strip[0, j * side] = previous[j - 1]
+                if i > 0 and (i - 1) * columns + j < drawn:
+                    strip[0, j * side:(j + 1) * side + 1] = previous[j]
+                if j > 0 and i * columns + j - 1 < drawn:
+                    strip[:, j * side] = current[j - 1]
+        yield strip
+        previous = current
+
+
+def colour_block_array(colours, columns, rows, pixel_side_length):
+    """Paint colours row-major into a grid of pixel_side_length squares on white.
+
+    Matches the per-block ImageDraw.rectangle loop, including the one-pixel
+    edge each rectangle leaves on the unfilled blocks after the last colour
+    (PIL rectangles include their bottom-right corner).
+    """
+    strips = list(colour_block_strips(colours, columns, rows, pixel_side_length))
+    if not strips:
+        return np.zeros((0, columns * pixel_side_length, 3), dtype=np.uint8)
+    return np.concatenate(strips)
+
+
+class StreamingPNGWriter:
+    """Writes an 8-bit RGB PNG a band of rows at a time.
+
+    Rows are Up-filtered and fed through one zlib stream, each compressed
+    piece going out as its own IDAT chunk, so only the band being written
+    is ever held in memory.
+    """
+
+    def __init__(self, path, width, height, compress_level=PNG_COMPRESS_LEVEL):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.previous = np.zeros(width * 3, dtype=np.uint8)
+        self.compressor = zlib.compressobj(compress_level)
+        self.file = open(path, 'wb')
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        # 8 bits per channel, colour type 2 (RGB), no interlacing
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        """Append a (k, width, 3) uint8 band below the rows written so far."""
+        rows = np.ascontiguousarray(rows, dtype=np.uint8).reshape(-1, self.width * 3)
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError(f"PNG is {self.height} rows high; got {self.rows_written + len(rows)}")
+        if not len(rows):
+            return
+        scanlines = np.empty((len(rows), self.width * 3 + 1), dtype=np.uint8)
+        scanlines[:, 0] = 2  # Up filter: repeated rows compress to runs of zeros
+        np.subtract(rows[0], self.previous, out=scanlines[0, 1:])
+        np.subtract(rows[1:], rows[:-1], out=scanlines[1:, 1:])
+        self.previous = rows[-1].copy()
+        self.rows_written += len(rows)
+        data = self.compressor.compress(scanlines.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG is {self.height} rows high; only {self.rows_written} written")
+            self._chunk(b'IDAT', self.compressor.flush())
+            self._chunk(b'IEND', b'')
+        finally:
+            self.file.close()
+
+
+def stream_colour_blocks(path, colours, columns, rows, pixel_side_length, compress_level=PNG_COMPRESS_LEVEL):
+    """Write the colour block image straight to a PNG, one row of blocks at a time.
+
+    Gives the same pixels as colour_block_array without ever holding the
+    whole image. Returns (width, height) of the PNG.
+    """
+    width, height = columns * pixel_side_length, rows * pixel_side_length
+    with StreamingPNGWriter(path, width, height, compress_level) as writer:
+        for strip in colour_block_strips(colours, columns, rows, pixel_side_length):
+            writer.write_rows(strip)
+    return width, height
+
+
+def manifest_path(prefix, directory='.'):
+    return os.path.join(directory, f"{prefix}manifest.json")
+
+
+def load_manifest(path, parameters):
+    """Completed (start, stop) ranges recorded for the same parameters, else none."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return []
+    if manifest.get("parameters") != parameters:
+        return []
+    return [tuple(done) for done in manifest.get("completed", [])]
+
+
+def save_manifest(path, parameters, completed):
+    with atomic_file.replace_file(path) as file:
+        json.dump({"parameters": parameters, "completed": sorted(completed)}, file)
+
+
+def _render_range(colours, width, height, block_width, block_height, prefix, directory, start, stop):
+    grid = BlockGrid(colours, width, height, block_width, block_height)
+    for t in range(start, stop):
+        grid.save(t, image_path(prefix, t, directory))
+    return start, stop
+
+
+def _rendered_ranges(arguments, pending, workers):
+    """Render the pending ranges, in-process or across a pool, yielding each (first, last) as it finishes.
+
+    pending may be lazy: the pool takes a few ranges per worker at a time.
+    """
+    if workers == 1:
+        for first, last in pending:
+            yield _render_range(*arguments, first, last)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = set()
+        for first, last in pending:
+            running.add(executor.submit(_render_range, *arguments, first, last))
+            if len(running) >= workers * TASKS_PER_WORKER:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+        for future in as_completed(running):
+            yield future.result()
+
+
+def run_bounds(grid, start, stop):
+    """(start, stop) of a batch build, stop clipped to the grid's images (all of them when None).
+
+    Raises ValueError when that is more than MAX_BATCH_IMAGES images.
+    """
+    stop = grid.count if stop is None else min(stop, grid.count)
+    if stop - start > MAX_BATCH_IMAGES:
+        raise ValueError(f"{stop - start:,} images in the range, but one run renders at most {MAX_BATCH_IMAGES:,}; "
+                         f"give a last image number")
+    return start, stop
+
+
+def build_block_images(colours, width, height, block_width, block_height, prefix, start=0, stop=None,
+                       directory='.', workers=None, chunk=BATCH_CHUNK, progress=None):
+    """Render images start..stop-1 across a process pool, resumably.
+
+    Files are named as img_generator names them (<prefix><t+1>.png). The
+    manifest <prefix>manifest.json records the parameters and every finished
+    range, so a rerun with the same parameters skips work already done.
+    progress(done, total) is called as ranges finish. Returns (images
+    rendered by this run, images per second). The ranges are rendered
+    in-process when the calling program would rerun itself in pool workers
+    (see process_pool); build_in_subprocess keeps the pool for such callers.
+    A run is limited to MAX_BATCH_IMAGES images (ValueError otherwise).
+    """
+    grid = BlockGrid(colours, width, height, block_width, block_height)
+    start, stop = run_bounds(grid, start, stop)
+    os.makedirs(directory, exist_ok=True)
+    parameters = {"colours": list(colours), "width": width, "height": height,
+                  "block_width": block_width, "block_height": block_height, "prefix": prefix}
+    manifest = manifest_path(prefix, directory)
+    completed = set(load_manifest(manifest, parameters))
+    ranges = ((first, min(first + chunk, stop)) for first in range(start, stop, chunk))
+    pending = (r for r in ranges if r not in completed)
+    total = stop - start
+    done = sum(last - first for first, last in completed
+               if start <= first < stop and (first - start) % chunk == 0 and last == min(first + chunk, stop))
+    if progress is not None:
+        progress(done, total)
+
+    started = time.perf_counter()
+    arguments = (list(colours), width, height, block_width, block_height, prefix, directory)
+    rendered = 0
+    for first, last in _rendered_ranges(arguments, pending, process_pool.usable_workers(workers)):
+        completed.add((first, last))
+        save_manifest(manifest, parameters, completed)
+        rendered += last - first
+        done += last - first
+        if progress is not None:
+            progress(done, total)
+    elapsed = time.perf_counter() - started
+    return rendered, rendered / elapsed if elapsed > 0 else float(rendered)
+
+
+def build_in_subprocess(colours, width, height, block_width, block_height, prefix, start=0, stop=None,
+                        directory='.', workers=None):
+    """Run build_block_images through this module's command line in a new Python process.
+
+    The pool is then started with rasterizer as __main__, so the engines,
+    whose menus run on import, still get their workers. Progress and the
+    final rate are printed by the child; returns its exit code. Raises
+    ValueError, before starting anything, for a range build_block_images
+    would refuse.
+    """
+    start, stop = run_bounds(BlockGrid(colours, width, height, block_width, block_height), start, stop)
+    command = [sys.executable, os.path.abspath(__file__), "--colours", *colours,
+               "--size", str(width), str(height), "--block", str(block_width), str(block_height),
+               "--range", str(start), str(stop), "--prefix", prefix, "--directory", directory]
+    if workers is not None:
+        command += ["--workers", str(workers)]
+    return subprocess.call(command)
+
+
+def print_progress(done, total):
+    print(f"\r{done}/{total} images", end="" if done < total else "\n", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a numbered set of block images.")
+    parser.add_argument("--colours", nargs="+", required=True, help="colour names or #RRGGBB values")
+    parser.add_argument("--size", nargs=2, type=int, required=True, metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--block", nargs=2, type=int, required=True, metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--range", nargs=2, type=int, metavar=("START", "STOP"),
+                        help="combination indices to render (default: all)")
+    parser.add_argument("--prefix", default="block")
+    parser.add_argument("--directory", default=".")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    start, stop = args.range if args.range else (0, None)
+    try:
+        rendered, rate = build_block_images(args.colours, args.size[0], args.size[1], args.block[0], args.block[1],
+                                            args.prefix, start, stop, args.directory, args.workers,
+                                            progress=print_progress)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{rendered} images rendered ({rate:,.0f} images/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ Date: 2025-03-17
 
 import pygame
 import os
+import functools
 import tkinter as tk
 from tkinter import ttk, simpledialog, messagebox
 import json
@@ -316,220 +317,67 @@ def check_ghostscript():
         print("\nOnce installed, you may need to restart your terminal or computer.")
         print("Alternative: You can use other tools to convert PS files to PNG before using this program.")
 
-def alt_convert_ps_to_png(ps_path, png_path):
-    """
-    Alternative method to convert PS to PNG without Ghostscript using pygame.
-    
-    Creates a placeholder image when Ghostscript is not available.
-    
-    Args:
-        ps_path (str): Path to the source PS file
-        png_path (str): Path to save the converted PNG file
-        
-    Returns:
-        bool: True if conversion was successful, False otherwise
-    """
-    try:
-        # Method 1: Try using a temporary PDF conversion if reportlab is available
-        try:
-            from reportlab.graphics import renderPM
-            from reportlab.graphics.shapes import Drawing
-            
-            print(f"Converting {ps_path} to {png_path} using alternate method...")
-            
-            # Create a blank image
-            width, height = 500, 500  # Default size
-            
-            # Read some content from the PS file to create a representation
-            with open(ps_path, 'r') as ps_file:
-                ps_content = ps_file.read(1000)  # Read first 1000 chars to analyze
-            
-            # Try to extract size from PS file
-            import re
-            bounds_match = re.search(r'%%BoundingBox:\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)', ps_content)
-            if bounds_match:
-                x1, y1, x2, y2 = map(int, bounds_match.groups())
-                width, height = x2 - x1, y2 - y1
-            
-            # Create a surface
-            surface = pygame.Surface((width, height), pygame.SRCALPHA)
-            surface.fill((255, 255, 255))
-            
-            # Draw a representation of the PS content
-            # This is very basic - in reality, PS files are complex
-            font = pygame.font.Font(None, 24)
-            text = font.render(f"PS content from {os.path.basename(ps_path)}", True, (0, 0, 0))
-            surface.blit(text, (20, 20))
-            
-            # Draw a border
-            pygame.draw.rect(surface, (0, 0, 0), (0, 0, width-1, height-1), 1)
-            
-            # Save the image
-            pygame.image.save(surface, png_path)
-            
-            print(f"Created representation at {png_path} (not a true conversion)")
-            return True
-            
-        except ImportError:
-            # Method 2: If reportlab isn't available, create a default image with warning
-            width, height = 500, 500
-            surface = pygame.Surface((width, height), pygame.SRCALPHA)
-            surface.fill((255, 255, 255))
-            
-            # Create a message about the conversion
-            font = pygame.font.Font(None, 24)
-            lines = [
-                f"PS File: {os.path.basename(ps_path)}",
-                "Could not convert - Ghostscript required",
-                "Install Ghostscript for proper conversion",
-                "This is a placeholder image"
-            ]
-            
-            for i, line in enumerate(lines):
-                text = font.render(line, True, (0, 0, 0))
-                surface.blit(text, (20, 20 + i * 30))
-            
-            # Draw a border
-            pygame.draw.rect(surface, (0, 0, 0), (0, 0, width-1, height-1), 1)
-            
-            # Save the image
-            pygame.image.save(surface, png_path)
-            
-            print(f"Created placeholder at {png_path} (not a true conversion)")
-            return True
-            
-    except Exception as e:
-        print(f"Alternative conversion failed: {e}")
-        return False
-
 def compile_image_file():
     """
     Convert image files from PS format to PNG.
     
-    This function allows batch conversion of PostScript files to PNG format.
-    It requires Ghostscript to be installed for proper conversion, but includes
-    a fallback method if Ghostscript is not available.
+    Files are chosen by id range (prefix + number, as the Image Generator names
+    them) or by glob pattern and converted by the psconvert batch converter:
+    several files per Ghostscript call, calls run in parallel, and a content-hash
+    cache skips sources that have not changed since they were last converted.
+    Images the headless raster backend already wrote as PNG are skipped, so no
+    PostScript is needed for them at all. Throughput is reported at the end.
     """
     try:
-        # Check if PIL is installed
-        try:
-            from PIL import Image
-        except ImportError:
-            print("Error: PIL (pillow) module is not installed. Please install it first.")
-            print("You can install it using: pip install pillow")
+        import psconvert
+        
+        if psconvert.find_ghostscript() is None:
+            check_ghostscript()
+            print("\nImages rendered headlessly by the Image Generator are already PNG and need no conversion.")
             return
         
-        # Check if Ghostscript is installed and accessible
-        ghostscript_found = False
-        try:
-            # Try to find ghostscript using subprocess
-            import subprocess
-            try:
-                # Try Windows command
-                subprocess.run(["gswin64c", "-v"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-                ghostscript_found = True
-            except FileNotFoundError:
-                try:
-                    # Try standard command (for Unix/macOS)
-                    subprocess.run(["gs", "-v"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-                    ghostscript_found = True
-                except FileNotFoundError:
-                    ghostscript_found = False
-        except Exception:
-            ghostscript_found = False
-            
-        if not ghostscript_found:
-            print("\nERROR: Ghostscript is not installed or not in your PATH.")
-            print("\nTo fix this:")
-            print("1. Install Ghostscript:")
-            print("   - Windows: Download from https://ghostscript.com/releases/gsdnld.html")
-            print("   - macOS: Use Homebrew with 'brew install ghostscript'")
-            print("   - Linux: Use 'apt-get install ghostscript' or equivalent for your distribution")
-            print("\n2. After installation, make sure Ghostscript is in your system PATH")
-            print("\n3. Alternative: Convert your .ps files to PNG using another tool first")
-            print("   - You can use online converters or other software if Ghostscript installation is problematic")
+        ins = input("Enter path of files: ")
+        if not os.path.exists(ins):
+            print(f"Warning: The path {ins} doesn't exist. Files might not be found.")
+        
+        pattern = input("Enter a glob pattern of .ps files (leave empty to select by file id): ").strip()
+        if pattern:
+            sources = psconvert.glob_sources(os.path.join(ins, pattern))
+            pre = ""
+            if not sources:
+                print(f"No files match {pattern} in {ins}.")
+                return
+        else:
+            pre = input("Enter filename-prefix: ")
             
-            use_alternative = input("\nWould you like to try an alternative method without Ghostscript? (y/n): ")
-            if use_alternative.lower() != 'y':
+            ins_x = input("Enter first file id: ")
+            try:
+                x = int(ins_x)
+            except ValueError:
+                print("Error: Please enter a valid first file ID.")
                 return
             
-            print("\nUsing alternative method (may not work for all PS files)...")
-            # Alternative method will be implemented below
+            y = x
+            donu = input("Do you have more than one file (y [Yes], n [No])? ")
+            if donu.lower() == 'y':
+                ins_y = input("Enter last file id: ")
+                try:
+                    y = int(ins_y)
+                except ValueError:
+                    print("Error: Please enter a valid last file ID.")
+                    return
+            sources = psconvert.range_sources(ins, pre, x, y)
         
-        nof = input("Input number of files: ")
+        workers = input("Number of Ghostscript calls to run at once (leave empty for one per core): ").strip()
         try:
-            nof_ = int(nof)
+            workers = int(workers) if workers else None
         except ValueError:
             print("Error: Please enter a valid number.")
             return
-            
-        ins_x = input("Enter first file id: ")
-        try:
-            x = int(ins_x)
-        except ValueError:
-            print("Error: Please enter a valid first file ID.")
-            return
-            
-        donu = input("Do you have more than one file (y [Yes], n [No])? ")
-        
-        if donu.lower() == 'y':
-            ins_y = input("Enter last file id: ")
-            try:
-                y = int(ins_y)
-            except ValueError:
-                print("Error: Please enter a valid last file ID.")
-                return
-        
-        ins = input("Enter path of files: ")
-        if not os.path.exists(ins):
-            print(f"Warning: The path {ins} doesn't exist. Files might not be found.")
-        
-        pre = input("Enter filename-prefix: ")
-        
-        if nof_ > 1:
-            for i in range(x, y+1):
-                ixy = str(i)
-                path = os.path.join(ins, f"{pre}{ixy}.ps")
-                
-                if not os.path.exists(path):
-                    print(f"Warning: File {path} not found, skipping.")
-                    continue
-                    
-                try:
-                    if ghostscript_found:
-                        # Use regular PIL with Ghostscript
-                        img = Image.open(path)
-                        output_path = f"{pre}{ixy}.png"
-                        img.save(output_path)
-                        print(f"Converted: {path} -> {output_path}")
-                    else:
-                        # Use alternative method
-                        output_path = f"{pre}{ixy}.png"
-                        alt_convert_ps_to_png(path, output_path)
-                except Exception as e:
-                    print(f"Error converting {path}: {e}")
         
-        elif nof_ == 1:
-            path = os.path.join(ins, f"{pre}{ins_x}.ps")
-            
-            if not os.path.exists(path):
-                print(f"Warning: File {path} not found.")
-                return
-                
-            try:
-                if ghostscript_found:
-                    # Use regular PIL with Ghostscript
-                    img = Image.open(path)
-                    output_path = f"{pre}{ins_x}.png"
-                    img.save(output_path)
-                    print(f"Converted: {path} -> {output_path}")
-                else:
-                    # Use alternative method
-                    output_path = f"{pre}{ins_x}.png"
-                    alt_convert_ps_to_png(path, output_path)
-            except Exception as e:
-                print(f"Error converting {path}: {e}")
-
+        skip = psconvert.raster_images(pre) if pre else set()
+        stats = psconvert.convert_ps_files(sources, ".", workers, skip=skip, progress=psconvert.print_progress)
+        psconvert.report(stats)
         print("Image conversion completed.")
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -538,8 +386,9 @@ def img_generator():
     """
     Generate grid-based images with custom colors.
     
-    This function creates a grid of colored cells and saves them as PostScript files,
-    which can later be converted to PNG using the compile_image_file function.
+    This function creates a grid of colored cells and saves them either directly as
+    PNG files through the headless raster backend, or as PostScript files from a Tk
+    canvas, which can later be converted to PNG using the compile_image_file function.
     """
     try:
         # Check if required modules are installed
@@ -554,9 +403,13 @@ def img_generator():
         
         print("Random number seed:", random.random())
         
-        master = tk.Tk()
-        master.title("Image Generator")
-        master.attributes('-fullscreen', True)
+        headless = input("Render PNG images directly, without a display? (y/n): ").lower() == 'y'
+        
+        master = None
+        if not headless:
+            master = tk.Tk()
+            master.title("Image Generator")
+            master.attributes('-fullscreen', True)
         
         print("Welcome to Image Generator\n")
         print("Tip: side width should be a factor of the image width, the same goes for the image height in relation to the side height of each pixel.")
@@ -575,7 +428,8 @@ def img_generator():
             b = int(b1)
         except ValueError:
             print("Error: Please enter valid numbers for dimensions.")
-            master.destroy()
+            if master is not None:
+                master.destroy()
             return
         
         # Check if dimensions make sense
@@ -587,7 +441,8 @@ def img_generator():
         pin_p1 = a / change
         pin_p2 = b / change_h
         
-        w = Canvas(master, width=a, height=b)
+        if not headless:
+            w = Canvas(master, width=a, height=b)
         
         # Color selection
         c = []
@@ -605,7 +460,8 @@ def img_generator():
         # Check if at least one color was added
         if len(c) == 0:
             print("Error: No colors were specified.")
-            master.destroy()
+            if master is not None:
+                master.destroy()
             return
         
         # Calculate generation parameters
@@ -616,18 +472,26 @@ def img_generator():
         name = 1
         cells = ((a // change) * (b // change_h))
         upper = cells - 1
-        nbr_comb = math.pow(len(c), cells)
-        files = int(nbr_comb)
+        # Exact integer: a float power overflows for grids of 1024 cells and more
+        files = len(c) ** cells
         
         if files > 1000:
             confirm = input(f"Warning: This will generate {files} files. Continue? (y/n): ")
             if confirm.lower() != 'y':
                 print("Operation cancelled.")
-                master.destroy()
+                if master is not None:
+                    master.destroy()
                 return
         
         img_fn_prefix = input("Enter Image filename prefix (omit the file extension name): ")
         
+        if headless:
+            import rasterizer
+            count, rate = rasterizer.generate_block_images(c, a, b, change, change_h, img_fn_prefix,
+                                                           stop=min(files, 1000))
+            print(f"Image generation complete. {count} PNG images created ({rate:,.0f} images/sec).")
+            return
+        
         print(f"\nGenerating {files} image files...")
         file_count = 0
         rown = 0
@@ -654,8 +518,9 @@ def img_generator():
                 c_length = len(c)    
                 switch = 0
                 
-                rdiv = math.pow(len(c), col)
-                cell = (rown / rdiv) % (len(c))
+                # Integer digit of rown: float powers overflow on the large grids
+                rdiv = len(c) ** col
+                cell = (rown // rdiv) % (len(c))
                 celled = int(cell)
                 
                 # Create rectangle with selected color
@@ -928,15 +793,21 @@ class DictionaryViewer:
     A real-time updatable viewer for the command dictionary.
     
     This class provides a UI for viewing, searching, and exporting
-    commands stored in the command dictionary.
+    commands stored in the command dictionary, with the p50 / p95 run
+    time of each command from the slot profile.
     """
-    def __init__(self, parent_window=None):
+    def __init__(self, parent_window=None, profiler=None):
         """
         Initialize the Dictionary Viewer.
         
         Args:
             parent_window: Parent Tkinter window (optional)
+            profiler: SlotProfiler with the latencies (optional, the profile
+                of the session's last matrix otherwise)
         """
+        import command_profiler
+        self.profiler = profiler or command_profiler.SlotProfiler(session_data["last_matrix"])
+        
         # Create a new Tkinter window
         self.root = tk.Toplevel(parent_window) if parent_window else tk.Tk()
         self.root.title("Command Dictionary Viewer")
@@ -964,19 +835,21 @@ class DictionaryViewer:
         ttk.Entry(search_frame, textvariable=self.search_var, width=40).pack(side=tk.LEFT, padx=5)
         
         # Create treeview for commands
-        columns = ("command_id", "command", "parameters", "updated")
+        columns = ("command_id", "command", "parameters", "latency", "updated")
         self.tree = ttk.Treeview(main_frame, columns=columns, show="headings")
         
         # Define headings
         self.tree.heading("command_id", text="Command ID")
         self.tree.heading("command", text="Command")
         self.tree.heading("parameters", text="Parameters")
+        self.tree.heading("latency", text="p50 / p95")
         self.tree.heading("updated", text="Last Updated")
         
         # Define column widths
         self.tree.column("command_id", width=80)
         self.tree.column("command", width=300)
         self.tree.column("parameters", width=250)
+        self.tree.column("latency", width=120)
         self.tree.column("updated", width=150)
         
         # Create scrollbars
@@ -1022,7 +895,15 @@ class DictionaryViewer:
             params_str = params_str[:50] + "..." if len(params_str) > 50 else params_str
             
             # Add to treeview
-            self.tree.insert("", "end", values=(cmd_id, cmd_text, params_str, cmd_data.get("last_updated", "Unknown")))
+            self.tree.insert("", "end", values=(cmd_id, cmd_text, params_str, self.latency(cmd_id),
+                                                cmd_data.get("last_updated", "Unknown")))
+    
+    def latency(self, cmd_id):
+        """p50 / p95 run time of a command, or an empty string if it never ran"""
+        import command_profiler
+        if not cmd_id.isdigit():
+            return ""
+        return command_profiler.latency_text(self.profiler.summary(int(cmd_id)))
     
     def search_changed(self, *args):
         """Filter treeview based on search text"""
@@ -1048,7 +929,8 @@ class DictionaryViewer:
                 params_str = params_str[:50] + "..." if len(params_str) > 50 else params_str
                 
                 # Add to treeview
-                self.tree.insert("", "end", values=(cmd_id, cmd_text, params_str, cmd_data.get("last_updated", "Unknown")))
+                self.tree.insert("", "end", values=(cmd_id, cmd_text, params_str, self.latency(cmd_id),
+                                                    cmd_data.get("last_updated", "Unknown")))
     
     def on_item_double_click(self, event):
         """Handle double-click on a treeview item"""
@@ -1090,15 +972,15 @@ def update_command_file(filename, commands):
     
     Args:
         filename (str): Path to the command file
-        commands (list): List of command strings to write
+        commands: The matrix's slots (command_matrix.open_matrix), written in the
+            file's own layout; an indexed matrix has already written the edited
+            slot in place, so it is only flushed
         
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        with open(filename, 'w') as f:
-            for cmd in commands:
-                f.write(cmd + "\n")
+        commands.save(filename)
         print(f"Command file {filename} updated")
         return True
     except Exception as e:
@@ -1112,31 +994,34 @@ def generate_cmp():
     Creates a template file with placeholders for all 65536 possible commands,
     organized into different sections for input, variable handling, and execution.
     """
+    import command_matrix
+    
     try:
-        name_m = input("Enter the name for your command matrix: ")
-        with open(name_m, 'w') as f:
-            # Lines 1 to 13107: string_var# = input('Enter string_var: ')
-            for i in range(13107):
-                f.write(f"string_var{i} = input('Enter string_var: ')\n")
-            
-            # Lines 13108 to 26214: var_given# = input('Enter the variable name to be used: ')
-            for i in range(13107):
-                f.write(f"var_given{i} = input('Enter the variable name to be used: ')\n")
-            
-            # Lines 26215 to 39321: var_glob# = globals()[var_given#]
-            for i in range(13107):
-                f.write(f"var_glob{i} = globals().get(var_given{i}, 'Variable not found')  # Error handling: 'Variable not found'\n")
-            
-            # Lines 39322 to 52428: exec(var_glob#)
-            for i in range(13107):
-                f.write(f"if isinstance(var_glob{i}, str): exec(var_glob{i})  # Error handling: Execute only if it's a string\n")
-            
-            # Lines 52429 to 65535: eval(var_glob#)
-            for i in range(13107):
-                f.write(f"if isinstance(var_glob{i}, str): result = eval(var_glob{i})  # Error handling: Evaluate only if it's a string\n")
-            
-            # Line 65536: Hyperlink
-            f.write("import webbrowser; webbrowser.open('https://www.openai.com')")
+        name_m = input("Enter the name for your command matrix (.txt for one command per line, any other name for the indexed format): ")
+        sources = []
+        # Lines 1 to 13107: string_var# = input('Enter string_var: ')
+        for i in range(13107):
+            sources.append(f"string_var{i} = input('Enter string_var: ')")
+        
+        # Lines 13108 to 26214: var_given# = input('Enter the variable name to be used: ')
+        for i in range(13107):
+            sources.append(f"var_given{i} = input('Enter the variable name to be used: ')")
+        
+        # Lines 26215 to 39321: var_glob# = globals()[var_given#]
+        for i in range(13107):
+            sources.append(f"var_glob{i} = globals().get(var_given{i}, 'Variable not found')  # Error handling: 'Variable not found'")
+        
+        # Lines 39322 to 52428: exec(var_glob#)
+        for i in range(13107):
+            sources.append(f"if isinstance(var_glob{i}, str): exec(var_glob{i})  # Error handling: Execute only if it's a string")
+        
+        # Lines 52429 to 65535: eval(var_glob#)
+        for i in range(13107):
+            sources.append(f"if isinstance(var_glob{i}, str): result = eval(var_glob{i})  # Error handling: Evaluate only if it's a string")
+        
+        # Line 65536: Hyperlink
+        sources.append("import webbrowser; webbrowser.open('https://www.openai.com')")
+        command_matrix.write_matrix(name_m, sources)
         
         print(f"Command matrix template created: {name_m}")
     except Exception as e:
@@ -1204,47 +1089,30 @@ def programming_engine():
     pygame.font.init()
     font = pygame.font.Font(None, 18)
     
-    # Check if Command_Template.txt exists, create if not
-    if not os.path.exists("Command_Template.txt"):
-        print("Command_Template.txt not found. Creating default template...")
-        bus_ = 255
-        amount_ = (bus_ + 1) * (bus_ + 1)
-        line_number_ = 0
-                    
-        create_f = open("Command_Template.txt", "w")
-        while(line_number_ < amount_):
-            create_f.write("print(\"[Empty Command Slot] (Change using a text-editor to Update this slot in Command_Template.txt\") #remembering to rename Command_Template.txt\n")
-            line_number_ = line_number_ + 1
+    import command_matrix
     
-        create_f.close()
+    # Check if Command_Template.txt exists, create if not (a sparse template: every slot runs the default command)
+    if command_matrix.ensure_template("Command_Template.txt"):
         print("Command_Template.txt created successfully")
     
-    # LoadCommands
-    xin = 0
+    # LoadCommands (slots are read on first use)
     filnam = session_data.get("last_matrix", "Command_Template.txt")
     
     try:
-        with open(filnam, 'r') as file:
-            commands = file.readlines()
-            xin = xin + 1
+        star = command_matrix.open_matrix(filnam)
     except FileNotFoundError:
         print(f"Error: {filnam} not found. Falling back to Command_Template.txt")
         filnam = "Command_Template.txt"
         try:
-            with open(filnam, 'r') as file:
-                commands = file.readlines()
+            star = command_matrix.open_matrix(filnam)
         except FileNotFoundError:
             print("Critical error: No command file found!")
             tk_root.destroy()
             pygame.quit()
             return
     
-    star = [0]
-    
-    for i, command in enumerate(commands):
-        commands[i] = command.strip()
-        star.append(command)
-    del star[0]
+    # Slots are compiled on their first run and reused after that
+    compiled = command_matrix.CommandCache(filnam)
     
     # Check if Coordinates_Python.txt exists, create if not
     if not os.path.exists("Coordinates_Python.txt"):
@@ -1280,8 +1148,9 @@ def programming_engine():
         starsy = [i // 256 for i in range(65536)]
     
     # Load images - create placeholders if needed
-    block_images = []
-    if not all(os.path.exists(f"block{i+1}.png") for i in range(256)):
+    import engine_graphics
+    
+    if not engine_graphics.atlas_available() and not all(os.path.exists(f"block{i+1}.png") for i in range(256)):
         print("Block images not found. Creating placeholder images...")
         try:
             from PIL import Image, ImageDraw
@@ -1302,15 +1171,11 @@ def programming_engine():
                 surf.fill((i % 4 * 60, i % 8 * 30, i % 16 * 15))
                 pygame.image.save(surf, f"block{i+1}.png")
     
-    for i in range(256):
-        try:
-            block_images.append(pygame.image.load(f"block{i+1}.png"))
-        except pygame.error:
-            # Create a fallback image if loading fails
-            surf = pygame.Surface((50, 50))
-            surf.fill((100, 100, 100))
-            block_images.append(surf)
-            print(f"Warning: Failed to load block{i+1}.png, using fallback")
+    # All 256 blocks come from one atlas file, rebuilt only when the block images change;
+    # unreadable images are packed as grey fallback tiles
+    block_textures = engine_graphics.BlockTextures()
+    for i in block_textures.index["fallbacks"]:
+        print(f"Warning: Failed to load block{i+1}.png, using fallback")
     
     # Check if player images exist, create if not
     if not os.path.exists("player.png") or not os.path.exists("player2.png"):
@@ -1436,17 +1301,86 @@ def programming_engine():
     status_message = ""
     status_time = 0
     
-    # Scale block images
-    for ni in range(256):
-        s_i = pygame.transform.scale(block_images[ni], (bls, bls))
-        block_images[ni] = s_i
+    # Scale block images (once per block size; the scaled sheet is kept beside the atlas)
+    block_images = block_textures.surfaces((bls, bls))
+    
+    # Renderer that redraws only changed areas, and the clock capping the frame rate
+    view = engine_graphics.DirtyRenderer(screen)
+    clock = pygame.time.Clock()
+    
+    # Rendered index labels and overlay surfaces, reused across frames
+    label_cache = {}
+    overlay_cache = {}
+    
+    def text(message):
+        """Rendered text surface, cached by message."""
+        if message not in label_cache:
+            if len(label_cache) > 4096:
+                label_cache.clear()
+            label_cache[message] = font.render(message, True, (0, 0, 0))
+        return label_cache[message]
+    
+    def overlay(size, color):
+        """Filled (optionally translucent) surface, cached by size and color."""
+        key = (size, color)
+        if key not in overlay_cache:
+            surface = pygame.Surface(size, pygame.SRCALPHA if len(color) == 4 else 0)
+            surface.fill(color)
+            overlay_cache[key] = surface
+        return overlay_cache[key]
+    
+    def draw_cell(cmd_index, x, y, marked):
+        """Draw one matrix cell: its block, the stored-command marker and its index."""
+        screen.blit(block_images[cmd_index], (x, y))
+        if marked:
+            pygame.draw.rect(screen, (0, 255, 0), (x + bls - 10, y, 10, 10))
+        screen.blit(text(str(cmd_index)), (x + 2, y + 2))
+    
+    # Commands run in worker processes, so a slow one never stalls the loop
+    def ask_input(prompt, output):
+        """Answer input() in a running command with a dialog; its output so far goes to the console."""
+        print(output, end="")
+        tk_root.deiconify()
+        line = simpledialog.askstring("Command Input", prompt or "Input:", parent=tk_root)
+        tk_root.withdraw()
+        return line
+    
+    # Commands run in a worker process, so a slow one never stalls the loop; one worker, so
+    # every command sees the globals the ones before it left
+    import command_executor
+    import command_profiler
+    executor = command_executor.CommandExecutor(workers=1, compiled=compiled, prompt=ask_input)
+    profiler = command_profiler.SlotProfiler(filnam)
     
     # Main loop
     try:
         while running:
             current_time = pygame.time.get_ticks()
             
+            # Results of commands that finished in the worker processes
+            for result in executor.poll():
+                profiler.record(result)
+                if result["stdout"]:
+                    print(result["stdout"], end="")
+                if result["stderr"]:
+                    print(result["stderr"], end="", file=sys.stderr)
+                if result["status"] == "ok":
+                    status_message = f"Command {result['slot']} executed"
+                    # Add to history
+                    session_data["command_history"].append({
+                        "command_id": result["slot"],
+                        "seconds": result["seconds"],
+                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    })
+                elif result["status"] in command_executor.STATE_LOST:
+                    status_message = (f"Command {result['slot']}: {result['error']}; worker restarted, "
+                                      "variables from earlier commands were lost")
+                else:
+                    status_message = f"Error in command {result['slot']}: {result['error']}"
+                status_time = current_time
+            
             for event in pygame.event.get():
+                view.handle_event(event)
                 if event.type == pygame.QUIT:
                     # Save session before exiting
                     session_data["last_position"] = (player_x, player_y)
@@ -1459,7 +1393,7 @@ def programming_engine():
                     if event.key == pygame.K_v:
                         # Open command dictionary viewer
                         tk_root.deiconify()
-                        dict_viewer = DictionaryViewer(tk_root)
+                        dict_viewer = DictionaryViewer(tk_root, profiler)
                         tk_root.wait_window(dict_viewer.root)
                         tk_root.withdraw()
                         status_message = "Command dictionary viewed"
@@ -1470,6 +1404,7 @@ def programming_engine():
                         session_data["last_position"] = (player_x, player_y)
                         session_data["last_matrix"] = filnam
                         save_session()
+                        profiler.save()
                         status_message = "Session saved"
                         status_time = current_time
                     
@@ -1586,40 +1521,24 @@ def programming_engine():
                                             star[command_id] = editor.result["command"]
                                             
                                             # Update command file
-                                            update_command_file(filnam, star[1:])
+                                            update_command_file(filnam, star)
                                             
                                             status_message = f"Command {command_id} updated"
                                             status_time = current_time
                                             
                                             # Execute if requested
                                             if editor.result["run"]:
-                                                try:
-                                                    exec(editor.result["command"], globals())
-                                                    status_message = f"Command {command_id} executed"
-                                                    status_time = current_time
-                                                    # Add to history
-                                                    session_data["command_history"].append({
-                                                        "command_id": command_id,
-                                                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                                    })
-                                                except Exception as e:
-                                                    status_message = f"Error: {e}"
-                                                    status_time = current_time
+                                                # Runs in a worker process; the result is picked up by the main loop
+                                                executor.submit(command_id, star[command_id])
+                                                status_message = f"Command {command_id} started"
+                                                status_time = current_time
                                     
                                     elif command_action == 2:
                                         # Execute the command
-                                        try:
-                                            exec(star[command_id], globals())
-                                            status_message = f"Command {command_id} executed"
-                                            status_time = current_time
-                                            # Add to history
-                                            session_data["command_history"].append({
-                                                "command_id": command_id,
-                                                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                            })
-                                        except Exception as e:
-                                            status_message = f"Error: {e}"
-                                            status_time = current_time
+                                        # Runs in a worker process; the result is picked up by the main loop
+                                        executor.submit(command_id, star[command_id])
+                                        status_message = f"Command {command_id} started"
+                                        status_time = current_time
                                     
                                     tk_root.withdraw()
                                 else:
@@ -1642,21 +1561,13 @@ def programming_engine():
                             # Clear screen
                             screen.fill((255, 255, 255))
                             
-                            try:
-                                if 0 <= cma < len(star):
-                                    exec(star[cma], globals())
-                                    status_message = f"Command {cma} executed"
-                                    status_time = current_time
-                                    # Add to history
-                                    session_data["command_history"].append({
-                                        "command_id": cma,
-                                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                    })
-                                else:
-                                    status_message = f"Command {cma} out of range"
-                                    status_time = current_time
-                            except Exception as e:
-                                status_message = f"Error: {e}"
+                            if 0 <= cma < len(star):
+                                # Runs in a worker process; the result is picked up by the main loop
+                                executor.submit(cma, star[cma])
+                                status_message = f"Command {cma} started"
+                                status_time = current_time
+                            else:
+                                status_message = f"Command {cma} out of range"
                                 status_time = current_time
                                 
                             # Update command index pointer
@@ -1695,6 +1606,7 @@ def programming_engine():
                             
                             # Update display
                             pygame.display.update()
+                            view.invalidate()
             
             # Controller input processing
             if typei == 'd':
@@ -1837,39 +1749,25 @@ def programming_engine():
                                         if editor.result:
                                             # Update command
                                             star[selected_command] = editor.result["command"]
-                                            update_command_file(filnam, star[1:])
+                                            update_command_file(filnam, star)
                                             
                                             status_message = f"Command {selected_command} updated"
                                             status_time = current_time
                                             
                                             # Execute if requested
                                             if editor.result["run"]:
-                                                try:
-                                                    exec(editor.result["command"], globals())
-                                                    status_message = f"Command {selected_command} executed"
-                                                    status_time = current_time
-                                                    session_data["command_history"].append({
-                                                        "command_id": selected_command,
-                                                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                                    })
-                                                except Exception as e:
-                                                    status_message = f"Error: {e}"
-                                                    status_time = current_time
+                                                # Runs in a worker process; the result is picked up by the main loop
+                                                executor.submit(selected_command, star[selected_command])
+                                                status_message = f"Command {selected_command} started"
+                                                status_time = current_time
                                 
                                 # Y button (index 3) - Execute selected command
                                 elif i == 3:
                                     if selected_command is not None:
-                                        try:
-                                            exec(star[selected_command], globals())
-                                            status_message = f"Command {selected_command} executed"
-                                            status_time = current_time
-                                            session_data["command_history"].append({
-                                                "command_id": selected_command,
-                                                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                            })
-                                        except Exception as e:
-                                            status_message = f"Error: {e}"
-                                            status_time = current_time
+                                        # Runs in a worker process; the result is picked up by the main loop
+                                        executor.submit(selected_command, star[selected_command])
+                                        status_message = f"Command {selected_command} started"
+                                        status_time = current_time
                                 
                                 # Start button (index 7) - Open documentation
                                 elif i == 7:
@@ -1878,7 +1776,7 @@ def programming_engine():
                                     # Attempt to open docs (command 65535)
                                     try:
                                         if 65535 < len(star):
-                                            exec(star[65535], globals())
+                                            executor.submit(65535, star[65535])
                                         else:
                                             webbrowser.open("https://www.openai.com")
                                     except Exception as e:
@@ -1889,7 +1787,7 @@ def programming_engine():
                                     status_message = "Opening command dictionary"
                                     status_time = current_time
                                     tk_root.deiconify()
-                                    dict_viewer = DictionaryViewer(tk_root)
+                                    dict_viewer = DictionaryViewer(tk_root, profiler)
                                     tk_root.wait_window(dict_viewer.root)
                                     tk_root.withdraw()
                                     
@@ -1915,34 +1813,31 @@ def programming_engine():
                 
                 tk_root.withdraw()
                 
-                bus = 255
-                amount = (bus + 1) * (bus + 1)
-                line_number = 0
+                # Closed before the switch: Windows cannot replace or regenerate a file that is still open
+                previous = star.path
+                star.close()
                 
                 if quet == 2:
                     try:
-                        create_f = open(filnam, "w")
-                        while line_number < amount:
-                            create_f.write("print(\"[Empty Command Slot] Change using a text-editor to Update this slot in Command_Template.txt after renaming it accordingly.\")\n")
-                            line_number = line_number + 1
-                        
-                        create_f.close()
+                        command_matrix.create_template(filnam, default="print(\"[Empty Command Slot] Change using a text-editor to Update this slot in Command_Template.txt after renaming it accordingly.\")")
                     except Exception as e:
                         status_message = f"Error creating file: {e}"
                         status_time = current_time
+                        filnam = previous
+                        star = command_matrix.open_matrix(filnam)
                         typei = "k"
                         continue
                 
                 try:
-                    with open(filnam, 'r') as file:
-                        commands = file.readlines()
-                    
-                    star = [0]
-                    
-                    for i, command in enumerate(commands):
-                        commands[i] = command.strip()
-                        star.append(command)
-                    del star[0]
+                    star = command_matrix.open_matrix(filnam)
+                    compiled.save()
+                    compiled = command_matrix.CommandCache(filnam)
+                    executor.compiled = compiled
+                    profiler.save()
+                    profiler = command_profiler.SlotProfiler(filnam)
+                    if quet == 2:
+                        # A new matrix: timings kept under this name belong to its old commands
+                        profiler.clear()
                     
                     # Update session data
                     session_data["last_matrix"] = filnam
@@ -1952,6 +1847,8 @@ def programming_engine():
                 except Exception as e:
                     status_message = f"Error: {e}"
                     status_time = current_time
+                    filnam = previous
+                    star = command_matrix.open_matrix(filnam)
                 
                 # Reset state of matrix
                 typei = "k"
@@ -1997,8 +1894,8 @@ def programming_engine():
                 # This is just for preview/hover - actual movement is in MOUSEBUTTONDOWN
                 pass
             
-            # Clear screen
-            screen.fill((255, 255, 255))
+            # Describe the frame; the renderer redraws only the areas that changed since the last one
+            frame = []
             
             # Draw blocks and player
             if typei in ['k', 'm', 'd']:
@@ -2010,30 +1907,20 @@ def programming_engine():
                         # Calculate command index and ensure it's in range
                         cmd_index = (relative_x + relative_y * int(screen_width // bls)) % len(block_images)
                         
-                        # Draw block
-                        screen.blit(block_images[cmd_index], (x * bls, y * bls))
-                        
-                        # Convert to string for dict lookup
-                        cmd_str = str(cmd_index)
-                        
                         # Highlight cells with stored commands in dictionary
-                        if cmd_str in command_dict:
-                            pygame.draw.rect(screen, (0, 255, 0), 
-                                        (x * bls + bls - 10, y * bls, 10, 10))
-                        
-                        # Draw small command index on each cell
-                        cmd_text = font.render(str(cmd_index), True, (0, 0, 0))
-                        screen.blit(cmd_text, (x * bls + 2, y * bls + 2))
+                        marked = str(cmd_index) in command_dict
+                        frame.append((("cell", cmd_index, marked), (x * bls, y * bls, bls, bls),
+                                      functools.partial(draw_cell, cmd_index, x * bls, y * bls, marked)))
                 
                 # Draw player cursor
-                screen.blit(player_image, (player_x * bls, player_y * bls))
+                frame.append(engine_graphics.blit_item(screen, player_image, (player_x * bls, player_y * bls)))
                 
                 # If we're in command selection mode, highlight the index position
                 if selection_mode == "command" and index_position:
                     # Draw a border around the index cell
                     ix, iy = index_position
-                    pygame.draw.rect(screen, (255, 0, 0), 
-                                  (ix * bls, iy * bls, bls, bls), 2)
+                    border = (ix * bls, iy * bls, bls, bls)
+                    frame.append(("index border", border, functools.partial(pygame.draw.rect, screen, (255, 0, 0), border, 2)))
                 
                 # If a command is selected, highlight it
                 if selected_command is not None:
@@ -2042,10 +1929,9 @@ def programming_engine():
                     sel_x = index_position[0] + (sel_idx % 16)
                     sel_y = index_position[1] + (sel_idx // 16)
                     
-                    # Draw highlight
-                    s = pygame.Surface((bls, bls), pygame.SRCALPHA)
-                    s.fill((0, 0, 255, 128))  # Blue with alpha
-                    screen.blit(s, (sel_x * bls, sel_y * bls))
+                    # Draw highlight (blue with alpha)
+                    frame.append(engine_graphics.blit_item(screen, overlay((bls, bls), (0, 0, 255, 128)),
+                                                           (sel_x * bls, sel_y * bls)))
                 
                 # If in mouse mode, highlight hovered cell
                 if typei == 'm':
@@ -2053,10 +1939,9 @@ def programming_engine():
                     hover_y = pygame.mouse.get_pos()[1] // bls
                     
                     if 0 <= hover_x < int(screen_width / bls) and 0 <= hover_y < int(screen_height / bls):
-                        # Draw semi-transparent overlay
-                        s = pygame.Surface((bls, bls), pygame.SRCALPHA)
-                        s.fill((255, 255, 0, 128))  # Yellow with alpha
-                        screen.blit(s, (hover_x * bls, hover_y * bls))
+                        # Draw semi-transparent overlay (yellow with alpha)
+                        frame.append(engine_graphics.blit_item(screen, overlay((bls, bls), (255, 255, 0, 128)),
+                                                               (hover_x * bls, hover_y * bls)))
                 
                 # Draw submatrix selection
                 if is_selecting_submatrix and submatrix_start_pos:
@@ -2065,12 +1950,11 @@ def programming_engine():
                     min_y = min(submatrix_start_pos[1], player_y)
                     max_y = max(submatrix_start_pos[1], player_y)
                     
-                    # Draw semi-transparent selection rectangle
+                    # Draw semi-transparent selection rectangle (blue with alpha)
                     width = (max_x - min_x + 1) * bls
                     height = (max_y - min_y + 1) * bls
-                    s = pygame.Surface((width, height), pygame.SRCALPHA)
-                    s.fill((0, 128, 255, 128))  # Blue with alpha
-                    screen.blit(s, (min_x * bls, min_y * bls))
+                    frame.append(engine_graphics.blit_item(screen, overlay((width, height), (0, 128, 255, 128)),
+                                                           (min_x * bls, min_y * bls)))
                 
                 # Display selection mode in the status bar
                 mode_status = f"Mode: {typei.upper()} | Selection: {selection_mode.capitalize()}"
@@ -2078,31 +1962,29 @@ def programming_engine():
                     mode_status += f" | Index: ({index_position[0]}, {index_position[1]})"
                 
                 # Draw mode status in corner
-                mode_text = font.render(mode_status, True, (0, 0, 0))
-                screen.blit(mode_text, (5, 5))
+                frame.append(engine_graphics.blit_item(screen, text(mode_status), (5, 5), ("text", mode_status)))
             
-            # Draw status message if recent
-            if status_message and current_time - status_time < 3000:  # Show for 3 seconds
-                # Draw status bar at the bottom
-                status_bar = pygame.Surface((screen_width, 20))
-                status_bar.fill((220, 220, 220))
-                screen.blit(status_bar, (0, screen_height - 20))
-                
-                # Render status text
-                status_text = font.render(status_message, True, (0, 0, 0))
-                screen.blit(status_text, (5, screen_height - 15))
+                # Draw status message if recent
+                if status_message and current_time - status_time < 3000:  # Show for 3 seconds
+                    # Draw status bar at the bottom
+                    frame.append(engine_graphics.blit_item(screen, overlay((screen_width, 20), (220, 220, 220)),
+                                                           (0, screen_height - 20)))
+                    
+                    # Render status text
+                    frame.append(engine_graphics.blit_item(screen, text(status_message), (5, screen_height - 15),
+                                                           ("text", status_message)))
+                    
+                    # Show current mode
+                    mode_text = text(f"Mode: {typei.upper()}")
+                    frame.append(engine_graphics.blit_item(screen, mode_text,
+                                                           (screen_width - mode_text.get_width() - 5, screen_height - 15),
+                                                           ("text", f"Mode: {typei.upper()}")))
                 
-                # Show current mode
-                mode_text = font.render(f"Mode: {typei.upper()}", True, (0, 0, 0))
-                mode_width = mode_text.get_width()
-                screen.blit(mode_text, (screen_width - mode_width - 5, screen_height - 15))
-            
-            # Update display
-            if typei in ['k', 'm', 'd']:
-                pygame.display.update()
+                # Update display (dirty areas only)
+                view.draw(frame)
             
             # Control frame rate
-            pygame.time.Clock().tick(30)
+            clock.tick(engine_graphics.FRAME_RATE)
     
     except Exception as e:
         print(f"Critical error in main loop: {e}")
@@ -2112,6 +1994,10 @@ def programming_engine():
         session_data["last_position"] = (player_x, player_y)
         session_data["last_matrix"] = filnam
         save_session()
+        compiled.save()
+        executor.close()
+        profiler.save()
+        star.close()
         
         # Destroy Tkinter root
         tk_root.destroy()
@@ -2135,6 +2021,7 @@ def main():
         print("5. Compile Required Images (PS to PNG Conversion)")
         print("6. Install Dependencies")
         print("7. Check Ghostscript Installation (Required for PS to PNG)")
+        print("8. Slot Performance Report")
         print("0. Exit")
         
         choice = input("\nEnter your choice: ")
@@ -2160,6 +2047,12 @@ def main():
         elif choice == "7":
             check_ghostscript()
             input("Press Enter to continue...")
+        elif choice == "8":
+            import command_profiler
+            load_session()
+            matrix = input(f"Matrix file (Enter for {session_data['last_matrix']}): ").strip()
+            command_profiler.report(command_profiler.SlotProfiler(matrix or session_data["last_matrix"]))
+            input("Press Enter to continue...")
         elif choice == "0":
             print("Exiting...")
             break